@@ -0,0 +1,162 @@
+#!/usr/local/bin/python
+# -*- coding: UTF-8 -*-
+# @Project : cms_feed
+# @File    : benchmark.py
+# @Software: PyCharm
+"""
+压测套件：在本地模拟服务上对 get_recent_feedback / get_weekly_summary / get_daily_summary / count_all 计时，
+输出每个场景的耗时和请求/秒；指定基线文件时，耗时超出基线容差即以非0退出，用于上线前发现性能回退
+用法：
+    python benchmark.py                                   # 默认数据量，thread/async 两种引擎
+    python benchmark.py --latency-ms 50 --latency-dist lognormal --error-rate 0.01
+    python benchmark.py --json result.json                # 保存结果作为基线
+    python benchmark.py --baseline result.json --tolerance 0.2
+"""
+import argparse
+import contextlib
+import io
+import json
+import statistics
+import sys
+import time
+
+from main import FeedbackCount
+from mock_server import LATENCY_DISTRIBUTIONS, start_mock_server, patch_urls
+
+# 场景名 → 调用方式（实例, 引擎）
+SCENARIOS = {
+    'get_recent_feedback': lambda feedback_count, engine: feedback_count.get_recent_feedback(
+        hours=24, engine=engine, incremental=False),
+    'get_weekly_summary': lambda feedback_count, engine: feedback_count.get_weekly_summary(engine=engine),
+    'get_daily_summary': lambda feedback_count, engine: feedback_count.get_daily_summary(engine=engine),
+    'count_all': lambda feedback_count, engine: feedback_count.count_all(),
+}
+
+
+def isolate_caches(cls):
+    """
+    所有本地状态改为内存数据库/不落盘，保证每次压测都从冷状态开始且不碰工作目录中的文件；
+    同时去掉飞书限流，只测本程序自身的耗时
+    """
+    attrs = {name: ':memory:' for name in dir(cls) if name.endswith('_FILE')}
+    attrs.update(TOKEN_FILE=None, HISTORY_YAML_FILE='', FEISHU_RATE_LIMITS=[])
+    return type(cls.__name__, (cls,), attrs)
+
+
+def reset_stats(server):
+    """清空模拟服务的请求计数"""
+    with server.stats_lock:
+        server.stats.clear()
+        server.errors = 0
+        server.hook_bodies.clear()
+
+
+def bench_scenario(cls, scenario, engine, server):
+    """
+    在新实例上执行一次场景（含飞书投递），屏蔽场景自身的输出
+    :return: {'wall': 耗时秒, 'requests': 请求数, 'errors': 注入的错误数}
+    """
+    feedback_count = cls(engine=engine)
+    reset_stats(server)
+    with contextlib.redirect_stdout(io.StringIO()):
+        begin = time.perf_counter()
+        SCENARIOS[scenario](feedback_count, engine)
+        feedback_count.deliver_feishu()
+        elapsed = time.perf_counter() - begin
+    feedback_count.request_executor.shutdown(wait=False)
+    return {'wall': elapsed, 'requests': sum(server.stats.values()), 'errors': server.errors}
+
+
+def run_suite(cls, server, scenarios, engines, repeat):
+    """
+    每个 场景×引擎 执行repeat次，取耗时中位数
+    :return: {"场景/引擎": {'wall', 'requests', 'rps', 'errors'}}
+    """
+    results = {}
+    for scenario in scenarios:
+        for engine in engines:
+            runs = [bench_scenario(cls, scenario, engine, server) for _ in range(repeat)]
+            wall = statistics.median(run['wall'] for run in runs)
+            requests_count = int(statistics.median(run['requests'] for run in runs))
+            results[f"{scenario}/{engine}"] = {
+                'wall': round(wall, 4),
+                'requests': requests_count,
+                'rps': round(requests_count / wall, 1) if wall else 0.0,
+                'errors': sum(run['errors'] for run in runs),
+            }
+    return results
+
+
+def compare_baseline(results, baseline, tolerance):
+    """
+    对比基线：耗时超过 基线×(1+tolerance) 视为回退
+    :return: 回退列表 [(场景/引擎, 基线耗时, 当前耗时)]
+    """
+    regressions = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base and result['wall'] > base['wall'] * (1 + tolerance):
+            regressions.append((key, base['wall'], result['wall']))
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="在本地模拟服务上压测反馈统计的各个场景")
+    parser.add_argument('--channels', type=int, default=4, help="渠道数")
+    parser.add_argument('--types-per-channel', type=int, default=10, help="每个渠道的反馈类型数")
+    parser.add_argument('--items-per-type', type=int, default=20, help="每个反馈类型的反馈数（分布在最近15天）")
+    parser.add_argument('--subcategories', type=int, default=30, help="每个大类的小类数")
+    parser.add_argument('--latency-ms', type=float, default=20, help="模拟服务的平均请求延迟（毫秒）")
+    parser.add_argument('--latency-dist', choices=LATENCY_DISTRIBUTIONS, default='fixed', help="请求延迟分布")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="CMS接口返回500的比例")
+    parser.add_argument('--hook-error-rate', type=float, default=0.0, help="飞书Webhook返回限流错误码的比例")
+    parser.add_argument('--engine', choices=('thread', 'async', 'both'), default='both', help="抓取引擎")
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS),
+                        help="要执行的场景")
+    parser.add_argument('--repeat', type=int, default=3, help="每个场景执行的次数（取中位数）")
+    parser.add_argument('--json', dest='json_file', help="把结果保存为JSON（可作为之后的基线）")
+    parser.add_argument('--baseline', help="基线JSON文件，耗时超出容差时以非0退出")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="相对基线允许的耗时增长比例")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    engines = ('thread', 'async') if args.engine == 'both' else (args.engine,)
+    server, base_url = start_mock_server(
+        latency=args.latency_ms / 1000, latency_dist=args.latency_dist,
+        error_rate=args.error_rate, hook_error_rate=args.hook_error_rate,
+        channels=args.channels, types_per_channel=args.types_per_channel, items_per_type=args.items_per_type,
+        subcategories_per_category=args.subcategories, window_hours=15 * 24)
+    cls = isolate_caches(patch_urls(FeedbackCount, base_url))
+
+    print(f"📊 模拟服务: {base_url}，{args.channels}个渠道×{args.types_per_channel}个类型×{args.items_per_type}条反馈，"
+          f"延迟{args.latency_ms}ms（{args.latency_dist}），错误率{args.error_rate:.1%}，每个场景{args.repeat}次")
+    print(f"{'场景':<28} {'耗时(s)':<10} {'请求数':<8} {'请求/秒':<10} {'注入错误':<8}")
+    try:
+        results = run_suite(cls, server, args.scenarios, engines, args.repeat)
+    finally:
+        server.shutdown()
+    for key, result in results.items():
+        print(f"{key:<28} {result['wall']:<10.2f} {result['requests']:<8} {result['rps']:<10.1f} {result['errors']:<8}")
+
+    if args.json_file:
+        with open(args.json_file, 'w', encoding='utf-8') as f:
+            json.dump({'options': vars(args), 'results': results}, f, ensure_ascii=False, indent=2)
+        print(f"💾 结果已保存到 {args.json_file}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)}个场景耗时超出基线{args.tolerance:.0%}:")
+            for key, base_wall, wall in regressions:
+                print(f"   {key}: {base_wall:.2f}s → {wall:.2f}s（{wall / base_wall - 1:+.0%}）")
+            return 1
+        print(f"✅ 所有场景耗时都在基线{args.tolerance:.0%}以内")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -11,18 +11,1020 @@ Loklok 反馈统计系统
 所有统计信息都根据应用名和渠道组进行统计
 支持实时反馈统计和周汇总报告功能
 """
+import argparse
+import asyncio
+import base64
+import hashlib
 import json
+import re
+import sqlite3
 import threading
-from typing import Dict, Tuple, List
+import time
+import queue
+from collections import deque
+from typing import Any, Dict, Iterable, Tuple, List
 
 import requests
 import sys
 from datetime import datetime, timedelta
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib.parse import urlparse
 
 import yaml
 import os
 
+# 可选依赖在首次使用时才导入（两者导入共约300ms，只读历史的对比任务和其他工具调用不需要付出这个开销）
+aiohttp = None  # 仅async引擎需要
+np = None  # 仅趋势计算需要
+
+
+def import_aiohttp():
+    """导入aiohttp，未安装时返回None"""
+    global aiohttp
+    if aiohttp is None:
+        try:
+            import aiohttp as module
+        except ImportError:
+            return None
+        aiohttp = module
+    return aiohttp
+
+
+def import_numpy():
+    """导入numpy，未安装时返回None"""
+    global np
+    if np is None:
+        try:
+            import numpy as module
+        except ImportError:
+            return None
+        np = module
+    return np
+
+
+class SqliteCache:
+    """
+    基于SQLite的本地键值缓存，跨多次运行持久化
+    值以JSON存储，总大小或条目数超过上限时按最近访问时间淘汰（LRU），可选过期时间
+    """
+
+    # 单条SQL中IN参数的最大个数
+    BATCH_SIZE = 500
+
+    def __init__(self, file_path, table='cache', max_bytes=None, max_entries=None, ttl=None):
+        """
+        :param file_path: 缓存文件路径
+        :param table: 表名
+        :param max_bytes: 缓存值的总大小上限（字节），None表示不限制
+        :param max_entries: 条目数上限，None表示不限制
+        :param ttl: 过期时间（秒），None表示永不过期
+        """
+        self.file_path = file_path
+        self.table = table
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(file_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            f"key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            f"created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self.conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_accessed ON {table}(accessed_at)")
+        self.conn.commit()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """
+        批量读取缓存，并刷新命中项的访问时间
+        :param keys: 键列表
+        :return: {键: 值}，未命中的键不返回
+        """
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        expired = []
+        now = time.time()
+        with self.lock:
+            for i in range(0, len(keys), self.BATCH_SIZE):
+                batch = keys[i:i + self.BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = self.conn.execute(
+                    f"SELECT key, value, created_at FROM {self.table} WHERE key IN ({placeholders})",
+                    batch).fetchall()
+                for key, value, created_at in rows:
+                    if self.ttl is not None and created_at < now - self.ttl:
+                        expired.append((key,))
+                    else:
+                        found[key] = json.loads(value)
+            if expired:
+                self.conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", expired)
+            if found:
+                self.conn.executemany(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?",
+                                      [(now, key) for key in found])
+            if expired or found:
+                self.conn.commit()
+        return found
+
+    def set_many(self, items: Dict[str, Any]) -> None:
+        """
+        批量写入缓存，写入后按容量淘汰
+        :param items: {键: 值}
+        """
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, value in items.items():
+            value_str = json.dumps(value, ensure_ascii=False)
+            rows.append((key, value_str, len(value_str.encode('utf-8')), now, now))
+        with self.lock:
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, size, created_at, accessed_at) "
+                f"VALUES (?, ?, ?, ?, ?)", rows)
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self) -> None:
+        """条目数或总大小超过上限时，从最久未访问的条目开始淘汰（调用方持有锁）"""
+        if self.max_entries is not None:
+            count = self.conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+            if count > self.max_entries:
+                self.conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN "
+                    f"(SELECT key FROM {self.table} ORDER BY accessed_at LIMIT ?)", (count - self.max_entries,))
+        if self.max_bytes is None:
+            return
+        total = self.conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evict_keys = []
+        for key, size in self.conn.execute(f"SELECT key, size FROM {self.table} ORDER BY accessed_at"):
+            if total <= self.max_bytes:
+                break
+            evict_keys.append((key,))
+            total -= size
+        self.conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", evict_keys)
+
+    def close(self) -> None:
+        """关闭缓存连接"""
+        with self.lock:
+            self.conn.close()
+
+
+class HistoryStore:
+    """
+    已解决/未解决统计的历史库（SQLite），替代整文件读写的 data_save.yaml
+    每行一个 (日期, 渠道, 大类) ，主键索引按日期范围读取，只读需要的日期，写入在单个事务中完成
+    同一天可以有多个快照：category_stats 保存当天最新的值，category_deltas 只保存相对上一个快照有变化的大类，
+    任一快照 = 当天该快照时间及之前每个大类的最后一次变化
+    """
+
+    def __init__(self, file_path):
+        """
+        :param file_path: 数据库文件路径
+        """
+        self.file_path = file_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(file_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # category_id 不声明类型，保留接口返回的原始类型（与YAML中的键一致）
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS category_stats ("
+            "date TEXT NOT NULL, channel TEXT NOT NULL, category_id NOT NULL, category_title TEXT, "
+            "resolved_total INTEGER NOT NULL, unresolved_total INTEGER NOT NULL, snapshot_time TEXT, "
+            "PRIMARY KEY (date, channel, category_id))"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS snapshots ("
+            "date TEXT NOT NULL, snapshot_time TEXT NOT NULL, changed INTEGER NOT NULL, "
+            "PRIMARY KEY (date, snapshot_time))"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS category_deltas ("
+            "date TEXT NOT NULL, channel TEXT NOT NULL, category_id NOT NULL, snapshot_time TEXT NOT NULL, "
+            "category_title TEXT, resolved_total INTEGER NOT NULL, unresolved_total INTEGER NOT NULL, "
+            "PRIMARY KEY (date, channel, category_id, snapshot_time))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_category_deltas_time ON category_deltas(date, snapshot_time)")
+        self.conn.commit()
+
+    def is_empty(self) -> bool:
+        """历史库中是否还没有任何数据"""
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM category_stats LIMIT 1").fetchone() is None
+
+    def has_date(self, date: str) -> bool:
+        """
+        :param date: 日期 YYYY-MM-DD
+        :return: 该日期是否已有数据
+        """
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM category_stats WHERE date = ? LIMIT 1", (date,)).fetchone() is not None
+
+    @staticmethod
+    def stats_rows(date: str, channel_data: Dict) -> List[Tuple]:
+        """
+        展开一天的统计数据为 category_stats 行；统计失败的大类（值为None或缺少总数）跳过，不按0写入
+        :return: [(日期, 渠道, 大类ID, 大类名称, 已解决, 未解决, 快照时间), ...]
+        """
+        return [
+            (date, channel, category_id, stats.get("category_title"), stats["resolved_total"],
+             stats["unresolved_total"], stats.get("snapshot_time"))
+            for channel, category_data in (channel_data or {}).items()
+            for category_id, stats in (category_data or {}).items()
+            if stats and stats.get("resolved_total") is not None and stats.get("unresolved_total") is not None
+        ]
+
+    def _upsert_rows(self, rows: List[Tuple]) -> None:
+        """写入 category_stats 行（调用方持有锁并负责事务）"""
+        self.conn.executemany(
+            "INSERT INTO category_stats (date, channel, category_id, category_title, resolved_total, "
+            "unresolved_total, snapshot_time) VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (date, channel, category_id) DO UPDATE SET category_title = excluded.category_title, "
+            "resolved_total = excluded.resolved_total, unresolved_total = excluded.unresolved_total, "
+            "snapshot_time = excluded.snapshot_time", rows)
+
+    def upsert(self, data_dict: Dict) -> int:
+        """
+        写入统计数据，同一 (日期, 渠道, 大类) 已存在则更新；整批在一个事务中提交，失败时整体回滚
+        :param data_dict: {日期: {渠道: {大类ID: 统计数据}}}
+        :return: 写入的行数
+        """
+        rows = [row for date, channel_data in data_dict.items() for row in self.stats_rows(date, channel_data)]
+        with self.lock, self.conn:
+            self._upsert_rows(rows)
+        return len(rows)
+
+    def save_snapshot(self, date: str, snapshot_time: str, channel_data: Dict) -> int:
+        """
+        记录一个日内快照：与当天最新值对比，只把有变化的大类写入 category_deltas，同时刷新当天最新值
+        （本次未返回或统计失败的大类保留上一个快照的值，避免某个渠道请求失败时把数据清空）
+        变化、快照记录和当天最新值在同一个事务中提交，中途失败时整体回滚
+        :param date: 日期 YYYY-MM-DD
+        :param snapshot_time: 快照时间 YYYY-MM-DD HH:MM:SS
+        :param channel_data: {渠道: {大类ID: 统计数据}}
+        :return: 有变化的大类数
+        """
+        rows = self.stats_rows(date, channel_data)
+        with self.lock, self.conn:
+            previous = {
+                (channel, category_id): (title, resolved, unresolved)
+                for channel, category_id, title, resolved, unresolved in self.conn.execute(
+                    "SELECT channel, category_id, category_title, resolved_total, unresolved_total "
+                    "FROM category_stats WHERE date = ?", (date,))
+            }
+            changed = [(date, channel, category_id, snapshot_time, *values)
+                       for _, channel, category_id, *values, _ in rows
+                       if previous.get((channel, category_id)) != tuple(values)]
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO category_deltas (date, channel, category_id, snapshot_time, category_title, "
+                "resolved_total, unresolved_total) VALUES (?, ?, ?, ?, ?, ?, ?)", changed)
+            self.conn.execute("INSERT OR REPLACE INTO snapshots (date, snapshot_time, changed) VALUES (?, ?, ?)",
+                              (date, snapshot_time, len(changed)))
+            self._upsert_rows(rows)
+        return len(changed)
+
+    def list_snapshots(self, date: str) -> List[Tuple[str, int]]:
+        """
+        :param date: 日期 YYYY-MM-DD
+        :return: 当天的快照列表 [(快照时间, 变化的大类数), ...]（升序）
+        """
+        with self.lock:
+            return self.conn.execute("SELECT snapshot_time, changed FROM snapshots WHERE date = ? ORDER BY snapshot_time",
+                                     (date,)).fetchall()
+
+    def load_snapshot(self, date: str, snapshot_time: str = None) -> Dict:
+        """
+        重建某个快照：取当天快照时间及之前每个大类的最后一次变化
+        :param date: 日期 YYYY-MM-DD
+        :param snapshot_time: 快照时间，None表示当天最新值
+        :return: {渠道: {大类ID: 统计数据}}
+        """
+        if snapshot_time is None:
+            return self.load_range(date, date).get(date, {})
+        with self.lock:
+            # 按快照时间顺序回放变化，同一大类后面的值覆盖前面的值
+            rows = self.conn.execute(
+                "SELECT channel, category_id, category_title, resolved_total, unresolved_total "
+                "FROM category_deltas WHERE date = ? AND snapshot_time <= ? ORDER BY snapshot_time",
+                (date, snapshot_time)).fetchall()
+        data = {}
+        for channel, category_id, title, resolved, unresolved in rows:
+            data.setdefault(channel, {})[category_id] = {
+                "category_title": title,
+                "resolved_total": resolved,
+                "unresolved_total": unresolved
+            }
+        return data
+
+    def load_rows(self, start_date: str, end_date: str) -> List[Tuple]:
+        """
+        按日期范围读取原始行（不组装字典，供趋势计算直接转数组）
+        :return: [(日期, 渠道, 大类ID, 大类名称, 已解决, 未解决), ...]
+        """
+        with self.lock:
+            return self.conn.execute(
+                "SELECT date, channel, category_id, category_title, resolved_total, unresolved_total "
+                "FROM category_stats WHERE date BETWEEN ? AND ? ORDER BY date, rowid", (start_date, end_date)).fetchall()
+
+    def load_range(self, start_date: str, end_date: str) -> Dict:
+        """
+        按日期范围读取统计数据（含首尾）
+        :param start_date: 开始日期 YYYY-MM-DD
+        :param end_date: 结束日期 YYYY-MM-DD
+        :return: {日期: {渠道: {大类ID: 统计数据}}}，与 data_save.yaml 的结构一致
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT date, channel, category_id, category_title, resolved_total, unresolved_total, snapshot_time "
+                "FROM category_stats WHERE date BETWEEN ? AND ? ORDER BY date, rowid", (start_date, end_date)).fetchall()
+        data = {}
+        for date, channel, category_id, title, resolved, unresolved, snapshot_time in rows:
+            stats = {"category_title": title, "resolved_total": resolved, "unresolved_total": unresolved}
+            if snapshot_time:
+                stats["snapshot_time"] = snapshot_time
+            data.setdefault(date, {}).setdefault(channel, {})[category_id] = stats
+        return data
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self.lock:
+            self.conn.close()
+
+
+class TrendEngine:
+    """
+    已解决/未解决趋势计算（NumPy）
+    历史数据整理成 渠道 × 大类 × 日期 的数组（缺失为NaN，日期按自然日连续），所有指标一次向量化算出：
+    - N日滚动均值
+    - 解决速度：最近N天已解决数的日均增量
+    - 积压变化速度：最近N天未解决数的日均增量（负数表示在消化积压）
+    - 清空积压预计天数：未解决数 / 日均消化量（积压没有减少时为inf）
+    """
+
+    def __init__(self, rows: List[Tuple]):
+        """
+        :param rows: HistoryStore.load_rows 返回的原始行
+        """
+        if import_numpy() is None:
+            raise ImportError("趋势计算需要安装numpy")
+        self.channels = list(dict.fromkeys(row[1] for row in rows))
+        self.category_ids = list(dict.fromkeys(row[2] for row in rows))
+        self.titles = {}
+        if rows:
+            first = datetime.strptime(rows[0][0], '%Y-%m-%d').date()
+            last = datetime.strptime(rows[-1][0], '%Y-%m-%d').date()
+            self.dates = [(first + timedelta(days=i)).strftime('%Y-%m-%d') for i in range((last - first).days + 1)]
+        else:
+            self.dates = []
+
+        shape = (len(self.channels), len(self.category_ids), len(self.dates))
+        self.resolved = np.full(shape, np.nan)
+        self.unresolved = np.full(shape, np.nan)
+        if not rows:
+            return
+        channel_index = {channel: i for i, channel in enumerate(self.channels)}
+        category_index = {category_id: i for i, category_id in enumerate(self.category_ids)}
+        date_index = {date: i for i, date in enumerate(self.dates)}
+        c = np.fromiter((channel_index[row[1]] for row in rows), dtype=np.intp, count=len(rows))
+        k = np.fromiter((category_index[row[2]] for row in rows), dtype=np.intp, count=len(rows))
+        d = np.fromiter((date_index[row[0]] for row in rows), dtype=np.intp, count=len(rows))
+        self.resolved[c, k, d] = np.fromiter((row[4] or 0 for row in rows), dtype=float, count=len(rows))
+        self.unresolved[c, k, d] = np.fromiter((row[5] or 0 for row in rows), dtype=float, count=len(rows))
+        for _, channel, category_id, title, _, _ in rows:
+            self.titles[(channel, category_id)] = title
+
+    @staticmethod
+    def rolling_mean(values, window: int):
+        """
+        沿日期轴的N日滚动均值（忽略NaN，窗口内无数据为NaN），前缀和实现，与历史长度呈线性
+        """
+        valid = ~np.isnan(values)
+        pad = [(0, 0)] * (values.ndim - 1) + [(1, 0)]
+        sums = np.pad(np.cumsum(np.where(valid, values, 0), axis=-1), pad)
+        counts = np.pad(np.cumsum(valid, axis=-1), pad)
+        window_sums = sums[..., window:] - sums[..., :-window]
+        window_counts = counts[..., window:] - counts[..., :-window]
+        # 前 window-1 天的窗口不完整，按已有天数计算
+        window_sums = np.concatenate([sums[..., 1:window], window_sums], axis=-1)
+        window_counts = np.concatenate([counts[..., 1:window], window_counts], axis=-1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return window_sums / window_counts
+
+    @staticmethod
+    def forward_fill(values):
+        """
+        沿日期轴用最近一天的有效值填充缺失日期
+        :return: (填充后的数组, 每个位置对应的有效值所在日期下标，之前没有有效值为-1)
+        """
+        valid = ~np.isnan(values)
+        index = np.where(valid, np.arange(values.shape[-1]), -1)
+        index = np.maximum.accumulate(index, axis=-1)
+        filled = np.take_along_axis(values, np.maximum(index, 0), axis=-1)
+        return np.where(index >= 0, filled, np.nan), index
+
+    def velocity(self, values, window: int):
+        """
+        最近N天的日均增量：(最新值 - N天前的值) / 两者间隔天数
+        N天前没有数据时取窗口内最早的有效值
+        """
+        filled, index = self.forward_fill(values)
+        last = filled[..., -1]
+        last_index = index[..., -1]
+        start = max(len(self.dates) - 1 - window, 0)
+        # 窗口起点没有数据时，取窗口内第一个有效值
+        window_valid = ~np.isnan(values[..., start:])
+        first_offset = np.argmax(window_valid, axis=-1)
+        start_index = np.where(index[..., start] >= 0, index[..., start], start + first_offset)
+        start_value = np.take_along_axis(filled, np.maximum(start_index, 0)[..., None], axis=-1)[..., 0]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(last_index > start_index, (last - start_value) / (last_index - start_index), np.nan)
+
+    def compute(self, window: int = 7) -> Dict:
+        """
+        计算所有大类的趋势指标
+        :param window: 滚动窗口天数
+        :return: {渠道: {大类ID: {"category_title", "resolved_mean", "unresolved_mean", "resolution_velocity",
+                                   "backlog", "backlog_velocity", "days_to_clear"}}}，只包含最新一天有数据的大类
+        """
+        if not self.dates:
+            return {}
+        # 只需要最新一天的滚动均值，只取最后一个窗口计算
+        resolved_mean = self.rolling_mean(self.resolved[..., -window:], window)[..., -1]
+        unresolved_mean = self.rolling_mean(self.unresolved[..., -window:], window)[..., -1]
+        resolution_velocity = self.velocity(self.resolved, window)
+        backlog_velocity = self.velocity(self.unresolved, window)
+        backlog = self.unresolved[..., -1]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            days_to_clear = np.where(backlog_velocity < 0, backlog / -backlog_velocity, np.inf)
+        days_to_clear = np.where(backlog == 0, 0, days_to_clear)
+
+        result = {}
+        for c, k in zip(*np.nonzero(~np.isnan(backlog))):
+            channel, category_id = self.channels[c], self.category_ids[k]
+            result.setdefault(channel, {})[category_id] = {
+                "category_title": self.titles.get((channel, category_id)),
+                "resolved_mean": round(float(resolved_mean[c, k]), 2),
+                "unresolved_mean": round(float(unresolved_mean[c, k]), 2),
+                "resolution_velocity": round(float(resolution_velocity[c, k]), 2),
+                "backlog": int(backlog[c, k]),
+                "backlog_velocity": round(float(backlog_velocity[c, k]), 2),
+                "days_to_clear": round(float(days_to_clear[c, k]), 1)
+            }
+        return result
+
+
+class RangeQuery(TrendEngine):
+    """
+    任意日期/日期范围的对比查询
+    构建时对日期轴预计算前缀和，之后任一范围的均值、首尾值都是常数时间，不需要重新扫描历史
+    """
+
+    def __init__(self, rows: List[Tuple]):
+        """
+        :param rows: HistoryStore.load_rows 返回的原始行
+        """
+        super().__init__(rows)
+        self.date_index = {date: i for i, date in enumerate(self.dates)}
+        pad = [(0, 0), (0, 0), (1, 0)]
+        self.prefix = {}
+        self.filled = {}
+        for name, values in (("resolved", self.resolved), ("unresolved", self.unresolved)):
+            valid = ~np.isnan(values)
+            self.prefix[name] = np.pad(np.cumsum(np.where(valid, values, 0), axis=-1), pad)
+            self.prefix[f"{name}_count"] = np.pad(np.cumsum(valid, axis=-1), pad)
+            self.filled[name] = self.forward_fill(values)[0]
+
+    def clip_range(self, start_date: str, end_date: str) -> Tuple[int, int]:
+        """
+        把日期范围裁剪到已有历史内
+        :return: (开始下标, 结束下标)，范围内没有历史时开始下标大于结束下标
+        """
+        if not self.dates:
+            return 0, -1
+        start = max(start_date, self.dates[0])
+        end = min(end_date, self.dates[-1])
+        if start > end:
+            return 0, -1
+        return self.date_index[start], self.date_index[end]
+
+    def range_stats(self, start_date: str, end_date: str) -> Dict[str, Any]:
+        """
+        计算一个日期范围内所有 渠道×大类 的指标（数组形式）
+        :return: {"resolved_mean", "unresolved_mean", "resolved_start", "resolved_end",
+                  "unresolved_start", "unresolved_end"}，每项是 渠道×大类 的数组，无数据为NaN
+        """
+        start, end = self.clip_range(start_date, end_date)
+        shape = (len(self.channels), len(self.category_ids))
+        if start > end:
+            return {key: np.full(shape, np.nan) for key in (
+                "resolved_mean", "unresolved_mean", "resolved_start", "resolved_end",
+                "unresolved_start", "unresolved_end")}
+        stats = {}
+        for name in ("resolved", "unresolved"):
+            total = self.prefix[name][..., end + 1] - self.prefix[name][..., start]
+            count = self.prefix[f"{name}_count"][..., end + 1] - self.prefix[f"{name}_count"][..., start]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                stats[f"{name}_mean"] = total / count
+            stats[f"{name}_start"] = self.filled[name][..., start]
+            stats[f"{name}_end"] = self.filled[name][..., end]
+        return stats
+
+    def compare(self, range_a: Tuple[str, str], range_b: Tuple[str, str],
+                channels: Iterable[str] = None, category_ids: Iterable = None) -> Dict:
+        """
+        对比两个日期范围（B相对A）
+        :param range_a: 基准范围 (开始日期, 结束日期)
+        :param range_b: 对比范围 (开始日期, 结束日期)
+        :param channels: 只对比这些渠道，None表示全部
+        :param category_ids: 只对比这些大类ID，None表示全部
+        :return: {渠道: {大类ID: {对比详情}}}
+        """
+        a = self.range_stats(*range_a)
+        b = self.range_stats(*range_b)
+        channels = set(channels) if channels else None
+        category_ids = {str(category_id) for category_id in category_ids} if category_ids else None
+
+        def value(array, c, k):
+            return None if np.isnan(array[c, k]) else round(float(array[c, k]), 2)
+
+        def diff(x, y):
+            return None if x is None or y is None else round(y - x, 2)
+
+        result = {}
+        has_data = ~(np.isnan(a["resolved_mean"]) & np.isnan(b["resolved_mean"]))
+        for c, k in zip(*np.nonzero(has_data)):
+            channel, category_id = self.channels[c], self.category_ids[k]
+            if channels and channel not in channels:
+                continue
+            if category_ids and str(category_id) not in category_ids:
+                continue
+            stats = {"category_title": self.titles.get((channel, category_id)) or "未知大类"}
+            for name in ("resolved", "unresolved"):
+                a_mean, b_mean = value(a[f"{name}_mean"], c, k), value(b[f"{name}_mean"], c, k)
+                a_change = diff(value(a[f"{name}_start"], c, k), value(a[f"{name}_end"], c, k))
+                b_change = diff(value(b[f"{name}_start"], c, k), value(b[f"{name}_end"], c, k))
+                mean_diff = diff(a_mean, b_mean)
+                stats.update({
+                    f"a_{name}_mean": a_mean,
+                    f"b_{name}_mean": b_mean,
+                    f"{name}_mean_diff": mean_diff,
+                    f"a_{name}_change": a_change,
+                    f"b_{name}_change": b_change,
+                    f"{name}_trend": "─" if not mean_diff else "↑" if mean_diff > 0 else "↓"
+                })
+            result.setdefault(channel, {})[category_id] = stats
+        return result
+
+
+class CardBuilder:
+    """
+    飞书卡片分片：把内容块依次装入卡片，单张卡片的正文不超过字节上限，超出时开始下一张
+    块是不可拆分的最小单位（如一条反馈、一行表格），只有单个块本身超过上限时才按字符截断
+    大小按JSON编码后的字节数计算（与实际请求体一致，中文会被转义为 \\uXXXX）
+    """
+
+    def __init__(self, title: str, max_bytes: int):
+        """
+        :param title: 卡片标题，多张时追加 (1/3) 编号
+        :param max_bytes: 单张卡片正文的字节上限
+        """
+        self.title = title
+        self.max_bytes = max_bytes
+        self.cards = [[]]
+        self.size = 0
+
+    @staticmethod
+    def encoded_size(text: str) -> int:
+        """文本JSON编码后的字节数（不含两端引号）"""
+        return len(json.dumps(text)) - 2
+
+    def add(self, block: str) -> None:
+        """
+        追加一个内容块
+        :param block: 内容块（自带换行）
+        """
+        if not block:
+            return
+        size = self.encoded_size(block)
+        if size > self.max_bytes:
+            for piece in self.split_block(block):
+                self.add(piece)
+            return
+        if self.size + size > self.max_bytes and self.cards[-1]:
+            self.cards.append([])
+            self.size = 0
+        self.cards[-1].append(block)
+        self.size += size
+
+    def extend(self, blocks: Iterable[str]) -> 'CardBuilder':
+        """依次追加多个内容块"""
+        for block in blocks:
+            self.add(block)
+        return self
+
+    def split_block(self, block: str) -> List[str]:
+        """把超过上限的单个块按字符切成若干段，每段不超过上限"""
+        pieces = []
+        start = 0
+        size = 0
+        for i, char in enumerate(block):
+            char_size = self.encoded_size(char)
+            if size + char_size > self.max_bytes:
+                pieces.append(block[start:i])
+                start, size = i, 0
+            size += char_size
+        pieces.append(block[start:])
+        return pieces
+
+    def build(self) -> List[Tuple[str, str]]:
+        """
+        :return: [(卡片标题, 卡片正文), ...]，多于一张时标题带 (序号/总数)
+        """
+        cards = [card for card in self.cards if card]
+        if len(cards) <= 1:
+            return [(self.title, "".join(card)) for card in cards]
+        return [(f"{self.title} ({i}/{len(cards)})", "".join(card)) for i, card in enumerate(cards, 1)]
+
+
+class TokenManager:
+    """
+    CMS token管理：
+    - 首次使用时才登录（懒加载），token连同过期时间缓存到本地文件，下次启动直接复用
+    - 请求被CMS以token过期拒绝时，invalidate 掉这个token后重新登录一次；刚登录的token仍被拒绝时不再重复登录
+    - 多个线程同时需要登录时只有一个真正发起登录，其他线程等待并复用结果
+    """
+
+    def __init__(self, login, cache_file: str, ttl: int, expiry_margin: int, retry_interval: int):
+        """
+        :param login: 登录函数 login() -> token字符串（失败返回空字符串）
+        :param cache_file: token缓存文件路径，None表示不缓存到磁盘
+        :param ttl: 无法从token中解析过期时间时使用的有效期（秒）
+        :param expiry_margin: 提前多少秒视为过期
+        :param retry_interval: 登录失败后多少秒内不再重试（避免每个请求都去登录）；
+                               登录后这段时间内token被拒绝也不再重新登录（说明不是token失效，如权限不足）
+        """
+        self.login = login
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.expiry_margin = expiry_margin
+        self.retry_interval = retry_interval
+        self.lock = threading.Lock()
+        self.token = ""
+        self.expires_at = 0.0
+        self.failed_at = None
+        self.issued_at = None
+        self.load()
+
+    def load(self) -> None:
+        """读取本地缓存的token"""
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            self.token = cached.get("token", "")
+            self.expires_at = float(cached.get("expires_at", 0))
+        except Exception as e:
+            print(f"⚠️  读取token缓存失败: {str(e)}")
+
+    def save(self) -> None:
+        """token写入本地缓存（先写临时文件再替换，仅当前用户可读）"""
+        if not self.cache_file:
+            return
+        try:
+            tmp_file = f"{self.cache_file}.tmp"
+            fd = os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"token": self.token, "expires_at": self.expires_at}, f)
+            os.replace(tmp_file, self.cache_file)
+        except Exception as e:
+            print(f"⚠️  保存token缓存失败: {str(e)}")
+
+    def token_expiry(self, token: str) -> float:
+        """
+        token的过期时间：JWT格式时取其中的exp，否则按ttl计算
+        """
+        try:
+            payload = token.split(".")[1]
+            claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+            return float(claims["exp"])
+        except Exception:
+            return time.time() + self.ttl
+
+    def valid(self) -> bool:
+        """当前token是否存在且未过期"""
+        return bool(self.token) and time.time() < self.expires_at - self.expiry_margin
+
+    def get(self) -> str:
+        """
+        获取有效token，没有或已过期时登录（同一时间只有一个线程登录）
+        :return: token，登录失败返回空字符串
+        """
+        if self.valid():
+            return self.token
+        with self.lock:
+            if self.valid():
+                return self.token
+            if self.failed_at is not None and time.monotonic() - self.failed_at < self.retry_interval:
+                return ""
+            token = self.login()
+            if not token:
+                self.failed_at = time.monotonic()
+                return ""
+            self.token = token
+            self.expires_at = self.token_expiry(token)
+            self.failed_at = None
+            self.issued_at = time.monotonic()
+            self.save()
+            return token
+
+    def refresh(self, stale_token: str) -> str:
+        """
+        token被CMS拒绝后重新登录；其他线程已经刷新过时直接返回新token
+        :param stale_token: 被拒绝的token
+        :return: 新token，登录失败或不应重新登录时返回空字符串
+        """
+        with self.lock:
+            if (self.token == stale_token and self.issued_at is not None
+                    and time.monotonic() - self.issued_at < self.retry_interval):
+                return ""
+            if self.token == stale_token:
+                self.token = ""
+                self.expires_at = 0.0
+                self.failed_at = None
+        return self.get()
+
+
+class TokenBucket:
+    """
+    令牌桶限流：容量为capacity，每秒补充rate个令牌，取不到令牌时阻塞等待
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        """
+        :param rate: 每秒补充的令牌数
+        :param capacity: 桶容量（允许的突发请求数）
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """取一个令牌，必要时等待"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class FeishuOutbox:
+    """
+    飞书卡片发件箱（SQLite）：卡片渲染后先写入，发送成功后标记为已投递
+    进程退出或发送失败时卡片仍保留在发件箱中，下次运行优先补发，不需要重新抓取数据
+    卡片状态：pending 待发送；delivered 已投递；dead 不可重试的失败（保留便于排查，不再补发）；expired 超时未投递
+    """
+
+    def __init__(self, file_path: str, max_age: int, keep_delivered: int):
+        """
+        :param file_path: 数据库文件路径
+        :param max_age: 未投递卡片的最长保留时间（秒），超过后不再补发
+        :param keep_delivered: 已投递卡片的保留时间（秒）
+        """
+        self.file_path = file_path
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(file_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, webhook TEXT NOT NULL, url TEXT NOT NULL, title TEXT, "
+            "card TEXT NOT NULL, status TEXT NOT NULL DEFAULT 'pending', attempts INTEGER NOT NULL DEFAULT 0, "
+            "last_error TEXT, created_at REAL NOT NULL, delivered_at REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_status ON outbox(status, id)")
+        self.conn.execute("DELETE FROM outbox WHERE status != 'pending' AND created_at < ?",
+                          (time.time() - keep_delivered,))
+        self.conn.commit()
+
+    def add(self, webhook: str, url: str, title: str, card: Dict) -> int:
+        """
+        写入一张待发送的卡片
+        :return: 卡片ID
+        """
+        with self.lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO outbox (webhook, url, title, card, created_at) VALUES (?, ?, ?, ?, ?)",
+                (webhook, url, title, json.dumps(card, ensure_ascii=False), time.time()))
+            return cursor.lastrowid
+
+    def mark_delivered(self, card_id: int, attempts: int) -> None:
+        """标记为已投递"""
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE outbox SET status = 'delivered', attempts = attempts + ?, delivered_at = ? "
+                              "WHERE id = ?", (attempts, time.time(), card_id))
+
+    def mark_failed(self, card_id: int, attempts: int, error: str) -> None:
+        """记录一次失败的投递，卡片保持待发送状态"""
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE outbox SET attempts = attempts + ?, last_error = ? WHERE id = ?",
+                              (attempts, error, card_id))
+
+    def mark_dead(self, card_id: int, attempts: int, error: str) -> None:
+        """标记为不可重试的失败（如请求体或Webhook配置错误），不再补发"""
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE outbox SET status = 'dead', attempts = attempts + ?, last_error = ? WHERE id = ?",
+                              (attempts, error, card_id))
+
+    def pending(self, exclude: Iterable[int] = ()) -> List[Tuple[int, str, str, str, Dict]]:
+        """
+        取出所有待发送的卡片（按写入顺序），超过最长保留时间的标记为过期
+        :param exclude: 本进程中正在发送的卡片ID
+        :return: [(卡片ID, Webhook名称, 地址, 标题, 请求体), ...]
+        """
+        exclude = set(exclude)
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE outbox SET status = 'expired' WHERE status = 'pending' AND created_at < ?",
+                              (time.time() - self.max_age,))
+            rows = self.conn.execute("SELECT id, webhook, url, title, card FROM outbox "
+                                     "WHERE status = 'pending' ORDER BY id").fetchall()
+        return [(card_id, webhook, url, title, json.loads(card))
+                for card_id, webhook, url, title, card in rows if card_id not in exclude]
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self.lock:
+            self.conn.close()
+
+
+class FeishuDelivery:
+    """
+    飞书卡片投递：每个Webhook一个队列和一个后台发送线程
+    - 同一Webhook按提交顺序发送，受每秒/每分钟两个令牌桶限流
+    - 不同Webhook之间并发发送
+    - 飞书在HTTP 200的响应体中用非0的code报告错误（包括限流），只有code为0才算投递成功
+    - 429/5xx、限流错误码和网络错误按指数退避重试（优先使用 Retry-After），重试用尽为 failed（发件箱中保留待补发）
+    - 其他4xx和错误码不可重试，为 dead（发件箱中不再补发）
+    - join() 等待所有队列发送完毕并返回投递报告
+    - 配置了发件箱时，提交前先写入发件箱，发送结果回写发件箱
+    - submit() 返回 (发件箱卡片ID, Future)，调用方可据此确认单张卡片已持久化或已投递
+    """
+
+    def __init__(self, post, limits: List[Tuple[float, int]], max_retries: int, backoff_factor: float,
+                 outbox: FeishuOutbox = None, retry_codes: Iterable[int] = ()):
+        """
+        :param post: 发送函数 post(url, card) -> requests.Response
+        :param limits: 每个Webhook的限流 [(每秒令牌数, 桶容量), ...]
+        :param max_retries: 最大重试次数
+        :param backoff_factor: 退避基数（秒），第n次重试等待 backoff_factor * 2**(n-1)
+        :param outbox: 发件箱，None表示不持久化
+        :param retry_codes: 可重试的飞书错误码（HTTP 200 响应体中的code）
+        """
+        self.post = post
+        self.retry_codes = set(retry_codes)
+        self.outbox = outbox
+        self.in_flight = set()
+        self.limits = limits
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.queues = {}
+        self.buckets = {}
+        self.report = []
+        self.lock = threading.Lock()
+
+    def submit(self, name: str, url: str, title: str, card: Dict, card_id: int = None) -> Tuple[int, Future]:
+        """
+        提交一张卡片，立即返回
+        :param name: Webhook名称（Android/iOS/Count），用于报告
+        :param url: Webhook地址
+        :param title: 卡片标题，用于报告
+        :param card: 请求体
+        :param card_id: 发件箱中的卡片ID（补发时传入），None时先写入发件箱
+        :return: (发件箱中的卡片ID，未写入发件箱时为None, 完成后结果为该卡片报告项的Future)
+        """
+        if self.outbox and card_id is None:
+            try:
+                card_id = self.outbox.add(name, url, title, card)
+            except Exception as e:
+                print(f"⚠️  卡片写入发件箱失败，仅直接发送: {str(e)}")
+        with self.lock:
+            if card_id is not None:
+                self.in_flight.add(card_id)
+            if url not in self.queues:
+                self.queues[url] = queue.Queue()
+                self.buckets[url] = [TokenBucket(rate, capacity) for rate, capacity in self.limits]
+                threading.Thread(target=self._worker, args=(url,), daemon=True).start()
+        future = Future()
+        self.queues[url].put((name, title, card, card_id, future))
+        return card_id, future
+
+    def resend_pending(self) -> int:
+        """
+        把发件箱中未投递的卡片重新提交（排在之后提交的卡片前面）
+        :return: 补发的卡片数
+        """
+        if not self.outbox:
+            return 0
+        with self.lock:
+            in_flight = set(self.in_flight)
+        pending = self.outbox.pending(exclude=in_flight)
+        for card_id, name, url, title, card in pending:
+            self.submit(name, url, title, card, card_id=card_id)
+        return len(pending)
+
+    def _worker(self, url: str) -> None:
+        """单个Webhook的发送线程"""
+        webhook_queue = self.queues[url]
+        while True:
+            name, title, card, card_id, future = webhook_queue.get()
+            try:
+                result = self._deliver(url, card)
+            except Exception as e:
+                result = {"status": "failed", "attempts": 0, "error": str(e)}
+            result.update({"webhook": name, "title": title})
+            if self.outbox and card_id is not None:
+                try:
+                    if result["status"] == "delivered":
+                        self.outbox.mark_delivered(card_id, result["attempts"])
+                    elif result["status"] == "dead":
+                        self.outbox.mark_dead(card_id, result["attempts"], result["error"])
+                    else:
+                        self.outbox.mark_failed(card_id, result["attempts"], result["error"])
+                except Exception as e:
+                    print(f"⚠️  更新发件箱失败: {str(e)}")
+            with self.lock:
+                self.in_flight.discard(card_id)
+                self.report.append(result)
+            mark = "✅" if result["status"] == "delivered" else "❌"
+            print(f"{mark} 飞书[{name}]《{title}》{'发送成功' if mark == '✅' else '发送失败: ' + result['error']}")
+            future.set_result(result)
+            webhook_queue.task_done()
+
+    def _deliver(self, url: str, card: Dict) -> Dict:
+        """限流后发送一张卡片，可重试的错误按退避重试"""
+        error = ""
+        for attempt in range(1, self.max_retries + 2):
+            for bucket in self.buckets[url]:
+                bucket.acquire()
+            retry_after = None
+            try:
+                response = self.post(url, card)
+                if response.status_code == 200:
+                    code = self.response_code(response)
+                    if code == 0:
+                        return {"status": "delivered", "attempts": attempt, "error": ""}
+                    error = f"飞书错误码 {code}: {response.text[:200]}"
+                    if code not in self.retry_codes:
+                        return {"status": "dead", "attempts": attempt, "error": error}
+                else:
+                    error = f"HTTP {response.status_code}: {response.text[:200]}"
+                    if response.status_code != 429 and response.status_code < 500:
+                        return {"status": "dead", "attempts": attempt, "error": error}
+                retry_after = response.headers.get("Retry-After")
+            except requests.RequestException as e:
+                error = str(e)
+            if attempt <= self.max_retries:
+                delay = self.backoff_factor * 2 ** (attempt - 1)
+                if retry_after and retry_after.isdigit():
+                    delay = max(delay, int(retry_after))
+                time.sleep(delay)
+        return {"status": "failed", "attempts": self.max_retries + 1, "error": error}
+
+    @staticmethod
+    def response_code(response) -> int:
+        """
+        飞书Webhook响应体中的错误码：新版为code，旧版为StatusCode；响应体不是JSON时视为0（以HTTP状态为准）
+        """
+        try:
+            body = response.json()
+        except ValueError:
+            return 0
+        if not isinstance(body, dict):
+            return 0
+        return body.get("code", body.get("StatusCode", 0))
+
+    def join(self) -> List[Dict]:
+        """
+        等待所有已提交的卡片发送完毕
+        :return: 投递报告 [{"webhook", "title", "status", "attempts", "error"}, ...]，返回后清空
+        """
+        for webhook_queue in list(self.queues.values()):
+            webhook_queue.join()
+        with self.lock:
+            report, self.report = self.report, []
+        return report
+
 
 class FeedbackCount(threading.Thread):
     """
@@ -46,6 +1048,7 @@ class FeedbackCount(threading.Thread):
     FEEDBACK_LIST_URL = "https://admin-api.netpop.app/cms/backend/issues/type/list"
     CMS_LOGIN_URL = "https://admin-api.netpop.app/auth/backend/account/login"
     FEEDBACK_URL = 'https://admin-api.netpop.app/user/behavior/backend/feedback/v2/page/0'
+    FEEDBACK_DETAIL_URL = 'https://admin-api.netpop.app/user/behavior/backend/feedback/v2/detail/{}'
     TRANSLATE_URL = "https://admin-api.netpop.app/third/backend/openai/translate"
 
     # 已解决、未解决问题数的接口URL
@@ -60,14 +1063,163 @@ class FeedbackCount(threading.Thread):
                       '(KHTML, like Gecko) Chrome/126.0.0.0 Safari/537.36'
     }
 
-    def __init__(self):
-        """初始化反馈统计实例"""
+    # CMS token：本地缓存文件、默认有效期（token中没有exp时使用）、提前过期余量、登录失败后的重试间隔
+    TOKEN_FILE = "cms_token.json"
+    TOKEN_TTL = 12 * 3600
+    TOKEN_EXPIRY_MARGIN = 300
+    TOKEN_RETRY_INTERVAL = 30
+    # CMS以token失效拒绝请求时的HTTP状态码和响应code，命中后重新登录一次并重放请求
+    # A0230（用户登录已过期）来自阿里巴巴Java开发手册的错误码规范（CMS的成功码00000也出自该规范），
+    # 未经线上接口确认（mock_server.py 按同样的假设实现），因此匹配整个A02xx（用户登录异常）段；
+    # 这两种响应都是请求在鉴权阶段被拒绝、服务端没有执行任何操作，翻译等POST请求重放也不会重复执行
+    TOKEN_EXPIRED_STATUS = 401
+    TOKEN_EXPIRED_CODE = re.compile(r'A02\d\d')
+
+    # 线程池大小，同时也是每个host的连接池大小
+    MAX_WORKERS = 16
+
+    # 各接口的超时时间 (连接超时, 读取超时)，单位秒
+    DEFAULT_TIMEOUT = (5, 30)
+    TIMEOUTS = {
+        'login': (5, 30),
+        'config': (5, 30),
+        'feedback': (5, 60),
+        'detail': (5, 30),
+        'translate': (5, 60),
+        'channel': (5, 30),
+        'category': (5, 30),
+        'subcategory': (5, 60),
+        'feishu': (5, 30),
+    }
+
+    # 幂等GET请求的重试配置
+    RETRY_TOTAL = 3
+    RETRY_BACKOFF_FACTOR = 0.5
+    RETRY_STATUS_FORCELIST = (429, 500, 502, 503, 504)
+
+    # async引擎每个host的最大并发请求数
+    ASYNC_LIMIT_PER_HOST = 200
+
+    # 反馈列表分页：每页条数，以及后台预取的最大页数（内存中最多保留这么多页）
+    FEEDBACK_PAGE_SIZE = 200
+    # 小类接口分页大小：逐页统计后丢弃，内存只保留一页（原来一次请求9999条）
+    SUBCATEGORY_PAGE_SIZE = 200
+    FEEDBACK_PREFETCH_PAGES = 3
+
+    # 反馈列表查询方式：channel 每个应用-渠道组查询一次全部类型，在本地按类型拆分；type 每个反馈类型查询一次
+    # channel 依赖列表项中的反馈类型字段（FEEDBACK_TYPE_FIELD），线上接口确认该字段前默认使用 type；
+    # channel 模式下列表项缺少该字段或类型不在请求范围内时，该渠道自动改为逐类型查询
+    FEEDBACK_QUERY_MODE = 'type'
+    FEEDBACK_TYPE_FIELD = 'type'  # 反馈列表中表示反馈类型ID的字段（未经线上接口确认）
+
+    # 增量拉取：按 应用-渠道组-反馈类型 记录已推送的最后一条反馈（创建时间+ID）
+    # 水位线只属于每小时的定时推送；8点汇总明细和手动查询是固定窗口，调用时传 incremental=False
+    INCREMENTAL = True
+    WATERMARK_FILE = "feedback_watermark.db"
+    WATERMARK_MAX_LOOKBACK_HOURS = 24  # 水位线过旧时最多回溯的小时数
+
+    # 日报/周报的基准时间（每天10点），按天统计的反馈数以此为界：D日 = [D-1日10:00:00, D日09:59:59]
+    SUMMARY_BASE_HOUR = 10
+    # 已结束的天的反馈数不再变化，持久化后汇总只需请求缺失的天
+    DAY_COUNT_FILE = "feedback_day_counts.db"
+
+    # 反馈配置缓存：TTL内启动不发请求；过期后只请求一次导航栏配置，内容哈希不变则复用反馈类型列表；
+    # 超过最长时间则完整刷新（反馈类型变化不会体现在导航栏配置中）
+    CONFIG_CACHE_FILE = "feedback_config_cache.db"
+    CONFIG_CACHE_TTL = 6 * 3600
+    CONFIG_CACHE_MAX_AGE = 24 * 3600
+
+    # 已解决/未解决统计的历史库，首次打开时一次性导入旧的YAML历史
+    HISTORY_FILE = "feedback_history.db"
+    HISTORY_YAML_FILE = "data_save.yaml"
+    # 飞书卡片请求体上限约30KB，正文留出标题和卡片结构的余量
+    FEISHU_CARD_MAX_BYTES = 28 * 1024
+    # 飞书自定义机器人限流：每秒5次、每分钟100次（按Webhook计）
+    # 令牌桶任意窗口W内最多发送 容量 + 速率×W 次，按此取值保证不超过上述限制
+    FEISHU_RATE_LIMITS = [(4, 1), (80 / 60, 20)]
+    FEISHU_MAX_RETRIES = 3
+    FEISHU_BACKOFF_FACTOR = 1.0
+    # 飞书Webhook在HTTP 200响应体中返回的可重试错误码（11232：发送频率超限）
+    FEISHU_RETRY_CODES = (11232,)
+    # 飞书发件箱：未投递的卡片保留2天（之后的补发已无意义），已投递和不可重试（dead）的保留7天便于排查
+    OUTBOX_FILE = "feishu_outbox.db"
+    OUTBOX_MAX_AGE = 2 * 24 * 3600
+    OUTBOX_KEEP_DELIVERED = 7 * 24 * 3600
+
+    # 常驻模式：每小时第几分钟执行一次定时任务；反馈类型配置的刷新间隔（秒）
+    DAEMON_TICK_MINUTE = 0
+    CONFIG_REFRESH_INTERVAL = 6 * 3600
+    # 周报趋势：滚动窗口天数、参与计算的历史天数
+    TREND_WINDOW_DAYS = 7
+    TREND_HISTORY_DAYS = 28
+
+    # 反馈详情缓存（详情创建后不再变化，只需获取一次）
+    DETAIL_CACHE_FILE = "feedback_detail_cache.db"
+    DETAIL_CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+    # 翻译缓存（按 目标语言+原文 的哈希去重，跨运行共享）
+    TRANSLATE_LANGUAGE = "中文"
+    TRANSLATE_CACHE_FILE = "translate_cache.db"
+    TRANSLATE_CACHE_MAX_ENTRIES = 100000
+    TRANSLATE_CACHE_TTL = 30 * 24 * 3600  # 秒，None表示永不过期
+
+    # 批量翻译：多条文本用编号分隔行拼成一次请求，按上限装箱
+    TRANSLATE_BATCH_MAX_CHARS = 3000
+    TRANSLATE_BATCH_MAX_ITEMS = 50
+    TRANSLATE_DELIMITER = "<<<{}>>>"
+    TRANSLATE_DELIMITER_PATTERN = re.compile(r'^[ \t]*<<<(\d+)>>>[ \t]*$', re.M)
+
+    # 跳过翻译：汉字占文字比例达到该值视为已是中文；去掉链接后没有文字（纯数字/表情）也不翻译
+    TRANSLATE_SKIP_CJK_RATIO = 0.5
+    URL_PATTERN = re.compile(r'(https?://|www\.)\S+', re.I)
+    CJK_PATTERN = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]')
+    # 日文假名、韩文：含有汉字但不是中文，仍需翻译
+    NON_CHINESE_CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u31f0-\u31ff\u1100-\u11ff\uac00-\ud7af]')
+
+    def __init__(self, engine='thread'):
+        """
+        初始化反馈统计实例
+        :param engine: 抓取引擎，thread（线程池）或 async（asyncio）
+        """
         super().__init__()
-        self.token = self.login_cms()
+        self.engine = engine
+        self.session = self.create_session()
+        # 子请求（详情、翻译批次）共用的线程池
+        self.request_executor = ThreadPoolExecutor(max_workers=self.MAX_WORKERS)
+        # async引擎每个host的并发信号量（信号量绑定事件循环，每次 _async_gather 时清空重建）
+        self._host_semaphores = {}
+        self.detail_cache = self.open_cache(self.DETAIL_CACHE_FILE, 'feedback_detail',
+                                            max_bytes=self.DETAIL_CACHE_MAX_BYTES)
+        self.translate_cache = self.open_cache(self.TRANSLATE_CACHE_FILE, 'translation',
+                                               max_entries=self.TRANSLATE_CACHE_MAX_ENTRIES,
+                                               ttl=self.TRANSLATE_CACHE_TTL)
+        self.watermarks = self.open_cache(self.WATERMARK_FILE, 'watermark')
+        self._history = None
+        # 范围对比共用的 (开始日期, 结束日期, RangeQuery)，写入历史后失效
+        self._range_query = None
+        self.day_counts = self.open_cache(self.DAY_COUNT_FILE, 'day_count')
+        self.config_cache = self.open_cache(self.CONFIG_CACHE_FILE, 'feedback_config')
+        self.stats_lock = threading.Lock()
+        self.translate_stats = {}
+        self.reset_translate_stats()
+        self.token_manager = TokenManager(self.login_cms, self.TOKEN_FILE, self.TOKEN_TTL,
+                                          self.TOKEN_EXPIRY_MARGIN, self.TOKEN_RETRY_INTERVAL)
         self.now = datetime.now()
         self.results = []
-        self.feedback_tab_config = self.get_feedback_tab_config()
-        self.feedback_list = self.get_feedback_list()
+        self.delivery = FeishuDelivery(
+            lambda url, card: self.http_request('POST', url, 'feishu', json=card),
+            self.FEISHU_RATE_LIMITS, self.FEISHU_MAX_RETRIES, self.FEISHU_BACKOFF_FACTOR,
+            outbox=self.open_outbox(), retry_codes=self.FEISHU_RETRY_CODES)
+        # 反馈数结果表 {(开始时间, 结束时间): {(应用, 渠道组, 类型ID): 数量}}，日报和周报共用
+        self.count_table = {}
+        # 反馈配置在首次访问 feedback_tab_config / feedback_list 时才加载（只读历史的对比任务不访问CMS）
+        self._feedback_tab_config = None
+        self._feedback_list = None
+        self.config_lock = threading.Lock()
+        self.config_loaded_at = None
+        # 常驻模式（start_daemon 启动时为True）及其停止信号
+        self.daemon_mode = False
+        self.stop_event = threading.Event()
         # print(self.feedback_tab_config)
         # print(self.feedback_list)
 
@@ -85,6 +1237,120 @@ class FeedbackCount(threading.Thread):
             datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         )
 
+    def create_session(self):
+        """
+        创建共享的HTTP会话：keep-alive连接池（与线程池大小匹配），GET请求失败自动退避重试
+        :return: requests.Session
+        """
+        retry = Retry(
+            total=self.RETRY_TOTAL,
+            backoff_factor=self.RETRY_BACKOFF_FACTOR,
+            status_forcelist=self.RETRY_STATUS_FORCELIST,
+            allowed_methods=frozenset(['GET']),  # 仅重试幂等的GET请求
+            raise_on_status=False
+        )
+        # 任务线程池 + 子请求线程池共用连接池
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=self.MAX_WORKERS * 2, max_retries=retry)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    @property
+    def token(self):
+        """CMS token，首次使用时登录（见 TokenManager）"""
+        return self.token_manager.get()
+
+    def is_token_expired(self, status, body):
+        """
+        判断响应是否为token失效：HTTP 401，或响应JSON顶层的code属于A02xx
+        :param status: HTTP状态码
+        :param body: 响应体（bytes）
+        """
+        if status == self.TOKEN_EXPIRED_STATUS:
+            return True
+        # 绝大多数响应不含A02，先按字节粗筛，避免每个响应都多解析一次JSON
+        if b'"A02' not in body:
+            return False
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return False
+        return isinstance(payload, dict) and bool(self.TOKEN_EXPIRED_CODE.fullmatch(str(payload.get('code', ''))))
+
+    def http_request(self, method, url, endpoint, **kwargs):
+        """
+        通过共享会话发送请求，按接口类型设置超时
+        带token的请求被CMS以token失效拒绝时（鉴权阶段即被拒绝，服务端未执行），重新登录一次并重放请求
+        :param method: 请求方法
+        :param url: 请求地址
+        :param endpoint: 接口类型（对应TIMEOUTS的键）
+        :return: requests.Response
+        """
+        kwargs.setdefault('timeout', self.TIMEOUTS.get(endpoint, self.DEFAULT_TIMEOUT))
+        response = self.session.request(method, url, **kwargs)
+        headers = kwargs.get('headers') or {}
+        if headers.get('token') and self.is_token_expired(response.status_code, response.content):
+            print("🔑 CMS token已失效，重新登录后重试")
+            token = self.token_manager.refresh(headers['token'])
+            if token:
+                kwargs['headers'] = {**headers, 'token': token}
+                response = self.session.request(method, url, **kwargs)
+        return response
+
+    def get_connection_stats(self):
+        """
+        统计连接池的连接复用情况
+        :return: {'requests': 请求数, 'connections': 新建连接数, 'reused': 复用连接的请求数}
+        """
+        total_requests = 0
+        total_connections = 0
+        adapters = {id(adapter): adapter for adapter in self.session.adapters.values()}
+        for adapter in adapters.values():
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                total_requests += pool.num_requests
+                total_connections += pool.num_connections
+        return {
+            'requests': total_requests,
+            'connections': total_connections,
+            'reused': max(total_requests - total_connections, 0)
+        }
+
+    def print_connection_stats(self):
+        """输出连接复用统计"""
+        stats = self.get_connection_stats()
+        print(f"🔗 连接统计: 请求{stats['requests']}次，新建连接{stats['connections']}个，"
+              f"复用连接{stats['reused']}次")
+
+    @staticmethod
+    def open_cache(file_path, table, **options):
+        """
+        打开本地缓存，失败时返回None（不影响主流程，仅失去缓存）
+        :param file_path: 缓存文件路径
+        :param table: 表名
+        :return: SqliteCache 或 None
+        """
+        try:
+            return SqliteCache(file_path, table, **options)
+        except Exception as e:
+            print(f"⚠️  打开缓存{file_path}失败，不使用缓存: {str(e)}")
+            return None
+
+    def open_outbox(self):
+        """
+        打开飞书发件箱，失败时返回None（卡片仍会直接发送，只是不能补发）
+        :return: FeishuOutbox 或 None
+        """
+        try:
+            return FeishuOutbox(self.OUTBOX_FILE, self.OUTBOX_MAX_AGE, self.OUTBOX_KEEP_DELIVERED)
+        except Exception as e:
+            print(f"⚠️  打开发件箱{self.OUTBOX_FILE}失败，不补发失败的卡片: {str(e)}")
+            return None
+
     def login_cms(self):
         """
         登录CMS系统获取token
@@ -92,7 +1358,7 @@ class FeedbackCount(threading.Thread):
         """
         try:
             data = {"username": "testrobot", "password": "Testrobot9456@"}
-            resp = requests.post(self.CMS_LOGIN_URL, json=data, headers=self.HEADERS).json()
+            resp = self.http_request('POST', self.CMS_LOGIN_URL, 'login', json=data, headers=self.HEADERS).json()
             token = resp.get('data', '')
             if not token:
                 print("⚠️  获取CMS token失败")
@@ -112,46 +1378,181 @@ class FeedbackCount(threading.Thread):
                 return []
 
             headers = {**self.HEADERS, 'token': self.token}
-            resp = requests.get(self.FEEDBACK_TAB_CONFIG_URL, headers=headers).json()
+            resp = self.http_request('GET', self.FEEDBACK_TAB_CONFIG_URL, 'config', headers=headers).json()
             return resp.get('data', [])
         except Exception as e:
             print(f"❌ 获取反馈配置失败: {str(e)}")
             return []
 
-    def get_feedback_list(self):
+    def get_feedback_list(self, tab_config=None, failed=None):
         """
         获取反馈类型列表，按应用-渠道组分组
+        :param tab_config: 导航栏配置，默认使用 feedback_tab_config
+        :param failed: 传入列表时，收集反馈类型获取失败的导航栏配置（结果中不含这些应用渠道组）
         :return: 反馈类型列表
         """
         list_data = []
+        failed = [] if failed is None else failed
         try:
             if not self.token:
                 print("❌ 未获取到CMS token，无法获取反馈类型")
                 return list_data
 
             headers = {**self.HEADERS, 'token': self.token}
-            for tab in self.feedback_tab_config:
-                app_name = tab.get('appName')
-                client_group = tab.get('clientGroupCode')
-
-                if not app_name or not client_group:
-                    continue
-
-                data = {"appName": app_name, "clientGroup": client_group}
-                # print(data)
-                resp = requests.get(self.FEEDBACK_LIST_URL, params=data, headers=headers).json()
-                # print(resp)
-
-                if resp.get('data') is not None:
+            tab_config = self.feedback_tab_config if tab_config is None else tab_config
+            tabs = [tab for tab in tab_config if tab.get('appName') and tab.get('clientGroupCode')]
+
+            def fetch_types(tab):
+                data = {"appName": tab.get('appName'), "clientGroup": tab.get('clientGroupCode')}
+                try:
+                    return self.http_request('GET', self.FEEDBACK_LIST_URL, 'config', params=data,
+                                             headers=headers).json()
+                except Exception as e:
+                    print(f"❌ 获取{tab.get('appName')}/{tab.get('clientGroupCode')}的反馈类型失败: {str(e)}")
+                    return None
+
+            # 各应用渠道组的反馈类型并发获取，按导航栏顺序合并
+            for tab, resp in zip(tabs, self.request_executor.map(fetch_types, tabs)):
+                if resp and resp.get('data') is not None:
                     feedback_types = {item['id']: item['name'] for item in resp['data']}
                     tab['FEEDBACK_TYPES'] = feedback_types
-                    # print(tab['FEEDBACK_TYPES'])
                     list_data.append(tab)
+                else:
+                    failed.append(tab)
             return list_data
         except Exception as e:
             print(f"❌ 获取反馈类型列表失败: {str(e)}")
             return list_data
 
+    def ensure_feedback_config(self):
+        """首次使用时加载反馈配置（多线程同时访问时只加载一次）"""
+        if self._feedback_list is not None:
+            return
+        with self.config_lock:
+            if self._feedback_list is None:
+                self._feedback_tab_config, self._feedback_list = self.load_feedback_config()
+                self.config_loaded_at = time.monotonic()
+
+    @property
+    def feedback_tab_config(self):
+        """反馈页面的导航栏配置（懒加载）"""
+        self.ensure_feedback_config()
+        return self._feedback_tab_config
+
+    @feedback_tab_config.setter
+    def feedback_tab_config(self, value):
+        self._feedback_tab_config = value
+
+    @property
+    def feedback_list(self):
+        """按应用-渠道组分组的反馈类型列表（懒加载）"""
+        self.ensure_feedback_config()
+        return self._feedback_list
+
+    @feedback_list.setter
+    def feedback_list(self, value):
+        self._feedback_list = value
+
+    def refresh_config(self):
+        """
+        重新获取反馈页面配置和反馈类型列表（常驻模式下按 CONFIG_REFRESH_INTERVAL 定期刷新）
+        获取失败时保留原有配置
+        """
+        tab_config, feedback_list = self.load_feedback_config(force=True)
+        if not feedback_list:
+            print("⚠️  刷新反馈配置失败，继续使用原有配置")
+            return
+        self.feedback_tab_config, self.feedback_list = tab_config, feedback_list
+        self.config_loaded_at = time.monotonic()
+        print(f"🔄 反馈配置已刷新：{len(self.feedback_list)}个应用渠道组")
+
+    @staticmethod
+    def config_hash(tab_config):
+        """导航栏配置的内容哈希"""
+        return hashlib.sha256(json.dumps(tab_config, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def encode_feedback_list(feedback_list):
+        """反馈类型列表转为可JSON缓存的形式（FEEDBACK_TYPES 存为 [[ID, 名称], ...]，保留ID的原始类型）"""
+        return [{**tab, 'FEEDBACK_TYPES': list(tab.get('FEEDBACK_TYPES', {}).items())} for tab in feedback_list]
+
+    @staticmethod
+    def decode_feedback_list(cached_list):
+        """encode_feedback_list 的逆操作"""
+        return [{**tab, 'FEEDBACK_TYPES': {ft_id: ft_name for ft_id, ft_name in tab.get('FEEDBACK_TYPES', [])}}
+                for tab in cached_list]
+
+    def merge_cached_types(self, tab_config, feedback_list, cached):
+        """
+        获取失败的应用渠道组沿用缓存中的反馈类型，按导航栏顺序合并
+        :param tab_config: 导航栏配置
+        :param feedback_list: 本次获取成功的反馈类型列表
+        :param cached: 配置缓存，None表示没有缓存（失败的应用渠道组本次没有反馈类型）
+        :return: 反馈类型列表
+        """
+        def channel_key(tab):
+            return tab.get('appName'), tab.get('clientGroupCode')
+
+        previous = {channel_key(tab): tab for tab in self.decode_feedback_list(cached['feedback_list'])} if cached else {}
+        fetched = {channel_key(tab): tab for tab in feedback_list}
+        merged = []
+        for tab in tab_config:
+            tab = fetched.get(channel_key(tab)) or previous.get(channel_key(tab))
+            if tab is not None:
+                merged.append(tab)
+        return merged
+
+    def load_feedback_config(self, force=False):
+        """
+        加载反馈页面配置和反馈类型列表，优先使用本地缓存：
+        - 缓存未超过 CONFIG_CACHE_TTL（且非force）→ 不发请求
+        - 否则请求一次导航栏配置，内容哈希不变且缓存未超过 CONFIG_CACHE_MAX_AGE → 复用反馈类型列表
+        - 否则并发获取所有反馈类型列表并更新缓存
+        请求失败时退回使用缓存；部分应用渠道组的反馈类型获取失败时，这些渠道沿用缓存中的类型，本次结果不写入缓存
+        :param force: 忽略TTL，至少检查一次导航栏配置
+        :return: (导航栏配置, 反馈类型列表)
+        """
+        now = time.time()
+        cached = None
+        if self.config_cache:
+            cached = self.config_cache.get_many(['feedback_config']).get('feedback_config')
+        if cached and not force and now - cached['checked_at'] < self.CONFIG_CACHE_TTL:
+            return cached['tab_config'], self.decode_feedback_list(cached['feedback_list'])
+
+        tab_config = self.get_feedback_tab_config()
+        if not tab_config:
+            if cached:
+                print("⚠️  获取反馈配置失败，使用本地缓存的配置")
+                return cached['tab_config'], self.decode_feedback_list(cached['feedback_list'])
+            return [], []
+
+        tab_hash = self.config_hash(tab_config)
+        if cached and cached['tab_hash'] == tab_hash and now - cached['loaded_at'] < self.CONFIG_CACHE_MAX_AGE:
+            cached['checked_at'] = now
+            feedback_list = self.decode_feedback_list(cached['feedback_list'])
+        else:
+            # get_feedback_list 会在导航栏配置上写入 FEEDBACK_TYPES，传入副本，缓存中保留原始配置
+            failed = []
+            feedback_list = self.get_feedback_list([dict(tab) for tab in tab_config], failed)
+            if not feedback_list:
+                return tab_config, self.decode_feedback_list(cached['feedback_list']) if cached else []
+            if failed:
+                print(f"⚠️  {len(failed)}个应用渠道组的反馈类型获取失败，沿用缓存中的类型，本次不更新缓存")
+                return tab_config, self.merge_cached_types(tab_config, feedback_list, cached)
+            cached = {
+                'tab_config': tab_config,
+                'tab_hash': tab_hash,
+                'feedback_list': self.encode_feedback_list(feedback_list),
+                'loaded_at': now,
+                'checked_at': now
+            }
+        if self.config_cache:
+            try:
+                self.config_cache.set_many({'feedback_config': cached})
+            except Exception as e:
+                print(f"⚠️  保存反馈配置缓存失败: {str(e)}")
+        return tab_config, feedback_list
+
     def get_feedback(self, appName, clientGroup, feedback_type, start_date, end_date, page=0, size=200):
         """
         获取反馈数据
@@ -179,12 +1580,76 @@ class FeedbackCount(threading.Thread):
                 "page": page,
                 "size": size
             }
-            resp = requests.post(self.FEEDBACK_URL, json=data, headers=headers).json()
+            resp = self.http_request('POST', self.FEEDBACK_URL, 'feedback', json=data, headers=headers).json()
             return resp.get('data', {})
         except Exception as e:
             print(f"❌ 获取反馈数据失败: {str(e)}")
             return {}
 
+    @staticmethod
+    def count_pages(total, size):
+        """
+        计算总页数
+        :param total: 总条数
+        :param size: 每页条数
+        :return: 页数
+        """
+        return (total + size - 1) // size if size > 0 else 0
+
+    @staticmethod
+    def new_page_items(data, seen_ids):
+        """
+        取出一页中尚未出现过的反馈（翻页期间有新反馈写入时，页边界上的数据可能重复）
+        :param data: get_feedback 返回的分页数据
+        :param seen_ids: 已出现的反馈ID集合（会被更新）
+        :return: 反馈列表
+        """
+        items = []
+        for item in (data or {}).get('content') or []:
+            if item.get('id') in seen_ids:
+                continue
+            seen_ids.add(item.get('id'))
+            items.append(item)
+        return items
+
+    def iter_feedback_pages(self, appName, clientGroup, feedback_type, start_date, end_date):
+        """
+        逐页获取时间范围内的全部反馈（不再截断在第一页）
+        先请求第一页拿到totalElements，其余页在后台按窗口预取，按页序返回
+        任一页（包括第一页）获取失败时抛出异常：调用方放弃该任务的结果（不推进水位线），而不是把失败当作空窗口或完整窗口
+        :param appName: 应用名称
+        :param clientGroup: 渠道组编码
+        :param feedback_type: 反馈类型列表
+        :param start_date: 开始时间
+        :param end_date: 结束时间
+        :return: 生成器，每次返回一页的反馈列表
+        """
+        size = self.FEEDBACK_PAGE_SIZE
+        first = self.get_feedback(appName, clientGroup, feedback_type, start_date, end_date, page=0, size=size)
+        if not first:
+            raise RuntimeError(f"{appName}/{clientGroup} 反馈列表第1页获取失败")
+        seen_ids = set()
+        yield self.new_page_items(first, seen_ids)
+
+        total_pages = self.count_pages(first.get('totalElements', 0), size)
+        pending = deque()
+        next_page = 1
+        try:
+            while next_page < total_pages or pending:
+                while next_page < total_pages and len(pending) < self.FEEDBACK_PREFETCH_PAGES:
+                    pending.append((next_page, self.request_executor.submit(
+                        self.get_feedback, appName, clientGroup, feedback_type, start_date, end_date,
+                        page=next_page, size=size)))
+                    next_page += 1
+                page, future = pending.popleft()
+                data = future.result()
+                if not data:
+                    raise RuntimeError(f"{appName}/{clientGroup} 反馈列表第{page + 1}/{total_pages}页获取失败")
+                yield self.new_page_items(data, seen_ids)
+        finally:
+            for _, future in pending:
+                future.cancel()
+
     def get_feedback_count_only(self, appName, clientGroup, feedback_type, start_date, end_date):
         """
         仅获取反馈数量（优化版，用于周汇总统计）
@@ -193,12 +1658,12 @@ class FeedbackCount(threading.Thread):
         :param feedback_type: 反馈类型列表
         :param start_date: 开始时间
         :param end_date: 结束时间
-        :return: 反馈数量
+        :return: 反馈数量，获取失败返回None（避免把失败当成0条写入计数存储）
         """
         try:
             if not self.token:
                 print("❌ 未获取到CMS token，无法获取反馈数据")
-                return 0
+                return None
 
             headers = {**self.HEADERS, 'token': self.token}
             data = {
@@ -210,12 +1675,12 @@ class FeedbackCount(threading.Thread):
                 "page": 0,
                 "size": 1  # 只需要获取总数，所以size设为1
             }
-            resp = requests.post(self.FEEDBACK_URL, json=data, headers=headers).json()
-            data_result = resp.get('data', {})
-            return data_result.get('totalElements', 0) if data_result else 0
+            resp = self.http_request('POST', self.FEEDBACK_URL, 'feedback', json=data, headers=headers).json()
+            data_result = resp.get('data')
+            return data_result.get('totalElements', 0) if data_result else None
         except Exception as e:
             print(f"❌ 获取反馈数量失败: {str(e)}")
-            return 0
+            return None
 
     def get_feedback_detail(self, feedback_id):
         """
@@ -228,17 +1693,156 @@ class FeedbackCount(threading.Thread):
                 print("❌ 未获取到CMS token，无法获取反馈详情")
                 return {}
 
-            url = f'https://admin-api.netpop.app/user/behavior/backend/feedback/v2/detail/{feedback_id}'
+            url = self.FEEDBACK_DETAIL_URL.format(feedback_id)
             headers = {**self.HEADERS, 'token': self.token}
-            resp = requests.get(url, headers=headers).json()
+            resp = self.http_request('GET', url, 'detail', headers=headers).json()
             return resp.get('data', {})
         except Exception as e:
             print(f"❌ 获取反馈详情失败: {str(e)}")
             return {}
 
+    def get_feedback_details(self, feedback_ids):
+        """
+        批量获取反馈详情：优先读本地缓存，未命中的并发请求后写入缓存
+        :param feedback_ids: 反馈ID列表
+        :return: {反馈ID: 反馈详情}
+        """
+        cached = self.detail_cache.get_many(str(fid) for fid in feedback_ids) if self.detail_cache else {}
+        details = {fid: cached[str(fid)] for fid in feedback_ids if str(fid) in cached}
+        missing = [fid for fid in dict.fromkeys(feedback_ids) if fid not in details]
+
+        futures = {fid: self.request_executor.submit(self.get_feedback_detail, fid) for fid in missing}
+        fetched = {fid: future.result() for fid, future in futures.items()}
+        self.save_feedback_details(fetched)
+        details.update(fetched)
+        return details
+
+    def save_feedback_details(self, details):
+        """
+        将获取成功的反馈详情写入缓存
+        :param details: {反馈ID: 反馈详情}
+        """
+        if not self.detail_cache:
+            return
+        try:
+            self.detail_cache.set_many({str(fid): detail for fid, detail in details.items() if detail})
+        except Exception as e:
+            print(f"⚠️  写入反馈详情缓存失败: {str(e)}")
+
+    def reset_translate_stats(self):
+        """重置本次运行的翻译统计"""
+        with self.stats_lock:
+            self.translate_stats = {'hits': 0, 'misses': 0, 'chars_saved': 0, 'requests': 0, 'fallbacks': 0,
+                                    'skipped': 0, 'duplicates': 0}
+
+    def record_translate_stat(self, name, value=1):
+        """
+        累加翻译统计（线程安全）
+        :param name: 统计项
+        :param value: 增量
+        """
+        with self.stats_lock:
+            self.translate_stats[name] = self.translate_stats.get(name, 0) + value
+
+    def print_translate_stats(self):
+        """输出本次运行的翻译缓存统计"""
+        stats = self.translate_stats
+        total = stats['hits'] + stats['misses']
+        hit_rate = stats['hits'] / total * 100 if total else 0
+        print(f"🈯 翻译缓存统计: 命中{stats['hits']}次，未命中{stats['misses']}次，"
+              f"命中率{hit_rate:.1f}%，节省翻译{stats['chars_saved']}字符")
+        print(f"🈯 翻译请求统计: 请求{stats['requests']}次，批量拆分失败逐条重译{stats['fallbacks']}条，"
+              f"无需翻译跳过{stats['skipped']}条，重复文本去重{stats['duplicates']}条")
+
+    def needs_translation(self, text):
+        """
+        本地判断文本是否需要翻译（空文本、纯数字/链接/表情、已是中文的文本不翻译）
+        :param text: 原文
+        :return: 是否需要调用翻译接口
+        """
+        if not text or not text.strip():
+            return False
+        letters = [ch for ch in self.URL_PATTERN.sub('', text) if ch.isalpha()]
+        if not letters:
+            return False
+        if self.NON_CHINESE_CJK_PATTERN.search(text):
+            return True
+        cjk_count = sum(1 for ch in letters if self.CJK_PATTERN.match(ch))
+        return cjk_count / len(letters) < self.TRANSLATE_SKIP_CJK_RATIO
+
+    def translation_key(self, text):
+        """
+        翻译缓存的键：目标语言+原文的sha256
+        :param text: 原文
+        :return: 缓存键
+        """
+        return hashlib.sha256(f"{self.TRANSLATE_LANGUAGE}\n{text}".encode('utf-8')).hexdigest()
+
+    def get_cached_translation(self, text):
+        """
+        查询翻译缓存并记录命中统计
+        :param text: 原文
+        :return: 缓存的译文，未命中返回None
+        """
+        if self.translate_cache:
+            key = self.translation_key(text)
+            cached = self.translate_cache.get_many([key])
+            if key in cached:
+                self.record_translate_stat('hits')
+                self.record_translate_stat('chars_saved', len(text))
+                return cached[key]
+        self.record_translate_stat('misses')
+        return None
+
+    def save_translation(self, text, resp):
+        """
+        解析翻译接口响应，成功时写入翻译缓存
+        :param text: 原文
+        :param resp: 翻译接口响应JSON
+        :return: 译文（失败返回原文）
+        """
+        translated = resp.get("data")
+        if not translated:
+            return text
+        if self.translate_cache:
+            try:
+                self.translate_cache.set_many({self.translation_key(text): translated})
+            except Exception as e:
+                print(f"⚠️  写入翻译缓存失败: {str(e)}")
+        return translated
+
+    def post_translate(self, text):
+        """
+        调用翻译接口（不读写缓存）
+        :param text: 待翻译文本
+        :return: 翻译接口响应JSON
+        """
+        headers = {
+            **self.HEADERS,
+            "token": self.token,
+            "Content-Type": "text/plain"
+        }
+        params = {"lan": self.TRANSLATE_LANGUAGE}
+        self.record_translate_stat('requests')
+        response = self.http_request('POST', self.TRANSLATE_URL, 'translate', data=text.encode('utf-8'),
+                                     headers=headers, params=params)
+        return response.json()
+
+    def request_translation(self, text):
+        """
+        单条翻译（不读缓存，成功时写入缓存）
+        :param text: 待翻译文本
+        :return: 翻译结果，失败返回原文
+        """
+        try:
+            return self.save_translation(text, self.post_translate(text))
+        except Exception as e:
+            print(f"⚠️  翻译文本失败，返回原文: {str(e)}")
+            return text
+
     def translate_text(self, text):
         """
-        翻译文本
+        翻译文本（优先读翻译缓存）
         :param text: 待翻译文本
         :return: 翻译结果
         """
@@ -250,28 +1854,132 @@ class FeedbackCount(threading.Thread):
             if not text:
                 return ""
 
-            headers = {
-                **self.HEADERS,
-                "token": self.token,
-                "Content-Type": "text/plain"
-            }
-            params = {"lan": "中文"}
-            response = requests.post(self.TRANSLATE_URL, data=text.encode('utf-8'),
-                                     headers=headers, params=params)
-            return response.json().get("data", text)
+            if not self.needs_translation(text):
+                self.record_translate_stat('skipped')
+                return text
+
+            cached = self.get_cached_translation(text)
+            if cached is not None:
+                return cached
+
+            return self.request_translation(text)
         except Exception as e:
             print(f"⚠️  翻译文本失败，返回原文: {str(e)}")
             return text
 
-    def format_description(self, text):
+    def build_translate_batches(self, texts):
+        """
+        按字符数和条数上限将待翻译文本装箱
+        :param texts: 待翻译文本列表
+        :return: 批次列表 [[文本, ...], ...]
+        """
+        batches = []
+        batch = []
+        batch_chars = 0
+        for text in texts:
+            if batch and (batch_chars + len(text) > self.TRANSLATE_BATCH_MAX_CHARS
+                          or len(batch) >= self.TRANSLATE_BATCH_MAX_ITEMS):
+                batches.append(batch)
+                batch = []
+                batch_chars = 0
+            batch.append(text)
+            batch_chars += len(text)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def split_translate_batch(self, translated, count):
+        """
+        按编号分隔行拆分批量翻译结果
+        :param translated: 批量翻译返回的整段译文
+        :param count: 批次中的文本条数
+        :return: 按顺序排列的译文列表，编号缺失/重复/乱序时返回None
+        """
+        parts = self.TRANSLATE_DELIMITER_PATTERN.split(translated)
+        indexes = [int(index) for index in parts[1::2]]
+        if indexes != list(range(count)):
+            return None
+        return [part.strip() for part in parts[2::2]]
+
+    def translate_batch(self, texts):
+        """
+        一次请求翻译一个批次的文本，拆分失败时退回逐条翻译
+        :param texts: 待翻译文本列表（不含缓存命中的文本）
+        :return: {原文: 译文}
+        """
+        if len(texts) == 1:
+            return {texts[0]: self.request_translation(texts[0])}
+
+        payload = "\n".join(f"{self.TRANSLATE_DELIMITER.format(i)}\n{text}" for i, text in enumerate(texts))
+        parts = None
+        try:
+            translated = self.post_translate(payload).get("data")
+            if translated:
+                parts = self.split_translate_batch(translated, len(texts))
+        except Exception as e:
+            print(f"⚠️  批量翻译失败，改为逐条翻译: {str(e)}")
+
+        if parts is None:
+            self.record_translate_stat('fallbacks', len(texts))
+            return {text: self.request_translation(text) for text in texts}
+
+        translations = dict(zip(texts, parts))
+        if self.translate_cache:
+            try:
+                self.translate_cache.set_many({self.translation_key(text): translated
+                                               for text, translated in translations.items() if translated})
+            except Exception as e:
+                print(f"⚠️  写入翻译缓存失败: {str(e)}")
+        return translations
+
+    def translate_texts(self, texts):
+        """
+        批量翻译一次运行中的所有文本：去重 → 跳过无需翻译的文本 → 查缓存 → 装箱并发请求 → 拆分回各条
+        :param texts: 待翻译文本
+        :return: {原文: 译文}
+        """
+        texts = [text for text in texts if text]
+        unique_texts = list(dict.fromkeys(texts))
+        self.record_translate_stat('duplicates', len(texts) - len(unique_texts))
+
+        # 无需翻译的文本直接以原文作为译文
+        translations = {text: text for text in unique_texts if not self.needs_translation(text)}
+        self.record_translate_stat('skipped', len(translations))
+        texts = [text for text in unique_texts if text not in translations]
+        if not texts:
+            return translations
+        if not self.token:
+            print("❌ 未获取到CMS token，无法翻译文本")
+            translations.update({text: text for text in texts})
+            return translations
+
+        keys = {text: self.translation_key(text) for text in texts}
+        cached = self.translate_cache.get_many(keys.values()) if self.translate_cache else {}
+        for text, key in keys.items():
+            if key in cached:
+                translations[text] = cached[key]
+                self.record_translate_stat('hits')
+                self.record_translate_stat('chars_saved', len(text))
+
+        missing = [text for text in texts if text not in translations]
+        self.record_translate_stat('misses', len(missing))
+        futures = [self.request_executor.submit(self.translate_batch, batch)
+                   for batch in self.build_translate_batches(missing)]
+        for future in futures:
+            translations.update(future.result())
+        return translations
+
+    def format_description(self, text, translated=None):
         """
         格式化问题描述（添加翻译）
         :param text: 问题描述
+        :param translated: 已有的译文，为None时调用翻译接口
         :return: 格式化后的描述
         """
         if not text:
             return ""
-        translated = self.translate_text(text)
+        if translated is None:
+            translated = self.translate_text(text)
         return f"\n**原文**：{text}\n**译文**：{translated}"
 
     @staticmethod
@@ -332,77 +2040,257 @@ class FeedbackCount(threading.Thread):
         # 最终兜底：强制转为字符串（避免极端情况返回 None）
         return str(feedback_value) if feedback_value is not None else ""
 
-    def process_feedback_type(self, app_name, client_group, feedback_type_id, feedback_type_name, start_time, end_time):
+    def extract_description(self, detail):
+        """
+        提取反馈详情中的问题描述（模板反馈优先取templateInfo中的描述）
+        :param detail: 反馈详情
+        :return: 问题描述原文
+        """
+        template_info = detail.get('templateInfo')
+        if template_info != '' and template_info is not None:
+            return self.get_feedback_value_from_json_str(template_info)
+        return detail.get('question', '')
+
+    def build_feedback_item(self, item, detail, description):
+        """
+        组装单条反馈的展示数据
+        :param item: 反馈列表中的数据
+        :param detail: 反馈详情
+        :param description: 问题描述（原文，批量翻译后再格式化）
+        :return: 展示数据
+        """
+        return {
+            "用户ID": str(item.get('userId', 'None')),
+            "IP地区": item.get('region', detail.get('region', '')),
+            "IP地址": item.get('ipAddress', detail.get('ipAddress', '')),
+            "版本渠道": item.get('appName', ''),
+            "问题描述": description,
+            "设备ID": item.get('deviceId', ''),
+            "版本信息": item.get('appVersion', ''),
+            "反馈时间": item.get('createTime', ''),
+            "反馈截图": self.format_images(detail.get('imgUrl', ''))
+        }
+
+    @staticmethod
+    def build_type_result(app_name, client_group, feedback_type_id, feedback_type_name, items, last_seen=None):
+        """
+        组装单个应用-渠道组-反馈类型的处理结果
+        :param last_seen: 本次处理到的最新一条反馈 {'createTime': 创建时间, 'id': 反馈ID}，用于推进水位线
+        :return: 处理结果
+        """
+        return {
+            'appName': app_name,
+            'clientGroup': client_group,
+            'feedback_type': feedback_type_name,
+            'feedback_type_id': feedback_type_id,
+            'count': len(items),
+            'items': items,
+            'last_seen': last_seen
+        }
+
+    @staticmethod
+    def watermark_key(app_name, client_group, feedback_type_id):
+        """水位线的键：应用|渠道组|反馈类型ID"""
+        return f"{app_name}|{client_group}|{feedback_type_id}"
+
+    @staticmethod
+    def select_after_watermark(items, watermark, last_seen=None):
+        """
+        过滤出水位线之后的反馈，并返回更新后的最新反馈位置
+        :param items: 一页反馈
+        :param watermark: 水位线 {'createTime': 创建时间, 'id': 反馈ID}，None表示不过滤
+        :param last_seen: 目前为止的最新反馈位置
+        :return: (新反馈列表, 最新反馈位置)
+        """
+        mark = (watermark['createTime'], watermark['id']) if watermark else None
+        selected = []
+        for item in items:
+            position = (item.get('createTime', ''), item.get('id', 0))
+            if mark is not None and position <= mark:
+                continue
+            selected.append(item)
+            if last_seen is None or position > (last_seen['createTime'], last_seen['id']):
+                last_seen = {'createTime': position[0], 'id': position[1]}
+        return selected, last_seen
+
+    def apply_watermarks(self, tasks):
+        """
+        按水位线调整每个任务的开始时间：有水位线的任务从上次推送的位置继续拉取
+        :param tasks: (应用, 渠道组, 类型ID, 类型名, 开始时间, 结束时间) 列表
+        :return: 追加了水位线参数的任务列表
+        """
+        if not self.watermarks:
+            return tasks
+        keys = {task: self.watermark_key(*task[:3]) for task in tasks}
+        watermarks = self.watermarks.get_many(keys.values())
+        lookback_start, _ = self.get_time_range(hours=self.WATERMARK_MAX_LOOKBACK_HOURS)
+        planned = []
+        for task in tasks:
+            watermark = watermarks.get(keys[task])
+            if watermark is None:
+                planned.append(task)
+                continue
+            start_time = max(watermark['createTime'], lookback_start)
+            planned.append((*task[:4], start_time, task[5], watermark))
+        return planned
+
+    def save_watermarks(self, results, end_time):
+        """
+        推进水位线（调用方只传入卡片已确认投递的渠道的结果）
+        本次没有新反馈的类型推进到窗口结束时间，下次从该位置继续，不受定时任务触发时间的影响
+        :param results: process_feedback_type 的结果列表
+        :param end_time: 本次拉取窗口的结束时间
+        """
+        if not self.watermarks:
+            return
+        marks = {self.watermark_key(result['appName'], result['clientGroup'], result['feedback_type_id']):
+                 result.get('last_seen') or {'createTime': end_time, 'id': 0} for result in results}
+        try:
+            self.watermarks.set_many(marks)
+        except Exception as e:
+            print(f"⚠️  保存水位线失败: {str(e)}")
+
+    def process_feedback_type(self, app_name, client_group, feedback_type_id, feedback_type_name, start_time, end_time,
+                              watermark=None):
         """
         处理单个应用-渠道组-反馈类型的数据
-        :param app_config: 应用配置
+        :param app_name: 应用名称
+        :param client_group: 渠道组编码
         :param feedback_type_id: 反馈类型ID
         :param feedback_type_name: 反馈类型名称
         :param start_time: 开始时间
         :param end_time: 结束时间
+        :param watermark: 水位线，只处理其后的反馈
         :return: 处理结果
         """
         try:
-            # print(app_config)
-            appName = app_name
-            clientGroup = client_group
-            # clientGroupName = app_config.get('clientGroupName')
-
-            if not appName or not clientGroup:
+            if not app_name or not client_group:
                 print("❌ 应用配置不完整")
                 return None
 
-            # 获取反馈数据
-            data = self.get_feedback(appName, clientGroup, [feedback_type_id], start_time, end_time)
-
-            if not data or not data.get('content'):
-                return {
-                    'appName': appName,
-                    'clientGroup': clientGroup,
-                    # 'clientGroupName': clientGroupName,
-                    'feedback_type': feedback_type_name,
-                    'feedback_type_id': feedback_type_id,
-                    'count': 0,
-                    'items': []
-                }
-
-            # 处理反馈详情
+            # 逐页获取反馈数据，每页到达后即获取该页详情（后续页仍在后台预取）
             processed = []
-            for item in data['content']:
-                detail = self.get_feedback_detail(item['id'])
-                text_data = {
-                    "用户ID": str(item.get('userId', 'None')),
-                    "IP地区": item.get('region', detail.get('region', '')),
-                    "IP地址": item.get('ipAddress', detail.get('ipAddress', '')),
-                    "版本渠道": item.get('appName', ''),
-                    "问题描述": self.format_description(detail.get('question', '')),
-                    "设备ID": item.get('deviceId', ''),
-                    "版本信息": item.get('appVersion', ''),
-                    "反馈时间": item.get('createTime', ''),
-                    "反馈截图": self.format_images(detail.get('imgUrl', ''))
-                }
-                if detail.get('templateInfo') != '' and detail.get('templateInfo') is not None:
-                    print(item['id'])
-                    data = detail.get('templateInfo')
-                    # print("===================="+data)
-                    feed_detail = self.get_feedback_value_from_json_str(data)
-                    print("================="+feed_detail)
-                    text_data.update({"问题描述": self.format_description(feed_detail)})
-                processed.append(text_data)
+            last_seen = None
+            for page_items in self.iter_feedback_pages(app_name, client_group, [feedback_type_id],
+                                                       start_time, end_time):
+                page_items, last_seen = self.select_after_watermark(page_items, watermark, last_seen)
+                details = self.get_feedback_details([item['id'] for item in page_items])
+                for item in page_items:
+                    detail = details.get(item['id'], {})
+                    processed.append(self.build_feedback_item(item, detail, self.extract_description(detail)))
+
+            return self.build_type_result(app_name, client_group, feedback_type_id, feedback_type_name, processed,
+                                          last_seen)
+        except Exception as e:
+            print(f"❌ 处理反馈数据失败: {str(e)}")
+            return None
 
-            return {
-                'appName': appName,
-                'clientGroup': clientGroup,
-                # 'clientGroupName': clientGroupName,
-                'feedback_type': feedback_type_name,
-                'feedback_type_id': feedback_type_id,
-                'count': len(processed),
-                'items': processed
-            }
+    @staticmethod
+    def group_channel_tasks(tasks):
+        """
+        将按反馈类型拆分的任务合并为按应用-渠道组的任务
+        :param tasks: process_feedback_type 的任务参数列表
+        :return: [(应用, 渠道组, {类型ID字符串: 类型任务}), ...]
+        """
+        channels = {}
+        for task in tasks:
+            channels.setdefault((task[0], task[1]), {})[str(task[2])] = task
+        return [(app_name, client_group, type_tasks) for (app_name, client_group), type_tasks in channels.items()]
+
+    def bucket_channel_items(self, page_items, type_tasks, last_seen):
+        """
+        按反馈类型拆分一页渠道反馈，并按各类型自己的开始时间和水位线过滤
+        :param page_items: 一页反馈
+        :param type_tasks: {类型ID字符串: 类型任务}
+        :param last_seen: {类型ID字符串: 最新反馈位置}（会被更新）
+        :return: [(类型ID字符串, 反馈), ...]，有反馈缺少类型字段或类型不在请求范围内时返回None（无法按类型拆分）
+        """
+        groups = {}
+        for item in page_items:
+            type_key = str(item.get(self.FEEDBACK_TYPE_FIELD))
+            task = type_tasks.get(type_key)
+            if task is None:
+                return None
+            if item.get('createTime', '') < task[4]:
+                continue
+            groups.setdefault(type_key, []).append(item)
+
+        selected = []
+        for type_key, items in groups.items():
+            task = type_tasks[type_key]
+            watermark = task[6] if len(task) > 6 else None
+            items, last_seen[type_key] = self.select_after_watermark(items, watermark, last_seen.get(type_key))
+            selected.extend((type_key, item) for item in items)
+        return selected
+
+    def warn_type_field(self, app_name, client_group):
+        """渠道查询的反馈无法按类型拆分时的告警"""
+        print(f"⚠️  {app_name}/{client_group} 的反馈列表项缺少{self.FEEDBACK_TYPE_FIELD}字段或类型不在请求范围内，"
+              f"改为逐类型查询（请确认 FEEDBACK_TYPE_FIELD）")
+
+    def process_feedback_channel(self, app_name, client_group, type_tasks):
+        """
+        用一次分页查询处理一个应用-渠道组下的所有反馈类型
+        :param app_name: 应用名称
+        :param client_group: 渠道组编码
+        :param type_tasks: {类型ID字符串: process_feedback_type 的任务参数}
+        :return: 每个反馈类型一个处理结果（与 process_feedback_type 结构相同）
+        """
+        try:
+            if not app_name or not client_group:
+                print("❌ 应用配置不完整")
+                return None
+
+            start_time = min(task[4] for task in type_tasks.values())
+            end_time = max(task[5] for task in type_tasks.values())
+            type_ids = [task[2] for task in type_tasks.values()]
+            buckets = {type_key: [] for type_key in type_tasks}
+            last_seen = {}
+            for page_items in self.iter_feedback_pages(app_name, client_group, type_ids, start_time, end_time):
+                selected = self.bucket_channel_items(page_items, type_tasks, last_seen)
+                if selected is None:
+                    self.warn_type_field(app_name, client_group)
+                    results = [self.process_feedback_type(*task) for task in type_tasks.values()]
+                    return [result for result in results if result is not None]
+                details = self.get_feedback_details([item['id'] for _, item in selected])
+                for type_key, item in selected:
+                    detail = details.get(item['id'], {})
+                    buckets[type_key].append(self.build_feedback_item(item, detail, self.extract_description(detail)))
+
+            return [self.build_type_result(app_name, client_group, task[2], task[3], buckets[type_key],
+                                           last_seen.get(type_key))
+                    for type_key, task in type_tasks.items()]
         except Exception as e:
             print(f"❌ 处理反馈数据失败: {str(e)}")
             return None
 
+    def translate_results(self, results):
+        """
+        批量翻译一次运行中所有反馈的问题描述，并格式化为 原文/译文
+        :param results: process_feedback_type 的结果列表
+        :return: 翻译后的结果列表
+        """
+        items = [item for result in results for item in result['items']]
+        translations = self.translate_texts(item['问题描述'] for item in items)
+        for item in items:
+            text = item['问题描述']
+            item['问题描述'] = self.format_description(text, translations.get(text, text))
+        return results
+
+    def collect_feedback(self, tasks, engine=None):
+        """
+        抓取所有任务的反馈（列表 → 详情），再统一批量翻译
+        :param tasks: process_feedback_type 的任务参数列表
+        :param engine: thread 或 async，默认使用实例配置
+        :return: 结果列表（每个反馈类型一个）
+        """
+        if self.FEEDBACK_QUERY_MODE == 'channel':
+            channel_results = self.run_tasks('process_feedback_channel', self.group_channel_tasks(tasks), engine)
+            results = [result for type_results in channel_results for result in type_results]
+        else:
+            results = self.run_tasks('process_feedback_type', tasks, engine)
+        return self.translate_results(results)
+
     def process_feedback_count_only(self, app_name, client_group, feedback_type_id, feedback_type_name, start_time, end_time):
         """
         仅处理反馈数量（优化版，用于周汇总统计）
@@ -419,35 +2307,325 @@ class FeedbackCount(threading.Thread):
                 print("❌ 应用配置不完整")
                 return None
 
-            # 仅获取反馈数量
-            count = self.get_feedback_count_only(app_name, client_group, [feedback_type_id], start_time, end_time)
-
+            # 仅获取反馈数量
+            count = self.get_feedback_count_only(app_name, client_group, [feedback_type_id], start_time, end_time)
+            if count is None:
+                return None
+
+            return {
+                'appName': app_name,
+                'clientGroup': client_group,
+                'feedback_type': feedback_type_name,
+                'feedback_type_id': feedback_type_id,
+                'start_time': start_time,
+                'end_time': end_time,
+                'count': count
+            }
+        except Exception as e:
+            print(f"❌ 处理反馈数量失败: {str(e)}")
+            return None
+
+    def run_tasks(self, func_name, tasks, engine=None):
+        """
+        并发执行任务列表
+        :param func_name: 处理方法名（async引擎使用同名的 _async_ 前缀方法）
+        :param tasks: 任务参数列表
+        :param engine: thread（线程池）或 async（asyncio），默认使用实例配置
+        :return: 非空结果列表（与任务顺序一致）
+        """
+        engine = engine or self.engine
+        if engine == 'async':
+            if import_aiohttp() is None:
+                print("⚠️  未安装aiohttp，async引擎不可用，改用线程池")
+            else:
+                # 在事件循环外先取token：需要登录时同步请求不会阻塞事件循环
+                self.token_manager.get()
+                return asyncio.run(self._async_gather(getattr(self, f"_async_{func_name}"), tasks))
+
+        with ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as executor:
+            futures = [executor.submit(getattr(self, func_name), *task) for task in tasks]
+            results = [future.result() for future in futures]
+        return [result for result in results if result is not None]
+
+    ####--------------------async抓取引擎
+    async def _async_gather(self, func, tasks):
+        """
+        在单个事件循环中并发执行所有任务，按host用信号量限制并发
+        :param func: async处理方法
+        :param tasks: 任务参数列表
+        :return: 非空结果列表（与任务顺序一致）
+        """
+        self._host_semaphores.clear()
+        # 并发由每个host的信号量控制，连接器本身不再限制
+        connector = aiohttp.TCPConnector(limit=0, limit_per_host=0)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            results = await asyncio.gather(*(func(session, *task) for task in tasks))
+        return [result for result in results if result is not None]
+
+    async def _async_token(self):
+        """
+        事件循环中获取CMS token：token有效时直接返回，需要登录时放到线程中执行，不阻塞事件循环
+        :return: token，登录失败返回空字符串
+        """
+        if self.token_manager.valid():
+            return self.token_manager.token
+        return await asyncio.get_running_loop().run_in_executor(self.request_executor, self.token_manager.get)
+
+    async def _async_request(self, session, method, url, endpoint, **kwargs):
+        """
+        async版本的请求：按host限流，按接口设置超时，GET请求失败退避重试
+        带token的请求被CMS以token失效拒绝时（鉴权阶段即被拒绝，服务端未执行），重新登录一次并重放请求
+        :return: 响应JSON
+        """
+        status, body = await self._async_send(session, method, url, endpoint, **kwargs)
+        headers = kwargs.get('headers') or {}
+        if headers.get('token') and self.is_token_expired(status, body):
+            print("🔑 CMS token已失效，重新登录后重试")
+            # 登录是同步请求，放到线程中执行，不阻塞事件循环
+            token = await asyncio.get_running_loop().run_in_executor(
+                None, self.token_manager.refresh, headers['token'])
+            if token:
+                kwargs['headers'] = {**headers, 'token': token}
+                status, body = await self._async_send(session, method, url, endpoint, **kwargs)
+        return json.loads(body) if body else None
+
+    async def _async_send(self, session, method, url, endpoint, **kwargs):
+        """
+        发送一次async请求（含限流、超时和GET重试）
+        :return: (HTTP状态码, 响应体)
+        """
+        host = urlparse(url).netloc
+        if host not in self._host_semaphores:
+            self._host_semaphores[host] = asyncio.BoundedSemaphore(self.ASYNC_LIMIT_PER_HOST)
+        connect_timeout, read_timeout = self.TIMEOUTS.get(endpoint, self.DEFAULT_TIMEOUT)
+        timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+        retries = self.RETRY_TOTAL if method == 'GET' else 0
+
+        for attempt in range(retries + 1):
+            try:
+                async with self._host_semaphores[host]:
+                    async with session.request(method, url, timeout=timeout, **kwargs) as resp:
+                        if resp.status in self.RETRY_STATUS_FORCELIST and attempt < retries:
+                            raise aiohttp.ClientResponseError(resp.request_info, resp.history, status=resp.status)
+                        return resp.status, await resp.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt >= retries:
+                    raise
+            await asyncio.sleep(self.RETRY_BACKOFF_FACTOR * (2 ** attempt))
+
+    async def _async_get_feedback(self, session, appName, clientGroup, feedback_type, start_date, end_date,
+                                  page=0, size=200):
+        """async版本的 get_feedback"""
+        try:
+            token = await self._async_token()
+            if not token:
+                print("❌ 未获取到CMS token，无法获取反馈数据")
+                return {}
+
+            headers = {**self.HEADERS, 'token': token}
+            data = {
+                "appName": appName,
+                "clientGroup": clientGroup,
+                "types": feedback_type,
+                "startDate": start_date,
+                "endDate": end_date,
+                "page": page,
+                "size": size
+            }
+            resp = await self._async_request(session, 'POST', self.FEEDBACK_URL, 'feedback', json=data, headers=headers)
+            return resp.get('data', {})
+        except Exception as e:
+            print(f"❌ 获取反馈数据失败: {str(e)}")
+            return {}
+
+    async def _async_get_feedback_detail(self, session, feedback_id):
+        """async版本的 get_feedback_detail"""
+        try:
+            token = await self._async_token()
+            if not token:
+                print("❌ 未获取到CMS token，无法获取反馈详情")
+                return {}
+
+            headers = {**self.HEADERS, 'token': token}
+            resp = await self._async_request(session, 'GET', self.FEEDBACK_DETAIL_URL.format(feedback_id), 'detail',
+                                             headers=headers)
+            return resp.get('data', {})
+        except Exception as e:
+            print(f"❌ 获取反馈详情失败: {str(e)}")
+            return {}
+
+    async def _async_iter_feedback_pages(self, session, appName, clientGroup, feedback_type, start_date, end_date):
+        """async版本的 iter_feedback_pages"""
+        size = self.FEEDBACK_PAGE_SIZE
+        first = await self._async_get_feedback(session, appName, clientGroup, feedback_type, start_date, end_date,
+                                               page=0, size=size)
+        if not first:
+            raise RuntimeError(f"{appName}/{clientGroup} 反馈列表第1页获取失败")
+        seen_ids = set()
+        yield self.new_page_items(first, seen_ids)
+
+        total_pages = self.count_pages(first.get('totalElements', 0), size)
+        pending = deque()
+        next_page = 1
+        try:
+            while next_page < total_pages or pending:
+                while next_page < total_pages and len(pending) < self.FEEDBACK_PREFETCH_PAGES:
+                    pending.append((next_page, asyncio.ensure_future(self._async_get_feedback(
+                        session, appName, clientGroup, feedback_type, start_date, end_date,
+                        page=next_page, size=size))))
+                    next_page += 1
+                page, task = pending.popleft()
+                data = await task
+                if not data:
+                    raise RuntimeError(f"{appName}/{clientGroup} 反馈列表第{page + 1}/{total_pages}页获取失败")
+                yield self.new_page_items(data, seen_ids)
+        finally:
+            for _, task in pending:
+                task.cancel()
+
+    async def _async_get_feedback_details(self, session, feedback_ids):
+        """
+        async版本的 get_feedback_details，未命中缓存的详情并发请求
+        SQLite缓存的读写放到线程中执行，不阻塞事件循环
+        """
+        loop = asyncio.get_running_loop()
+        cached = {}
+        if self.detail_cache:
+            keys = [str(fid) for fid in feedback_ids]
+            cached = await loop.run_in_executor(self.request_executor, self.detail_cache.get_many, keys)
+        details = {fid: cached[str(fid)] for fid in feedback_ids if str(fid) in cached}
+        missing = [fid for fid in dict.fromkeys(feedback_ids) if fid not in details]
+
+        fetched = await asyncio.gather(*(self._async_get_feedback_detail(session, fid) for fid in missing))
+        fetched = dict(zip(missing, fetched))
+        await loop.run_in_executor(self.request_executor, self.save_feedback_details, fetched)
+        details.update(fetched)
+        return details
+
+    async def _async_process_feedback_type(self, session, app_name, client_group, feedback_type_id,
+                                           feedback_type_name, start_time, end_time, watermark=None):
+        """async版本的 process_feedback_type，同一类型下的详情请求全部并发"""
+        try:
+            if not app_name or not client_group:
+                print("❌ 应用配置不完整")
+                return None
+
+            processed = []
+            last_seen = None
+            async for page_items in self._async_iter_feedback_pages(session, app_name, client_group,
+                                                                    [feedback_type_id], start_time, end_time):
+                page_items, last_seen = self.select_after_watermark(page_items, watermark, last_seen)
+                details = await self._async_get_feedback_details(session, [item['id'] for item in page_items])
+                for item in page_items:
+                    detail = details.get(item['id'], {})
+                    processed.append(self.build_feedback_item(item, detail, self.extract_description(detail)))
+            return self.build_type_result(app_name, client_group, feedback_type_id, feedback_type_name, processed,
+                                          last_seen)
+        except Exception as e:
+            print(f"❌ 处理反馈数据失败: {str(e)}")
+            return None
+
+    async def _async_process_feedback_channel(self, session, app_name, client_group, type_tasks):
+        """async版本的 process_feedback_channel"""
+        try:
+            if not app_name or not client_group:
+                print("❌ 应用配置不完整")
+                return None
+
+            start_time = min(task[4] for task in type_tasks.values())
+            end_time = max(task[5] for task in type_tasks.values())
+            type_ids = [task[2] for task in type_tasks.values()]
+            buckets = {type_key: [] for type_key in type_tasks}
+            last_seen = {}
+            async for page_items in self._async_iter_feedback_pages(session, app_name, client_group, type_ids,
+                                                                    start_time, end_time):
+                selected = self.bucket_channel_items(page_items, type_tasks, last_seen)
+                if selected is None:
+                    self.warn_type_field(app_name, client_group)
+                    results = await asyncio.gather(*(self._async_process_feedback_type(session, *task)
+                                                     for task in type_tasks.values()))
+                    return [result for result in results if result is not None]
+                details = await self._async_get_feedback_details(session, [item['id'] for _, item in selected])
+                for type_key, item in selected:
+                    detail = details.get(item['id'], {})
+                    buckets[type_key].append(self.build_feedback_item(item, detail, self.extract_description(detail)))
+
+            return [self.build_type_result(app_name, client_group, task[2], task[3], buckets[type_key],
+                                           last_seen.get(type_key))
+                    for type_key, task in type_tasks.items()]
+        except Exception as e:
+            print(f"❌ 处理反馈数据失败: {str(e)}")
+            return None
+
+    async def _async_process_feedback_count_only(self, session, app_name, client_group, feedback_type_id,
+                                                 feedback_type_name, start_time, end_time):
+        """async版本的 process_feedback_count_only"""
+        try:
+            if not app_name or not client_group:
+                print("❌ 应用配置不完整")
+                return None
+
+            data = await self._async_get_feedback(session, app_name, client_group, [feedback_type_id],
+                                                  start_time, end_time, page=0, size=1)
+            if not data:
+                return None
             return {
                 'appName': app_name,
                 'clientGroup': client_group,
                 'feedback_type': feedback_type_name,
                 'feedback_type_id': feedback_type_id,
-                'count': count
+                'start_time': start_time,
+                'end_time': end_time,
+                'count': data.get('totalElements', 0)
             }
         except Exception as e:
             print(f"❌ 处理反馈数量失败: {str(e)}")
             return None
 
+    @staticmethod
+    def build_card(title, content):
+        """
+        构建飞书markdown卡片
+        :param title: 卡片标题
+        :param content: markdown正文
+        :return: 请求体
+        """
+        return {
+            "msg_type": "interactive",
+            "card": {
+                "elements": [{
+                    "tag": "div",
+                    "text": {
+                        "content": content,
+                        "tag": "lark_md"
+                    }
+                }],
+                "header": {
+                    "title": {
+                        "content": title,
+                        "tag": "plain_text"
+                    }
+                }
+            }
+        }
+
     def send_to_feishu(self, data=None, platform=None, start_time=None, end_time=None, type=None, title=None):
         """
-        发送数据到飞书
-        :param data: 要发送的数据
+        发送数据到飞书，内容超过单张卡片上限时自动拆成多张（标题带 1/3、2/3 编号）
+        卡片提交到投递队列后立即返回，由后台按Webhook限流发送，调用 deliver_feishu 等待发送完成
+        :param data: 要发送的数据：字符串（按行拆分）或内容块列表（块不会被拆到两张卡片中）
         :param platform: 平台（Android/iOS）
         :param start_time: 开始时间
         :param end_time: 结束时间
+        :return: 每张卡片的投递凭据 [(发件箱卡片ID, Future), ...]，提交失败返回None
         """
         try:
             if not data:
-                return
+                return []
             url = self.WEBHOOK_URLS.get(platform)
             if not url:
                 print(f"❌ 未配置{platform}平台的飞书Webhook URL")
-                return
+                return None
 
             # 添加时间段信息到标题
             if type is None:
@@ -463,39 +2641,88 @@ class FeedbackCount(threading.Thread):
             else:
                 url = self.WEBHOOK_URLS.get("Count")
                 title = f"{end_time} 用户反馈 ({type})"
-            # 使用飞书markdown格式
-            markdown_content = f"{data}"
-
-            card = {
-                "msg_type": "interactive",
-                "card": {
-                    "elements": [{
-                        "tag": "div",
-                        "text": {
-                            "content": markdown_content,
-                            "tag": "lark_md"
-                        }
-                    }],
-                    "header": {
-                        "title": {
-                            "content": title,
-                            "tag": "plain_text"
-                        }
-                    }
-                }
-            }
-            response = requests.post(url, json=card)
-            if response.status_code != 200:
-                print(f"❌ 飞书消息发送失败: {response.text}")
-            else:
-                print(f"✅ 飞书消息发送成功")
+
+            # 使用飞书markdown格式，按大小拆分为多张卡片
+            blocks = data.splitlines(keepends=True) if isinstance(data, str) else data
+            cards = CardBuilder(title, self.FEISHU_CARD_MAX_BYTES).extend(blocks).build()
+            webhook = next((name for name, webhook_url in self.WEBHOOK_URLS.items() if webhook_url == url), platform)
+            return [self.delivery.submit(webhook, url, card_title, self.build_card(card_title, markdown_content))
+                    for card_title, markdown_content in cards]
         except Exception as e:
             print(f"❌ 发送飞书消息失败: {str(e)}")
+            return None
+
+    @staticmethod
+    def confirm_delivery(receipts):
+        """
+        确认一组卡片不会丢失：每张卡片都已写入发件箱（失败时下次运行补发），或已发送成功
+        未写入发件箱的卡片会等待其发送完成
+        :param receipts: send_to_feishu 返回的投递凭据，None表示提交失败
+        :return: 是否全部确认
+        """
+        if receipts is None:
+            return False
+        return all(card_id is not None or future.result()['status'] == 'delivered'
+                   for card_id, future in receipts)
+
+    def resend_outbox(self):
+        """
+        优先补发发件箱中之前未投递成功的卡片
+        :return: 补发的卡片数
+        """
+        count = self.delivery.resend_pending()
+        if count:
+            print(f"📮 发件箱中有{count}张未投递的卡片，优先补发")
+        return count
+
+    def deliver_feishu(self):
+        """
+        等待投递队列中的飞书卡片全部发送完成，输出投递报告
+        :return: 投递报告列表
+        """
+        report = self.delivery.join()
+        if report:
+            delivered = sum(1 for item in report if item['status'] == 'delivered')
+            retried = sum(1 for item in report if item['attempts'] > 1)
+            print(f"📮 飞书投递：共{len(report)}张卡片，成功{delivered}张，失败{len(report) - delivered}张，重试过{retried}张")
+            for item in report:
+                if item['status'] != 'delivered':
+                    print(f"   ❌ [{item['webhook']}] {item['title']}: {item['error']}")
+        return report
 
-    def get_recent_feedback(self, hours=2):
+    @staticmethod
+    def render_feedback_blocks(data):
+        """
+        渲染一个应用渠道组的反馈推送内容
+        :param data: get_recent_feedback 中按应用和渠道组汇总的数据
+        :return: 内容块列表：汇总信息为一块，每条反馈一块
+        """
+        header = [
+            f"**应用名称**: {data['appName']}\n",
+            f"**渠道组**: {data['clientGroup']}\n",
+            f"**总反馈数**: {data['total_count']}\n\n",
+            "**分类统计**:\n",
+        ]
+        for type_info in data['types'].values():
+            header.append(f"- **{type_info['name']}**: {type_info['count']}条\n")
+        header.append("\n**详细反馈**:\n")
+
+        blocks = ["".join(header)]
+        for item in data['items']:
+            # 加粗关键字段
+            blocks.append("\n".join(
+                f"**{k}**: {v}" if k in ["问题描述", "反馈类型"]
+                else f"{k}: {v}"
+                for k, v in item.items()
+            ) + "\n\n")
+        return blocks
+
+    def get_recent_feedback(self, hours=2, engine=None, incremental=None):
         """
         获取最近几小时的反馈
-        :param hours: 小时数
+        :param hours: 小时数（无水位线时的拉取范围）
+        :param engine: 抓取引擎，thread 或 async，默认使用实例配置
+        :param incremental: 是否按水位线增量拉取（每条反馈只推送一次），默认使用INCREMENTAL
         """
         try:
             print(f"⏳ 开始获取最近{hours}小时的反馈数据...")
@@ -505,6 +2732,7 @@ class FeedbackCount(threading.Thread):
                 return
 
             start_time, end_time = self.get_time_range(hours=hours)
+            self.reset_translate_stats()
 
             # 准备所有需要处理的任务
             tasks = []
@@ -519,10 +2747,13 @@ class FeedbackCount(threading.Thread):
                 print("⚠️  没有需要处理的反馈类型")
                 return
 
-            # 使用线程池处理所有任务
-            with ThreadPoolExecutor() as executor:
-                futures = [executor.submit(self.process_feedback_type, *task) for task in tasks]
-                self.results = [future.result() for future in futures if future.result() is not None]
+            incremental = self.INCREMENTAL if incremental is None else incremental
+            if incremental:
+                tasks = self.apply_watermarks(tasks)
+                start_time = min(task[4] for task in tasks)
+
+            # 并发处理所有任务，再统一批量翻译
+            self.results = self.collect_feedback(tasks, engine)
             print(self.results)
 
             # 按应用和渠道组分类数据
@@ -554,31 +2785,28 @@ class FeedbackCount(threading.Thread):
                 print(app_channel_data)
 
             # 按应用和渠道组发送消息
+            receipts = {}
             for key, data in app_channel_data.items():
-                # 构建消息内容
-                content = f"**应用名称**: {data['appName']}\n"
-                content += f"**渠道组**: {data['clientGroup']}\n"
-                content += f"**总反馈数**: {data['total_count']}\n\n"
-
-                content += "**分类统计**:\n"
-                for type_info in data['types'].values():
-                    content += f"- **{type_info['name']}**: {type_info['count']}条\n"
-
-                content += "\n**详细反馈**:\n"
-                for item in data['items']:
-                    # 加粗关键字段
-                    item_content = "\n".join(
-                        f"**{k}**: {v}" if k in ["问题描述", "反馈类型"]
-                        else f"{k}: {v}"
-                        for k, v in item.items()
-                    ) + "\n\n"
-                    content += item_content
+                # 构建消息内容（每条反馈一个内容块，发送时按卡片大小拆分）
+                content = self.render_feedback_blocks(data)
 
                 # 发送消息，根据应用名选择平台
                 platform = 'iOS' if 'iOS' in data['appName'] or 'ios' in data['appName'] else 'Android'
-                self.send_to_feishu(content, platform, start_time, end_time)
+                receipts[key] = self.send_to_feishu(content, platform, start_time, end_time)
+
+            if incremental:
+                # 逐渠道推进水位线：该渠道的卡片全部写入发件箱或已发送成功才推进，否则下次重新拉取
+                # 没有新反馈的渠道无需投递，直接推进到窗口结束时间
+                unconfirmed = {key for key, channel_receipts in receipts.items()
+                               if not self.confirm_delivery(channel_receipts)}
+                for key in unconfirmed:
+                    print(f"⚠️  {key} 的飞书卡片未能确认投递，不推进水位线")
+                self.save_watermarks([result for result in self.results
+                                      if f"{result['appName']}_{result['clientGroup']}" not in unconfirmed], end_time)
 
             print(f"✅ 最近{hours}小时反馈统计完成")
+            self.print_translate_stats()
+            self.print_connection_stats()
 
         except Exception as e:
             print(f"❌ 获取最近反馈失败: {str(e)}")
@@ -604,7 +2832,233 @@ class FeedbackCount(threading.Thread):
         else:
             return "无变化"
 
-    def get_weekly_summary(self):
+    def summary_windows(self, days):
+        """
+        日报/周报的对比时间窗口（基准时间规范化为当天上午10点）
+        :param days: 窗口天数
+        :return: ((本期开始, 本期结束), (上期开始, 上期结束))
+        """
+        standard_now = self.now.replace(hour=self.SUMMARY_BASE_HOUR, minute=0, second=0, microsecond=0)
+        fmt = '%Y-%m-%d %H:%M:%S'
+        return (
+            ((standard_now - timedelta(days=days)).strftime(fmt), standard_now.strftime(fmt)),
+            ((standard_now - timedelta(days=days * 2)).strftime(fmt), (standard_now - timedelta(days=days)).strftime(fmt))
+        )
+
+    def iter_feedback_types(self):
+        """
+        遍历所有 应用-渠道组-反馈类型
+        :return: 生成器 (应用, 渠道组, 类型ID, 类型名称)
+        """
+        for app_config in self.feedback_list:
+            for ft_id, ft_name in app_config.get('FEEDBACK_TYPES', {}).items():
+                yield app_config['appName'], app_config['clientGroupCode'], ft_id, ft_name
+
+    def load_feedback_counts(self, windows, engine=None):
+        """
+        统一规划一次运行中所有 渠道 × 反馈类型 × 时间窗口 的计数请求：
+        去掉重复窗口和结果表中已有的计数，剩余请求在同一个并发批次中完成
+        :param windows: 时间窗口列表 [(开始时间, 结束时间), ...]
+        :param engine: thread 或 async，默认使用实例配置
+        :return: 反馈数结果表
+        """
+        tasks = []
+        for window in dict.fromkeys(windows):
+            counts = self.count_table.setdefault(window, {})
+            for app_name, client_group, ft_id, ft_name in self.iter_feedback_types():
+                if (app_name, client_group, ft_id) not in counts:
+                    tasks.append((app_name, client_group, ft_id, ft_name, *window))
+
+        if tasks:
+            print(f"⏳ 获取反馈数：{len(tasks)}个 渠道×类型×时间窗口")
+            for result in self.run_tasks('process_feedback_count_only', tasks, engine):
+                window = (result['start_time'], result['end_time'])
+                self.count_table[window][(result['appName'], result['clientGroup'], result['feedback_type_id'])] = \
+                    result['count']
+        return self.count_table
+
+    def report_days(self, days, offset=0):
+        """
+        获取以今天为结尾、向前偏移offset天的连续days个统计日（升序）
+        :param days: 天数
+        :param offset: 向前偏移的天数
+        :return: ["YYYY-MM-DD", ...]
+        """
+        last_day = self.now.date() - timedelta(days=offset)
+        return [(last_day - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(days - 1, -1, -1)]
+
+    def day_window(self, day):
+        """
+        统计日对应的时间窗口：[前一天基准时间, 当天基准时间前一秒]
+        :param day: 统计日 YYYY-MM-DD
+        :return: (开始时间, 结束时间)
+        """
+        end = datetime.strptime(day, '%Y-%m-%d').replace(hour=self.SUMMARY_BASE_HOUR)
+        return (
+            (end - timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S'),
+            (end - timedelta(seconds=1)).strftime('%Y-%m-%d %H:%M:%S')
+        )
+
+    @staticmethod
+    def day_count_key(day, app_name, client_group, feedback_type_id):
+        """按天计数存储的键：统计日|应用|渠道组|反馈类型ID"""
+        return f"{day}|{app_name}|{client_group}|{feedback_type_id}"
+
+    def period_window(self, days):
+        """
+        若干连续统计日合并后的时间窗口：[第一天的开始时间, 最后一天的结束时间]
+        :param days: 统计日列表（升序）
+        :return: (开始时间, 结束时间)
+        """
+        return self.day_window(days[0])[0], self.day_window(days[-1])[1]
+
+    def missing_counts(self, windows):
+        """
+        结果表中各时间窗口缺少计数的 渠道×反馈类型
+        :param windows: 时间窗口列表
+        :return: {时间窗口: [(应用, 渠道组, 类型ID), ...]}，没有缺失时为空字典
+        """
+        missing = {}
+        for window in windows:
+            counts = self.count_table.get(window, {})
+            keys = [(app_name, client_group, ft_id) for app_name, client_group, ft_id, _ in self.iter_feedback_types()
+                    if (app_name, client_group, ft_id) not in counts]
+            if keys:
+                missing[window] = keys
+        return missing
+
+    def load_period_counts(self, periods, engine=None):
+        """
+        获取若干统计周期的反馈数：已结束的天优先读本地存储；
+        周期内只缺1天时请求这一天，缺多天时（如冷启动）改为整个周期每个类型请求一次，
+        所有请求在同一个并发批次中完成，失败的请求再重试一次；新获取到的已结束天写入存储（之后不再请求）
+        :param periods: 统计周期列表，每个周期为统计日列表（升序）
+        :param engine: thread 或 async，默认使用实例配置
+        :return: 反馈数结果表
+        """
+        days = list(dict.fromkeys(day for period in periods for day in period))
+        windows = {day: self.day_window(day) for day in days}
+        now_str = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        closed_days = [day for day in days if windows[day][1] < now_str]
+        feedback_types = list(self.iter_feedback_types())
+
+        stored = {}
+        if self.day_counts and closed_days:
+            stored = self.day_counts.get_many(self.day_count_key(day, app_name, client_group, ft_id)
+                                              for day in closed_days
+                                              for app_name, client_group, ft_id, _ in feedback_types)
+        for day in closed_days:
+            counts = self.count_table.setdefault(windows[day], {})
+            for app_name, client_group, ft_id, _ in feedback_types:
+                key = self.day_count_key(day, app_name, client_group, ft_id)
+                if key in stored:
+                    counts[(app_name, client_group, ft_id)] = stored[key]
+
+        # 规划请求：已规划请求的天不重复计入后续周期的缺失天数
+        planned_days = set()
+        request_windows = []
+        for period in periods:
+            missing_days = [day for day in period
+                            if day not in planned_days and self.missing_counts([windows[day]])]
+            if len(missing_days) > 1:
+                request_windows.append(self.period_window(period))
+            else:
+                request_windows.extend(windows[day] for day in missing_days)
+                planned_days.update(missing_days)
+
+        self.load_feedback_counts(request_windows, engine)
+        missing = self.missing_counts(request_windows)
+        if missing:
+            print(f"⚠️  {sum(map(len, missing.values()))}个 渠道×类型×时间窗口 的反馈数获取失败，重试一次")
+            self.load_feedback_counts(request_windows, engine)
+
+        if self.day_counts:
+            new_counts = {}
+            for day in closed_days:
+                counts = self.count_table.get(windows[day], {})
+                for app_name, client_group, ft_id, _ in feedback_types:
+                    key = self.day_count_key(day, app_name, client_group, ft_id)
+                    if key not in stored and (app_name, client_group, ft_id) in counts:
+                        new_counts[key] = counts[(app_name, client_group, ft_id)]
+            try:
+                self.day_counts.set_many(new_counts)
+            except Exception as e:
+                print(f"⚠️  保存按天反馈数失败: {str(e)}")
+        return self.count_table
+
+    def sum_period_counts(self, days):
+        """
+        汇总一个统计周期的反馈数：每天都有计数的类型按天求和，否则使用整个周期的计数；都没有的类型不汇总
+        :param days: 统计日列表（升序）
+        :return: {(应用, 渠道组, 类型ID): 数量}
+        """
+        totals = {}
+        day_counts = [self.count_table.get(self.day_window(day), {}) for day in days]
+        period_counts = self.count_table.get(self.period_window(days), {})
+        for app_name, client_group, ft_id, _ in self.iter_feedback_types():
+            key = (app_name, client_group, ft_id)
+            if all(key in counts for counts in day_counts):
+                totals[key] = sum(counts[key] for counts in day_counts)
+            elif key in period_counts:
+                totals[key] = period_counts[key]
+        return totals
+
+    def count_feedback_days(self, days, offset=0, engine=None):
+        """
+        任意N天窗口的反馈数：按天汇总（已结束的天直接读本地存储）
+        :param days: 天数
+        :param offset: 向前偏移的天数
+        :param engine: thread 或 async，默认使用实例配置
+        :return: {(应用, 渠道组, 类型ID): 数量}
+        """
+        period = self.report_days(days, offset)
+        self.load_period_counts([period], engine)
+        return self.sum_period_counts(period)
+
+    def prefetch_summary_counts(self, weekly=False, engine=None):
+        """
+        一次性获取日报（及周报）本期/上期需要的全部反馈数，后续汇总直接读结果表
+        :param weekly: 是否同时获取周报的统计周期
+        :param engine: thread 或 async，默认使用实例配置
+        """
+        periods = [self.report_days(1), self.report_days(1, offset=1)]
+        if weekly:
+            periods += [self.report_days(7), self.report_days(7, offset=7)]
+        self.load_period_counts(periods, engine)
+
+    def build_summary_data(self, this_counts, last_counts):
+        """
+        汇总本期/上期数据，按应用和渠道组分类
+        任一期缺少计数的类型（请求失败）两期都不计入，记录在 incomplete 中，避免把失败当作0产生虚假的环比
+        :param this_counts: 本期反馈数 {(应用, 渠道组, 类型ID): 数量}
+        :param last_counts: 上期反馈数
+        :return: {应用_渠道组: {'appName', 'clientGroup', 'this_week': {...}, 'last_week': {...}, 'incomplete': [类型名称]}}
+        """
+        summary_data = {}
+        for app_name, client_group, ft_id, ft_name in self.iter_feedback_types():
+            count_key = (app_name, client_group, ft_id)
+            key = f"{app_name}_{client_group}"
+            if key not in summary_data:
+                summary_data[key] = {
+                    'appName': app_name,
+                    'clientGroup': client_group,
+                    'this_week': {'total': 0, 'types': {}},
+                    'last_week': {'total': 0, 'types': {}},
+                    'incomplete': []
+                }
+            if count_key not in this_counts or count_key not in last_counts:
+                summary_data[key]['incomplete'].append(ft_name)
+                continue
+            summary_data[key]['this_week']['total'] += this_counts[count_key]
+            summary_data[key]['this_week']['types'][ft_name] = this_counts[count_key]
+            summary_data[key]['last_week']['total'] += last_counts[count_key]
+            summary_data[key]['last_week']['types'][ft_name] = last_counts[count_key]
+        for data in summary_data.values():
+            if data['incomplete']:
+                print(f"⚠️  {data['appName']}/{data['clientGroup']} 的反馈数不完整，未计入对比: {'、'.join(data['incomplete'])}")
+        return summary_data
+
+    def get_weekly_summary(self, engine=None):
         """获取周汇总数据（优化版：适配飞书格式，一行对比本周/上周，展示环比增长）"""
         try:
             print("⏳ 开始生成周汇总报告...")
@@ -613,79 +3067,30 @@ class FeedbackCount(threading.Thread):
                 print("❌ 未获取到反馈类型列表，无法生成周汇总报告")
                 return
 
-            # 基准时间规范化为当天上午10点
-            standard_now = self.now.replace(hour=10, minute=0, second=0, microsecond=0)
-            this_week_end = standard_now.strftime('%Y-%m-%d %H:%M:%S')
-            this_week_start = (standard_now - timedelta(days=7)).strftime('%Y-%m-%d %H:%M:%S')
-            last_week_start = (standard_now - timedelta(days=14)).strftime('%Y-%m-%d %H:%M:%S')
-            last_week_end = (standard_now - timedelta(days=7)).strftime('%Y-%m-%d %H:%M:%S')
+            (this_week_start, this_week_end), (last_week_start, last_week_end) = self.summary_windows(days=7)
 
             print(this_week_start)
             print(this_week_end)
             print(last_week_start)
             print(last_week_end)
 
-            # 准备所有需要处理的任务
-            this_week_tasks = []
-            last_week_tasks = []
-
-            for app_config in self.feedback_list:
-                feedback_types = app_config.get('FEEDBACK_TYPES', {})
-                for ft_id, ft_name in feedback_types.items():
-                    this_week_tasks.append((app_config['appName'], app_config['clientGroupCode'], ft_id, ft_name,
-                                            this_week_start, this_week_end))
-                    last_week_tasks.append((app_config['appName'], app_config['clientGroupCode'], ft_id, ft_name,
-                                            last_week_start, last_week_end))
+            # 按天汇总本期/上期所有 渠道×反馈类型 的反馈数（已结束的天读本地存储，已获取过的直接读结果表）
+            this_counts = self.count_feedback_days(7, engine=engine)
+            last_counts = self.count_feedback_days(7, offset=7, engine=engine)
 
-            if not this_week_tasks:
+            # 按应用和渠道组分类汇总数据
+            summary_data = self.build_summary_data(this_counts, last_counts)
+            if not summary_data:
                 print("⚠️  没有需要处理的反馈类型")
                 return
 
-            # 使用线程池处理所有任务
-            with ThreadPoolExecutor() as executor:
-                # 处理本周数据（仅统计数量）
-                this_week_futures = [executor.submit(self.process_feedback_count_only, *task) for task in
-                                     this_week_tasks]
-                this_week_results = [future.result() for future in this_week_futures if future.result() is not None]
-
-                # 处理上周数据（仅统计数量）
-                last_week_futures = [executor.submit(self.process_feedback_count_only, *task) for task in
-                                     last_week_tasks]
-                last_week_results = [future.result() for future in last_week_futures if future.result() is not None]
-
-            # 按应用和渠道组分类汇总数据
-            summary_data = {}
-
-            # 处理本周数据
-            for result in this_week_results:
-                key = f"{result['appName']}_{result['clientGroup']}"
-                if key not in summary_data:
-                    summary_data[key] = {
-                        'appName': result['appName'],
-                        'clientGroup': result['clientGroup'],
-                        'this_week': {'total': 0, 'types': {}},
-                        'last_week': {'total': 0, 'types': {}}
-                    }
-
-                summary_data[key]['this_week']['total'] += result['count']
-                summary_data[key]['this_week']['types'][result['feedback_type']] = result['count']
-
-            # 处理上周数据
-            for result in last_week_results:
-                key = f"{result['appName']}_{result['clientGroup']}"
-                if key not in summary_data:
-                    continue
-
-                summary_data[key]['last_week']['total'] += result['count']
-                summary_data[key]['last_week']['types'][result['feedback_type']] = result['count']
-
             # 统计有数据的应用渠道组数量
             valid_data_count = 0
 
             # 构建汇总消息（适配飞书格式）
             for key, data in summary_data.items():
-                # 检查本周和上周的总反馈数，如果都为0则跳过
-                if data['this_week']['total'] == 0 and data['last_week']['total'] == 0:
+                # 检查本周和上周的总反馈数，如果都为0（且没有不完整的类型）则跳过
+                if data['this_week']['total'] == 0 and data['last_week']['total'] == 0 and not data['incomplete']:
                     continue
 
                 # 1. 基础信息（飞书加粗格式）
@@ -717,6 +3122,9 @@ class FeedbackCount(threading.Thread):
                     # 二级缩进（4个空格，适配飞书排版），按要求格式拼接
                     content += f"  - 上周{type_name}: {last_type_count}条，本周{type_name}: {this_type_count}条，环比 {type_growth}\n"
 
+                if data['incomplete']:
+                    content += f"- ⚠️ 以下类型反馈数获取失败，未计入对比: {'、'.join(data['incomplete'])}\n"
+
                 # 5. 发送飞书消息
                 platform = 'iOS' if 'iOS' in data['appName'] or 'ios' in data['appName'] else 'Android'
                 self.send_to_feishu(content, platform, this_week_start, this_week_end, type="周报")
@@ -730,8 +3138,8 @@ class FeedbackCount(threading.Thread):
         except Exception as e:
             print(f"❌ 生成周汇总报告失败: {str(e)}")
 
-    def get_daily_summary(self):
-        """获取周汇总数据（优化版：适配飞书格式，一行对比本周/上周，展示环比增长）"""
+    def get_daily_summary(self, engine=None):
+        """获取日汇总数据（适配飞书格式，一行对比今天/昨天，展示环比增长）"""
         try:
             print("⏳ 开始生成日汇总报告...")
 
@@ -739,79 +3147,30 @@ class FeedbackCount(threading.Thread):
                 print("❌ 未获取到反馈类型列表，无法生成日汇总报告")
                 return
 
-            # 基准时间规范化为当天上午10点
-            standard_now = self.now.replace(hour=10, minute=0, second=0, microsecond=0)
-            this_week_end = standard_now.strftime('%Y-%m-%d %H:%M:%S')
-            this_week_start = (standard_now - timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S')
-            last_week_start = (standard_now - timedelta(days=2)).strftime('%Y-%m-%d %H:%M:%S')
-            last_week_end = (standard_now - timedelta(days=1)).strftime('%Y-%m-%d %H:%M:%S')
+            (this_week_start, this_week_end), (last_week_start, last_week_end) = self.summary_windows(days=1)
 
             print(this_week_start)
             print(this_week_end)
             print(last_week_start)
             print(last_week_end)
 
-            # 准备所有需要处理的任务
-            this_week_tasks = []
-            last_week_tasks = []
-
-            for app_config in self.feedback_list:
-                feedback_types = app_config.get('FEEDBACK_TYPES', {})
-                for ft_id, ft_name in feedback_types.items():
-                    this_week_tasks.append((app_config['appName'], app_config['clientGroupCode'], ft_id, ft_name,
-                                            this_week_start, this_week_end))
-                    last_week_tasks.append((app_config['appName'], app_config['clientGroupCode'], ft_id, ft_name,
-                                            last_week_start, last_week_end))
+            # 按天汇总本期/上期所有 渠道×反馈类型 的反馈数（已结束的天读本地存储，已获取过的直接读结果表）
+            this_counts = self.count_feedback_days(1, engine=engine)
+            last_counts = self.count_feedback_days(1, offset=1, engine=engine)
 
-            if not this_week_tasks:
+            # 按应用和渠道组分类汇总数据
+            summary_data = self.build_summary_data(this_counts, last_counts)
+            if not summary_data:
                 print("⚠️  没有需要处理的反馈类型")
                 return
 
-            # 使用线程池处理所有任务
-            with ThreadPoolExecutor() as executor:
-                # 处理本周数据（仅统计数量）
-                this_week_futures = [executor.submit(self.process_feedback_count_only, *task) for task in
-                                     this_week_tasks]
-                this_week_results = [future.result() for future in this_week_futures if future.result() is not None]
-
-                # 处理上周数据（仅统计数量）
-                last_week_futures = [executor.submit(self.process_feedback_count_only, *task) for task in
-                                     last_week_tasks]
-                last_week_results = [future.result() for future in last_week_futures if future.result() is not None]
-
-            # 按应用和渠道组分类汇总数据
-            summary_data = {}
-
-            # 处理本周数据
-            for result in this_week_results:
-                key = f"{result['appName']}_{result['clientGroup']}"
-                if key not in summary_data:
-                    summary_data[key] = {
-                        'appName': result['appName'],
-                        'clientGroup': result['clientGroup'],
-                        'this_week': {'total': 0, 'types': {}},
-                        'last_week': {'total': 0, 'types': {}}
-                    }
-
-                summary_data[key]['this_week']['total'] += result['count']
-                summary_data[key]['this_week']['types'][result['feedback_type']] = result['count']
-
-            # 处理上周数据
-            for result in last_week_results:
-                key = f"{result['appName']}_{result['clientGroup']}"
-                if key not in summary_data:
-                    continue
-
-                summary_data[key]['last_week']['total'] += result['count']
-                summary_data[key]['last_week']['types'][result['feedback_type']] = result['count']
-
             # 统计有数据的应用渠道组数量
             valid_data_count = 0
 
             # 构建汇总消息（适配飞书格式）
             for key, data in summary_data.items():
-                # 检查本周和上周的总反馈数，如果都为0则跳过
-                if data['this_week']['total'] == 0 and data['last_week']['total'] == 0:
+                # 检查本周和上周的总反馈数，如果都为0（且没有不完整的类型）则跳过
+                if data['this_week']['total'] == 0 and data['last_week']['total'] == 0 and not data['incomplete']:
                     continue
 
                 # 1. 基础信息（飞书加粗格式）
@@ -843,6 +3202,9 @@ class FeedbackCount(threading.Thread):
                     # 二级缩进（4个空格，适配飞书排版），按要求格式拼接
                     content += f"  - 昨天{type_name}: {last_type_count}条，今天{type_name}: {this_type_count}条，环比 {type_growth}\n"
 
+                if data['incomplete']:
+                    content += f"- ⚠️ 以下类型反馈数获取失败，未计入对比: {'、'.join(data['incomplete'])}\n"
+
                 # 5. 发送飞书消息
                 platform = 'iOS' if 'iOS' in data['appName'] or 'ios' in data['appName'] else 'Android'
                 self.send_to_feishu(content, platform, this_week_start, this_week_end,  type="日报")
@@ -864,7 +3226,7 @@ class FeedbackCount(threading.Thread):
         """
         try:
             headers = {**self.HEADERS, 'token': self.token}
-            response = requests.get(self.CHANNEL_CONFIG_URL, headers=headers, timeout=30)
+            response = self.http_request('GET', self.CHANNEL_CONFIG_URL, 'channel', headers=headers)
             response.raise_for_status()  # 抛出HTTP错误
             result = response.json()
 
@@ -893,7 +3255,7 @@ class FeedbackCount(threading.Thread):
         }
         try:
             headers = {**self.HEADERS, 'token': self.token}
-            response = requests.get(self.CATEGORY_LIST_URL, headers=headers, params=params, timeout=30)
+            response = self.http_request('GET', self.CATEGORY_LIST_URL, 'category', headers=headers, params=params)
             response.raise_for_status()
             result = response.json()
 
@@ -905,73 +3267,101 @@ class FeedbackCount(threading.Thread):
         except Exception as e:
             return []
 
-    def get_subcategory_details(self, category_id):
+    def get_subcategory_page(self, category_id, page, size):
         """
-        第三步：根据大类ID获取小类问题详情
+        获取大类下的一页小类
         参数：
             category_id: 大类ID（如29）
-        返回：小类列表（失败返回空列表）
+            page: 页码（从0开始）
+            size: 每页数量
+        返回：分页数据 {"content": [...], "totalElements": 数值}（失败返回None）
         """
         params = {
             "categoryId": category_id,
-            "page": 0,
-            "size": 9999  # 设为足够大的值，确保获取所有小类
+            "page": page,
+            "size": size
         }
         try:
             headers = {**self.HEADERS, 'token': self.token}
-            response = requests.get(self.SUBCATEGORY_LIST_URL, headers=headers, params=params, timeout=30)
+            response = self.http_request('GET', self.SUBCATEGORY_LIST_URL, 'subcategory', headers=headers, params=params)
             response.raise_for_status()
             result = response.json()
 
             if result.get("code") == "00000":
-                subcategories = result["data"].get("content", [])
-                return subcategories
+                return result.get("data") or {}
             else:
-                return []
+                return None
         except Exception as e:
-            return []
+            print(f"❌ 获取大类[{category_id}]第{page + 1}页小类失败: {str(e)}")
+            return None
+
+    def iter_subcategories(self, category_id):
+        """
+        逐页获取大类下的小类，边取边返回，内存中只保留当前页
+        任一页获取失败时抛出异常（不能把不完整的列表当作完整结果统计）
+        参数：
+            category_id: 大类ID（如29）
+        返回：生成器，逐个返回小类
+        """
+        size = self.SUBCATEGORY_PAGE_SIZE
+        page = 0
+        while True:
+            data = self.get_subcategory_page(category_id, page, size)
+            if data is None:
+                raise RuntimeError(f"大类[{category_id}]第{page + 1}页小类获取失败")
+            content = data.get("content") or []
+            yield from content
+            page += 1
+            # 不足一页，或已取完totalElements，说明是最后一页
+            if len(content) < size or page * size >= data.get("totalElements", float("inf")):
+                return
+
+    def get_subcategory_details(self, category_id):
+        """
+        第三步：根据大类ID获取小类问题详情
+        参数：
+            category_id: 大类ID（如29）
+        返回：小类列表（获取失败时抛出异常）
+        """
+        return list(self.iter_subcategories(category_id))
 
     def calculate_subcategory_stats(self, subcategories):
         """
         统计小类的resolvedQty和unresolvedQty总和
-        注意：需要处理主小类和sonIssuesList中的嵌套小类
-        返回：统计结果字典 {"resolved_total": 数值, "unresolved_total": 数值}
+        注意：sonIssuesList 可以任意层嵌套，用栈迭代遍历（不递归），嵌套小类计入所属的顶层小类
+        参数：
+            subcategories: 小类列表或生成器（可直接传入 iter_subcategories 边取边统计）
+        返回：统计结果字典 {"resolved_total": 数值, "unresolved_total": 数值,
+                           "subcategories": {小类ID: {"title", "resolved", "unresolved"}}}
         """
         resolved_total = 0
         unresolved_total = 0
-
-        # 遍历每个小类
-        for idx, sub in enumerate(subcategories):
-            sub_id = sub.get("id")
-            sub_title = sub.get("innerTitle", "未知标题")
-
-            # 1. 主小类的数值（处理None/空值）
-            sub_resolved = sub.get("resolvedQty")
-            sub_unresolved = sub.get("unresolvedQty")
-            # 转换None为0
-            sub_resolved = 0 if sub_resolved is None else sub_resolved
-            sub_unresolved = 0 if sub_unresolved is None else sub_unresolved
-
+        breakdown = {}
+
+        # 遍历每个顶层小类
+        for sub in subcategories:
+            sub_resolved = 0
+            sub_unresolved = 0
+            stack = [sub]
+            while stack:
+                issue = stack.pop()
+                # 转换None为0
+                sub_resolved += issue.get("resolvedQty") or 0
+                sub_unresolved += issue.get("unresolvedQty") or 0
+                stack.extend(issue.get("sonIssuesList") or [])
+
+            breakdown[sub.get("id")] = {
+                "title": sub.get("innerTitle", "未知标题"),
+                "resolved": sub_resolved,
+                "unresolved": sub_unresolved
+            }
             resolved_total += sub_resolved
             unresolved_total += sub_unresolved
 
-            # 2. 嵌套sonIssuesList中的小类数值
-            son_issues = sub.get("sonIssuesList", [])
-            for son_idx, son in enumerate(son_issues):
-                son_id = son.get("id")
-                son_title = son.get("innerTitle", "未知子标题")
-                son_resolved = son.get("resolvedQty")
-                son_unresolved = son.get("unresolvedQty")
-                # 转换None为0
-                son_resolved = 0 if son_resolved is None else son_resolved
-                son_unresolved = 0 if son_unresolved is None else son_unresolved
-
-                resolved_total += son_resolved
-                unresolved_total += son_unresolved
-
         return {
             "resolved_total": resolved_total,
-            "unresolved_total": unresolved_total
+            "unresolved_total": unresolved_total,
+            "subcategories": breakdown
         }
 
     def print_final_stats(self, final_result):
@@ -995,8 +3385,33 @@ class FeedbackCount(threading.Thread):
                     print(f"     │  └─ 未解决总数：{stats['unresolved_total']}")
         print("\n" + "=" * 80)
 
+    def fetch_category_stats(self, category):
+        """
+        获取单个大类的小类并统计已解决/未解决数
+        参数：
+            category: 大类信息（含id、categoryTitle）
+        返回：大类统计结果 {"category_title", "resolved_total", "unresolved_total"}，
+             小类获取失败返回None（该大类记为缺失，而不是按不完整的列表少算）
+        """
+        category_title = category.get("categoryTitle", "未知大类")
+        # 小类逐页获取、逐页统计，不在内存中保留完整列表
+        try:
+            stats = self.calculate_subcategory_stats(self.iter_subcategories(category.get("id")))
+        except Exception as e:
+            print(f"❌ 大类[{category_title}]统计失败，本次记为缺失: {str(e)}")
+            return None
+        return {
+            "category_title": category_title,
+            "resolved_total": stats["resolved_total"],
+            "unresolved_total": stats["unresolved_total"]
+        }
+
     def count_all(self):
-        """主流程：整合所有步骤，统计并输出结果"""
+        """
+        主流程：整合所有步骤，统计并输出结果
+        渠道并发获取大类，每个渠道的大类一返回就并发获取小类，所有请求共用一个有界线程池；
+        结果按渠道配置和大类列表的顺序合并，每个大类带上所属渠道的快照时间（snapshot_time）
+        """
         final_result = {}
         current_date = datetime.now().strftime("%Y-%m-%d")
         final_result[current_date] = {}
@@ -1006,111 +3421,120 @@ class FeedbackCount(threading.Thread):
         if not channels:
             return final_result
 
-        # 遍历每个渠道（可先测试单个渠道，比如只测LOKLOK-APP）
-        for channel in channels:
-            app_name = channel.get("appName")
-            client_group = channel.get("clientGroupCode")
-            platform_type = channel.get("platformType")
-            channel_key = f"{app_name}_{client_group}_{platform_type}"
-            final_result[current_date][channel_key] = {}
-
-            # 【可选】仅测试LOKLOK-APP渠道（减少请求量，方便调试）
-            # if channel_key != "LOKLOK_LOKLOK_APP":
-            #     continue
-
-            # 第二步：获取大类
-            categories = self.get_category_details(app_name, client_group, platform_type)
-            if not categories:
-                continue
-
-            # 第三步：遍历大类，获取小类并统计
-            for category in categories:
-                category_id = category.get("id")
-                # print(category_id)
-                category_title = category.get("categoryTitle", "未知大类")
-
-                # 获取小类
-                subcategories = self.get_subcategory_details(category_id)
-                # print(subcategories)
-                if not subcategories:
-                    final_result[current_date][channel_key][category_id] = {
-                        "category_title": category_title,
-                        "resolved_total": 0,
-                        "unresolved_total": 0
-                    }
-                    continue
-
-                # 统计小类数值
-                stats = self.calculate_subcategory_stats(subcategories)
-
-                # 保存结果
-                final_result[current_date][channel_key][category_id] = {
-                    "category_title": category_title,
-                    "resolved_total": stats["resolved_total"],
-                    "unresolved_total": stats["unresolved_total"]
-                }
+        channel_keys = []
+        channel_categories = {}  # {渠道: 大类列表}
+        category_futures = {}  # {渠道: [小类统计future, ...]}
+        snapshot_times = {}  # {渠道: 最后一个请求返回的时间}
+        snapshot_lock = threading.Lock()
+
+        def mark_snapshot(channel_key):
+            with snapshot_lock:
+                snapshot_times[channel_key] = max(snapshot_times.get(channel_key, datetime.min), datetime.now())
+
+        with ThreadPoolExecutor(max_workers=self.MAX_WORKERS) as executor:
+            # 第二步：所有渠道并发获取大类
+            channel_futures = {}
+            for channel in channels:
+                app_name = channel.get("appName")
+                client_group = channel.get("clientGroupCode")
+                platform_type = channel.get("platformType")
+                channel_key = f"{app_name}_{client_group}_{platform_type}"
+                channel_keys.append(channel_key)
+                future = executor.submit(self.get_category_details, app_name, client_group, platform_type)
+                channel_futures[future] = channel_key
+
+            # 第三步：哪个渠道的大类先返回，就先把它的大类分发为小类请求
+            for future in as_completed(channel_futures):
+                channel_key = channel_futures[future]
+                categories = future.result() or []
+                mark_snapshot(channel_key)
+                channel_categories[channel_key] = categories
+                category_futures[channel_key] = []
+                for category in categories:
+                    category_future = executor.submit(self.fetch_category_stats, category)
+                    category_future.add_done_callback(lambda _, key=channel_key: mark_snapshot(key))
+                    category_futures[channel_key].append(category_future)
+
+            # 按渠道配置顺序、大类列表顺序合并；统计失败的大类不写入结果（历史库保留其上一个快照的值）
+            missing = 0
+            for channel_key in channel_keys:
+                final_result[current_date][channel_key] = {}
+                futures = category_futures.get(channel_key, [])
+                for category, future in zip(channel_categories.get(channel_key, []), futures):
+                    stats = future.result()
+                    if stats is None:
+                        missing += 1
+                        continue
+                    final_result[current_date][channel_key][category.get("id")] = stats
+            if missing:
+                print(f"⚠️  {missing}个大类统计失败，本次快照中记为缺失")
+
+        # 渠道的最后一个请求返回的时间即为该渠道的快照时间
+        for channel_key, category_data in final_result[current_date].items():
+            snapshot_time = snapshot_times[channel_key].strftime('%Y-%m-%d %H:%M:%S')
+            for stats in category_data.values():
+                stats["snapshot_time"] = snapshot_time
+        spread = max(snapshot_times.values()) - min(snapshot_times.values())
+        print(f"📸 {len(channel_keys)}个渠道快照完成，渠道间时间差 {spread.total_seconds():.1f}s")
 
         # 格式化输出最终结果
         # self.print_final_stats(final_result)
         # 储存运行结果
-        self.save_data_to_yaml_append(final_result)
+        self.save_history(final_result)
         return final_result
 
-    def save_data_to_yaml_append(self, data_dict: Dict, file_path: str = "data_save.yaml") -> None:
+    def get_history_store(self) -> HistoryStore:
+        """
+        打开历史库（首次使用时打开）；历史库为空时从旧的YAML文件一次性导入
+        """
+        if self._history is None:
+            self._history = HistoryStore(self.HISTORY_FILE)
+            if self._history.is_empty() and os.path.exists(self.HISTORY_YAML_FILE):
+                self.import_yaml_history(self.HISTORY_YAML_FILE)
+        return self._history
+
+    def import_yaml_history(self, file_path: str = "data_save.yaml") -> int:
+        """
+        一次性把 data_save.yaml 中的全部历史导入历史库（已存在的 日期/渠道/大类 会被YAML中的值覆盖）
+        参数：
+            file_path: YAML文件路径
+        返回：导入的行数
+        """
+        yaml_data = self.load_yaml_data(file_path)
+        count = self.get_history_store().upsert(yaml_data)
+        print(f"📥 已从{file_path}导入{len(yaml_data)}天、{count}条历史统计数据")
+        return count
+
+    def save_history(self, data_dict: Dict) -> None:
         """
-        将统计数据字典追加保存到YAML文件，不覆盖任何历史数据：
-        - 若文件中已存在当天数据 → 跳过写入（保留原有数据）
-        - 若文件中无当天数据 → 新增该日期数据（持续写入）
-        - 所有历史日期数据全程保留
+        将统计数据作为一个日内快照写入历史库：
+        - 当天每次运行都记录一个快照，只存储相对上一个快照有变化的大类
+        - 当天最新值随之刷新（早上的任务失败后重跑可以修正当天数据）
+        - 其他日期的历史数据不受影响
 
         参数：
             data_dict: 待保存的字典（结构：{日期: {渠道: {大类ID: 统计数据}}}）
-            file_path: 保存路径，默认当前目录下的data_save.yaml
         """
-        # 1. 输入数据校验（保证数据格式合法）
         if not isinstance(data_dict, dict) or len(data_dict) == 0:
             raise ValueError("输入的data_dict必须是非空字典")
 
-        # 提取新数据的日期键（假设data_dict仅包含一个日期的数据，符合业务逻辑）
         new_date_key = list(data_dict.keys())[0]
         if not isinstance(new_date_key, str) or len(new_date_key.split("-")) != 3:
             raise ValueError("data_dict的键必须是'YYYY-MM-DD'格式的日期字符串")
 
-        try:
-            # 2. 读取已有数据（若无文件则初始化为空字典）
-            if os.path.exists(file_path):
-                with open(file_path, "r", encoding="utf-8") as f:
-                    existing_data = yaml.load(f, Loader=yaml.FullLoader) or {}
-            else:
-                existing_data = {}
-
-            # 3. 判断当天数据是否已存在 → 核心逻辑
-            if new_date_key in existing_data:
-                print(f"⚠️  日期[{new_date_key}]的数据已存在，跳过写入（不覆盖原有数据）")
-                final_data = existing_data  # 保留原有数据，不做任何修改
-            else:
-                print(f"📝 日期[{new_date_key}]的数据不存在，新增写入")
-                final_data = {**existing_data, **data_dict}  # 合并历史数据+新数据
-
-            # 4. 写入YAML文件（保持格式美观，保留所有类型和中文）
-            with open(file_path, "w", encoding="utf-8") as f:
-                yaml.dump(
-                    final_data,
-                    f,
-                    allow_unicode=True,  # 支持中文显示
-                    default_flow_style=False,  # 展开式格式（非压缩）
-                    sort_keys=False,  # 保持键的原有顺序
-                    indent=2  # 缩进2个空格，增强可读性
-                )
-
-            print(f"✅ 数据保存完成！")
-            print(f"📂 文件路径：{os.path.abspath(file_path)}")
-            print(f"📊 当前文件包含日期：{list(final_data.keys())}")
+        snapshot_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        store = self.get_history_store()
+        changed = store.save_snapshot(new_date_key, snapshot_time, data_dict[new_date_key])
+        self._range_query = None
+        print(f"✅ 日期[{new_date_key}]快照[{snapshot_time}]保存完成！{changed}个大类有变化")
+        print(f"📂 文件路径：{os.path.abspath(self.HISTORY_FILE)}")
 
-        except PermissionError:
-            raise PermissionError(f"❌ 没有写入权限：{file_path}")
-        except Exception as e:
-            raise Exception(f"❌ 保存数据失败：{str(e)}")
+    def load_history(self, start_date: str, end_date: str) -> Dict:
+        """
+        从历史库读取日期范围内的统计数据（只读取需要的日期）
+        返回：{日期: {渠道: {大类ID: 统计数据}}}
+        """
+        return self.get_history_store().load_range(start_date, end_date)
 
     def load_yaml_data(self, file_path: str = "data_save.yaml") -> Dict:
         """
@@ -1179,25 +3603,25 @@ class FeedbackCount(threading.Thread):
             all_category_ids = set(yesterday_channel.keys()).union(set(today_channel.keys()))
 
             for category_id in all_category_ids:
-                # 获取昨天的数值（无则为0）
+                # 获取昨天的数值（快照中没有该大类时为None：统计失败的大类不写入快照，不能当作0）
                 y_cat = yesterday_channel.get(category_id, {})
-                y_resolved = y_cat.get("resolved_total", 0)
-                y_unresolved = y_cat.get("unresolved_total", 0)
+                y_resolved = y_cat.get("resolved_total")
+                y_unresolved = y_cat.get("unresolved_total")
                 y_title = y_cat.get("category_title", "未知大类")
 
-                # 获取今天的数值（无则为0）
+                # 获取今天的数值（无则为None）
                 t_cat = today_channel.get(category_id, {})
-                t_resolved = t_cat.get("resolved_total", 0)
-                t_unresolved = t_cat.get("unresolved_total", 0)
+                t_resolved = t_cat.get("resolved_total")
+                t_unresolved = t_cat.get("unresolved_total")
                 t_title = t_cat.get("category_title", y_title)  # 优先用今天的标题，无则用昨天的
 
-                # 计算变化值（今天 - 昨天）
-                resolved_diff = t_resolved - y_resolved
-                unresolved_diff = t_unresolved - y_unresolved
+                # 计算变化值（今天 - 昨天），任一天缺失时变化为None
+                resolved_diff = None if t_resolved is None or y_resolved is None else t_resolved - y_resolved
+                unresolved_diff = None if t_unresolved is None or y_unresolved is None else t_unresolved - y_unresolved
 
-                # 标记变化类型（增长/减少/无变化）
-                resolved_trend = "↑" if resolved_diff > 0 else "↓" if resolved_diff < 0 else "─"
-                unresolved_trend = "↑" if unresolved_diff > 0 else "↓" if unresolved_diff < 0 else "─"
+                # 标记变化类型（增长/减少/无变化/无数据）
+                resolved_trend = self.diff_trend(resolved_diff)
+                unresolved_trend = self.diff_trend(unresolved_diff)
 
                 compare_result[channel][category_id] = {
                     "category_title": t_title,
@@ -1213,6 +3637,13 @@ class FeedbackCount(threading.Thread):
 
         return compare_result
 
+    @staticmethod
+    def diff_trend(diff) -> str:
+        """变化值对应的趋势标识，None表示缺少数据"""
+        if diff is None:
+            return "无数据"
+        return "↑" if diff > 0 else "↓" if diff < 0 else "─"
+
     def compare_weekly_data(self, yaml_data: Dict, weekly_dates: List[str]) -> Dict:
         """
         新增：一周数据对比核心逻辑
@@ -1308,67 +3739,71 @@ class FeedbackCount(threading.Thread):
         改造后：返回单日对比结果的格式化字符串（用于飞书发送）
         返回：拼接好的统计字符串，兼容飞书消息换行/格式
         """
-        # 初始化结果字符串
-        result_str = ""
+        # 逐段追加到列表，最后一次拼接（避免字符串反复+=）
+        parts = []
 
         # 拼接标题和分隔线
-        result_str += "\n" + "=" * 120 + "\n"
-        result_str += f"📊 数据变化对比 ({yesterday_date} → {today_date})" + "\n"
-        result_str += "=" * 120 + "\n"
+        parts.append("\n" + "=" * 120 + "\n")
+        parts.append(f"📊 数据变化对比 ({yesterday_date} → {today_date})" + "\n")
+        parts.append("=" * 120 + "\n")
+
+        # 格式化数值和变化值（带符号和趋势），缺少数据时显示"无数据"
+        def count_str(value):
+            return "无数据" if value is None else value
+
+        def diff_str(stats, name):
+            diff = stats[f'{name}_diff']
+            if diff is None:
+                return "无数据"
+            return f"{stats[f'{name}_trend']} {diff:+}" if diff != 0 else "─ 0"
 
         for channel, category_data in compare_result.items():
             if not category_data:  # 渠道下无大类数据，跳过
                 continue
 
             # 拼接渠道名称和分隔线
-            result_str += f"\n🔹 渠道：{channel}" + "\n"
-            result_str += "-" * 100 + "\n"
+            parts.append(f"\n🔹 渠道：{channel}" + "\n")
+            parts.append("-" * 100 + "\n")
 
             # 拼接表头
             header_line = (
                 f"{'大类ID':<8} {'大类名称':<20} {'已解决(昨日)':<12} {'已解决(今日)':<12} "
                 f"{'已解决变化':<15} {'未解决(昨日)':<12} {'未解决(今日)':<12} {'未解决变化':<15}"
             )
-            result_str += header_line + "\n"
+            parts.append(header_line + "\n")
 
             # 拼接表头分隔线
             separator_line = (
                 f"{'─' * 8:<8} {'─' * 20:<20} {'─' * 12:<12} {'─' * 12:<12} "
                 f"{'─' * 15:<15} {'─' * 12:<12} {'─' * 12:<12} {'─' * 15:<15}"
             )
-            result_str += separator_line + "\n"
+            parts.append(separator_line + "\n")
 
             # 拼接每个大类的统计数据
             for cat_id, stats in category_data.items():
-                # 格式化变化值（带符号和趋势）
-                resolved_diff_str = f"{stats['resolved_trend']} {stats['resolved_diff']:+}" if stats[
-                                                                                                   'resolved_diff'] != 0 else "─ 0"
-                unresolved_diff_str = f"{stats['unresolved_trend']} {stats['unresolved_diff']:+}" if stats[
-                                                                                                         'unresolved_diff'] != 0 else "─ 0"
-
                 # 拼接单行数据
                 data_line = (
                     f"{cat_id:<8} "
                     f"{stats['category_title']:<20} "
-                    f"{stats['yesterday_resolved']:<12} "
-                    f"{stats['today_resolved']:<12} "
-                    f"{resolved_diff_str:<15} "
-                    f"{stats['yesterday_unresolved']:<12} "
-                    f"{stats['today_unresolved']:<12} "
-                    f"{unresolved_diff_str:<15}"
+                    f"{count_str(stats['yesterday_resolved']):<12} "
+                    f"{count_str(stats['today_resolved']):<12} "
+                    f"{diff_str(stats, 'resolved'):<15} "
+                    f"{count_str(stats['yesterday_unresolved']):<12} "
+                    f"{count_str(stats['today_unresolved']):<12} "
+                    f"{diff_str(stats, 'unresolved'):<15}"
                 )
-                result_str += data_line + "\n"
+                parts.append(data_line + "\n")
 
         # 返回最终拼接的字符串
-        return result_str
+        return "".join(parts)
 
     def print_weekly_result(self, compare_result: Dict, weekly_dates: List[str]) -> str:
         """
         改造后：返回一周对比结果的格式化字符串（用于飞书发送）
         返回：拼接好的统计字符串，兼容飞书消息换行/格式
         """
-        # 初始化结果字符串
-        result_str = ""
+        # 逐段追加到列表，最后一次拼接（避免字符串反复+=）
+        parts = []
 
         # 提取有效日期（从第一个有数据的大类中获取）
         valid_dates = []
@@ -1380,17 +3815,17 @@ class FeedbackCount(threading.Thread):
                 break
 
         # 拼接一周对比标题和分隔线
-        result_str += "\n" + "=" * 150 + "\n"
-        result_str += f"📊 一周数据变化对比：{valid_dates[0]} ~ {valid_dates[-1]}（共{len(valid_dates)}天）" + "\n"
-        result_str += "=" * 150 + "\n"
+        parts.append("\n" + "=" * 150 + "\n")
+        parts.append(f"📊 一周数据变化对比：{valid_dates[0]} ~ {valid_dates[-1]}（共{len(valid_dates)}天）" + "\n")
+        parts.append("=" * 150 + "\n")
 
         for channel, category_data in compare_result.items():
             if not category_data:  # 渠道下无大类数据，跳过
                 continue
 
             # 拼接渠道名称和分隔线
-            result_str += f"\n🔹 渠道：{channel}" + "\n"
-            result_str += "-" * 130 + "\n"
+            parts.append(f"\n🔹 渠道：{channel}" + "\n")
+            parts.append("-" * 130 + "\n")
 
             # 构建日期表头（简化显示为MM-DD）
             date_header_resolved = " | ".join([f"{date[5:]}已解决" for date in valid_dates]) + " | "
@@ -1403,14 +3838,14 @@ class FeedbackCount(threading.Thread):
                 f"{'累计变化(已解决)':<15} {'日均变化(已解决)':<15} "
                 f"{'累计变化(未解决)':<15} {'日均变化(未解决)':<15}"
             )
-            result_str += header_line + "\n"
+            parts.append(header_line + "\n")
 
             # 拼接表头分隔线
             separator_line = (
                 f"{'─' * 8:<8} {'─' * 20:<20} {'─' * (len(full_header) - 1):<{len(full_header) - 1}} "
                 f"{'─' * 15:<15} {'─' * 15:<15} {'─' * 15:<15} {'─' * 15:<15}"
             )
-            result_str += separator_line + "\n"
+            parts.append(separator_line + "\n")
 
             # 拼接每个大类的一周数据
             for cat_id, stats in category_data.items():
@@ -1435,21 +3870,146 @@ class FeedbackCount(threading.Thread):
                     f"{total_unresolved_str:<15} "
                     f"{stats['avg_unresolved_diff']:<15}"
                 )
-                result_str += data_line + "\n"
+                parts.append(data_line + "\n")
 
         # 返回最终拼接的字符串
-        return result_str
+        return "".join(parts)
+
+    def compute_trends(self, end_date: str = None, window: int = None, history_days: int = None) -> Dict:
+        """
+        从历史库计算截至end_date的趋势指标（滚动均值、解决速度、清空积压预计天数）
+        参数：
+            end_date: 截止日期，默认今天
+            window: 滚动窗口天数，默认 TREND_WINDOW_DAYS
+            history_days: 参与计算的历史天数，默认 TREND_HISTORY_DAYS
+        返回：TrendEngine.compute 的结果；未安装numpy时返回空字典
+        """
+        if import_numpy() is None:
+            print("⚠️  未安装numpy，跳过趋势计算")
+            return {}
+        window = window or self.TREND_WINDOW_DAYS
+        history_days = history_days or self.TREND_HISTORY_DAYS
+        end = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else datetime.now().date()
+        start_date = (end - timedelta(days=history_days - 1)).strftime('%Y-%m-%d')
+        rows = self.get_history_store().load_rows(start_date, end.strftime('%Y-%m-%d'))
+        return TrendEngine(rows).compute(window)
+
+    def print_trend_result(self, trends: Dict, window: int = None) -> str:
+        """
+        返回趋势指标的格式化字符串（附在周报后面发送到飞书）
+        """
+        window = window or self.TREND_WINDOW_DAYS
+        parts = ["\n" + "=" * 150 + "\n"]
+        parts.append(f"📈 趋势（最近{window}天）：滚动均值、解决速度、清空积压预计天数" + "\n")
+        parts.append("=" * 150 + "\n")
+
+        for channel, category_data in trends.items():
+            parts.append(f"\n🔹 渠道：{channel}" + "\n")
+            parts.append("-" * 130 + "\n")
+            parts.append((
+                f"{'大类ID':<8} {'大类名称':<20} {'已解决均值':<12} {'未解决均值':<12} "
+                f"{'解决速度(/天)':<14} {'当前积压':<10} {'积压变化(/天)':<14} {'预计清空(天)':<12}"
+            ) + "\n")
+            for cat_id, stats in category_data.items():
+                days_to_clear = "─" if stats['days_to_clear'] == float('inf') else stats['days_to_clear']
+                parts.append((
+                    f"{cat_id:<8} "
+                    f"{stats['category_title'] or '未知大类':<20} "
+                    f"{stats['resolved_mean']:<12} "
+                    f"{stats['unresolved_mean']:<12} "
+                    f"{stats['resolution_velocity']:<14} "
+                    f"{stats['backlog']:<10} "
+                    f"{stats['backlog_velocity']:<14} "
+                    f"{days_to_clear:<12}"
+                ) + "\n")
+        return "".join(parts)
+
+    def compare_ranges(self, range_a: Tuple[str, str], range_b: Tuple[str, str],
+                       channels: Iterable[str] = None, category_ids: Iterable = None) -> Dict:
+        """
+        对比任意两个日期/日期范围（如月环比、季度环比），可只看部分渠道或大类
+        参数：
+            range_a: 基准范围 (开始日期, 结束日期)，单日传相同的两个日期
+            range_b: 对比范围 (开始日期, 结束日期)
+            channels: 渠道列表，None表示全部
+            category_ids: 大类ID列表，None表示全部
+        返回：RangeQuery.compare 的结果；未安装numpy时返回空字典
+        """
+        for start, end in (range_a, range_b):
+            if start > end:
+                raise ValueError(f"日期范围{start}~{end}的开始日期晚于结束日期")
+        if import_numpy() is None:
+            print("⚠️  未安装numpy，无法进行范围对比")
+            return {}
+        query = self.get_range_query(min(range_a[0], range_b[0]), max(range_a[1], range_b[1]))
+        return query.compare(range_a, range_b, channels, category_ids)
+
+    def get_range_query(self, start_date: str, end_date: str) -> RangeQuery:
+        """
+        一次运行共用一个RangeQuery：已加载的日期范围覆盖所需范围时直接复用，否则合并两个范围重新加载
+        参数：
+            start_date: 开始日期 YYYY-MM-DD
+            end_date: 结束日期 YYYY-MM-DD
+        """
+        if self._range_query is not None:
+            loaded_start, loaded_end, query = self._range_query
+            if loaded_start <= start_date and end_date <= loaded_end:
+                return query
+            start_date, end_date = min(loaded_start, start_date), max(loaded_end, end_date)
+        query = RangeQuery(self.get_history_store().load_rows(start_date, end_date))
+        self._range_query = (start_date, end_date, query)
+        return query
+
+    def print_range_compare_result(self, compare_result: Dict, range_a: Tuple[str, str],
+                                   range_b: Tuple[str, str]) -> str:
+        """
+        返回范围对比结果的格式化字符串（用于终端输出或飞书发送）
+        """
+        label_a = range_a[0] if range_a[0] == range_a[1] else f"{range_a[0]}~{range_a[1]}"
+        label_b = range_b[0] if range_b[0] == range_b[1] else f"{range_b[0]}~{range_b[1]}"
+        parts = ["\n" + "=" * 150 + "\n"]
+        parts.append(f"📊 范围对比：[{label_a}] → [{label_b}]（均值为范围内每日数据的平均）" + "\n")
+        parts.append("=" * 150 + "\n")
+
+        for channel, category_data in compare_result.items():
+            parts.append(f"\n🔹 渠道：{channel}" + "\n")
+            parts.append("-" * 130 + "\n")
+            parts.append((
+                f"{'大类ID':<8} {'大类名称':<20} {'A已解决均值':<12} {'B已解决均值':<12} {'已解决变化':<12} "
+                f"{'A未解决均值':<12} {'B未解决均值':<12} {'未解决变化':<12}"
+            ) + "\n")
+            for cat_id, stats in category_data.items():
+                resolved_diff = "─" if stats['resolved_mean_diff'] is None else \
+                    f"{stats['resolved_trend']} {stats['resolved_mean_diff']:+}"
+                unresolved_diff = "─" if stats['unresolved_mean_diff'] is None else \
+                    f"{stats['unresolved_trend']} {stats['unresolved_mean_diff']:+}"
+                parts.append((
+                    f"{cat_id:<8} "
+                    f"{stats['category_title']:<20} "
+                    f"{str(stats['a_resolved_mean']):<12} "
+                    f"{str(stats['b_resolved_mean']):<12} "
+                    f"{resolved_diff:<12} "
+                    f"{str(stats['a_unresolved_mean']):<12} "
+                    f"{str(stats['b_unresolved_mean']):<12} "
+                    f"{unresolved_diff:<12}"
+                ) + "\n")
+        return "".join(parts)
 
     def one_day_compare(self) -> None:
         """
         单日对比主方法：昨日vs今日
         """
         try:
-            # 1. 读取YAML数据
-            yaml_data = self.load_yaml_data("data_save.yaml")
-
-            # 2. 获取昨天和今天的日期
+            # 1. 获取昨天和今天的日期
             yesterday_date, today_date = self.get_yesterday_and_today_dates()
+
+            # 2. 从历史库读取这两天的数据
+            yaml_data = self.load_history(yesterday_date, today_date)
+            missing_dates = [date for date in (yesterday_date, today_date) if not yaml_data.get(date)]
+            if missing_dates:
+                print(f"❌ 历史库中还没有[{'、'.join(missing_dates)}]的统计数据：{os.path.abspath(self.HISTORY_FILE)}")
+                print("💡 提示：请先运行统计（count_all）或导入data_save.yaml，确保历史库包含昨天和今天的统计数据")
+                return
             title =f"🔍 待对比日期：昨天[{yesterday_date}] → 今天[{today_date}]"
 
             # 3. 执行数据对比
@@ -1459,9 +4019,6 @@ class FeedbackCount(threading.Thread):
             content =self.print_compare_result(compare_result, yesterday_date, today_date)
             self.send_to_feishu(data=content, platform="Android",type="day_count", title=title)
 
-        except FileNotFoundError as e:
-            print(e)
-            print("💡 提示：请先确保data_save.yaml文件存在，且包含至少两天的统计数据")
         except Exception as e:
             print(f"❌ 对比失败：{str(e)}")
 
@@ -1470,11 +4027,11 @@ class FeedbackCount(threading.Thread):
         新增：一周对比主方法
         """
         try:
-            # 1. 读取YAML数据
-            yaml_data = self.load_yaml_data("data_save.yaml")
-
-            # 2. 获取过去7天日期范围
+            # 1. 获取过去7天日期范围
             weekly_dates = self.get_weekly_date_range()
+
+            # 2. 从历史库读取这7天的数据
+            yaml_data = self.load_history(weekly_dates[0], weekly_dates[-1])
             title= f"🔍 一周对比日期范围：{weekly_dates[0]} ~ {weekly_dates[-1]}"
 
             # 3. 执行一周数据对比
@@ -1483,23 +4040,81 @@ class FeedbackCount(threading.Thread):
             # 4. 格式化输出一周对比结果
             content = self.print_weekly_result(compare_result, weekly_dates)
 
+            # 5. 附上趋势指标
+            trends = self.compute_trends(weekly_dates[-1])
+            if trends:
+                content += self.print_trend_result(trends)
+
             self.send_to_feishu(data=content, platform="Android",type="week_count", title=title)
 
-        except FileNotFoundError as e:
-            print(e)
-            print("💡 提示：请先确保data_save.yaml文件存在，且包含至少两天的统计数据")
         except ValueError as e:
             print(e)
         except Exception as e:
             print(f"❌ 一周对比失败：{str(e)}")
 
     def run(self):
+        """线程入口：常驻模式下按小时循环执行，否则只执行一次"""
+        if self.daemon_mode:
+            self.serve_forever()
+        else:
+            self.run_once()
+
+    def start_daemon(self):
+        """在后台线程中以常驻模式启动"""
+        self.daemon_mode = True
+        self.start()
+
+    def stop(self):
+        """通知常驻模式在当前任务结束后退出"""
+        self.stop_event.set()
+
+    def next_tick(self, now=None):
+        """
+        下一次执行定时任务的时间（每小时的 DAEMON_TICK_MINUTE 分）
+        """
+        now = now or datetime.now()
+        tick = now.replace(minute=self.DAEMON_TICK_MINUTE, second=0, microsecond=0)
+        return tick if tick > now else tick + timedelta(hours=1)
+
+    def prepare_tick(self):
+        """
+        每次定时任务前的准备：刷新基准时间、清空上次的结果表，
+        token过期时由TokenManager自动重新登录，配置超过刷新间隔时重新获取（会话、连接池和缓存保持不变）
+        """
+        self.now = datetime.now()
+        self.count_table = {}
+        self.results = []
+        if not self.feedback_list or time.monotonic() - self.config_loaded_at >= self.CONFIG_REFRESH_INTERVAL:
+            self.refresh_config()
+
+    def serve_forever(self):
+        """
+        常驻模式：内部调度每小时执行一次 run_once（8点、9点和周一的任务由 run_once 按时间分派），
+        登录态、配置、HTTP连接池和本地缓存在两次执行之间保持
+        """
+        print(f"⏰ 常驻模式启动，每小时第{self.DAEMON_TICK_MINUTE}分执行定时任务")
+        while not self.stop_event.is_set():
+            tick = self.next_tick()
+            print(f"⏳ 下一次执行时间：{tick.strftime('%Y-%m-%d %H:%M:%S')}")
+            if self.stop_event.wait((tick - datetime.now()).total_seconds()):
+                break
+            try:
+                self.prepare_tick()
+                self.run_once()
+            except Exception as e:
+                print(f"❌ 定时任务执行出错: {str(e)}")
+        print("👋 常驻模式已退出")
+
+    def run_once(self):
         """主运行逻辑"""
         try:
             print("🚀 反馈统计系统启动")
             current_hour = datetime.now().hour
             weekday = datetime.now().weekday()
 
+            # 先补发上次未投递成功的卡片（不依赖CMS）
+            self.resend_outbox()
+
             # 检查必要的配置
             if not self.token:
                 print("❌ CMS登录失败，系统无法正常运行")
@@ -1510,6 +4125,8 @@ class FeedbackCount(threading.Thread):
 
             # 早上10点发送日报
             if current_hour == 9:
+                # 日报和周报的反馈数一次性统一获取
+                self.prefetch_summary_counts(weekly=weekday == 0)
                 self.count_all()
                 self.get_recent_feedback(hours=1)
                 self.get_daily_summary()
@@ -1522,13 +4139,15 @@ class FeedbackCount(threading.Thread):
                 else:
                     self.get_recent_feedback(hours=1)
 
-            # 早上8点发送汇总明细
+            # 早上8点发送汇总明细（固定窗口，不按水位线过滤，也不推进每小时任务的水位线）
             elif current_hour == 8:
-                self.get_recent_feedback(hours=8)
+                self.get_recent_feedback(hours=8, incremental=False)
 
             else:
                 self.get_recent_feedback(hours=1)
 
+            self.print_connection_stats()
+
         except Exception as e:
             print(f"❌ 程序执行出错: {str(e)}")
             # 发送错误通知到飞书
@@ -1536,6 +4155,9 @@ class FeedbackCount(threading.Thread):
             self.send_to_feishu(error_msg, 'Android',
                                 datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
                                 datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+        finally:
+            # 等待本次运行提交的飞书卡片全部发送完成
+            self.deliver_feishu()
 
 
 def main():
@@ -1554,27 +4176,34 @@ def main():
         print("1. 获取最近1小时反馈")
         print("2. 获取最近24小时反馈")
         print("3. 生成周汇总报告")
-        print("4. 启动定时任务（后台运行）")
+        print("4. 启动定时任务（常驻后台，每小时执行）")
         print("5. 退出")
 
         choice = input("\n请输入选项 (1-5): ")
 
+        # 手动查询是固定窗口，不使用也不推进定时任务的水位线
         if choice == '1':
-            feedback_count.get_recent_feedback(hours=1)
+            feedback_count.get_recent_feedback(hours=1, incremental=False)
         elif choice == '2':
-            feedback_count.get_recent_feedback(hours=24)
+            feedback_count.get_recent_feedback(hours=24, incremental=False)
         elif choice == '3':
             feedback_count.get_weekly_summary()
         elif choice == '4':
             print("⏳ 启动定时任务...")
-            feedback_count.start()
+            feedback_count.start_daemon()
             print("✅ 定时任务已启动，按 Ctrl+C 退出")
-            feedback_count.join()
+            try:
+                while feedback_count.is_alive():
+                    feedback_count.join(timeout=1)
+            except KeyboardInterrupt:
+                feedback_count.stop()
+                feedback_count.join()
         elif choice == '5':
             print("👋 退出系统")
             sys.exit(0)
         else:
             print("❌ 无效选项，请重新选择")
+        feedback_count.deliver_feishu()
 
     except KeyboardInterrupt:
         print("\n👋 用户中断程序")
@@ -1582,8 +4211,54 @@ def main():
         print(f"\n❌ 程序运行出错: {str(e)}")
 
 
+def parse_date_range(value: str) -> Tuple[str, str]:
+    """
+    解析命令行中的日期范围：YYYY-MM-DD 或 YYYY-MM-DD:YYYY-MM-DD
+    """
+    start, _, end = value.partition(":")
+    end = end or start
+    for date in (start, end):
+        datetime.strptime(date, '%Y-%m-%d')
+    if start > end:
+        raise argparse.ArgumentTypeError(f"日期范围{value}的开始日期晚于结束日期，请写成 {end}:{start}")
+    return start, end
+
+
+def compare_cli(argv: List[str]) -> None:
+    """
+    命令行范围对比：
+    python main.py compare 2026-09-01:2026-09-30 2026-10-01:2026-10-31 [--channel 渠道 ...] [--category 大类ID ...] [--send]
+    """
+    parser = argparse.ArgumentParser(prog="main.py compare", description="对比任意两个日期或日期范围的已解决/未解决数据")
+    parser.add_argument("range_a", type=parse_date_range, help="基准日期或范围，如 2026-09-01 或 2026-09-01:2026-09-30")
+    parser.add_argument("range_b", type=parse_date_range, help="对比日期或范围")
+    parser.add_argument("--channel", action="append", help="只对比该渠道（可重复）")
+    parser.add_argument("--category", action="append", help="只对比该大类ID（可重复）")
+    parser.add_argument("--send", action="store_true", help="同时发送到飞书")
+    args = parser.parse_args(argv)
+
+    feedback_count = FeedbackCount()
+    compare_result = feedback_count.compare_ranges(args.range_a, args.range_b, args.channel, args.category)
+    content = feedback_count.print_range_compare_result(compare_result, args.range_a, args.range_b)
+    print(content)
+    if args.send:
+        title = f"🔍 范围对比：{args.range_a[0]}~{args.range_a[1]} → {args.range_b[0]}~{args.range_b[1]}"
+        feedback_count.send_to_feishu(data=content, platform="Android", type="day_count", title=title)
+        feedback_count.deliver_feishu()
+
+
 if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'compare':
+        compare_cli(sys.argv[2:])
+        sys.exit(0)
     count = FeedbackCount()
+    if len(sys.argv) > 1 and sys.argv[1] == 'daemon':
+        # 常驻模式：python main.py daemon（替代每小时由cron启动一次）
+        try:
+            count.serve_forever()
+        except KeyboardInterrupt:
+            print("\n👋 用户中断程序")
+        sys.exit(0)
     count.run()
     # # 测试1：单日对比（昨日vs今日）
     # print("======= 单日对比 =======")
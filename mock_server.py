@@ -0,0 +1,293 @@
+#!/usr/local/bin/python
+# -*- coding: UTF-8 -*-
+# @Project : cms_feed
+# @File    : mock_server.py
+# @Software: PyCharm
+"""
+本地模拟的 CMS + 飞书服务
+实现 main.py 用到的接口，用于在不访问线上 admin-api.netpop.app 的情况下压测/调试
+数据量、请求延迟分布和错误率均可配置，见 start_mock_server
+"""
+import json
+import math
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+CMS_HOST = "https://admin-api.netpop.app"
+FEISHU_HOST = "https://open.feishu.cn"
+
+DETAIL_PATH = re.compile(r'^/user/behavior/backend/feedback/v2/detail/(\d+)$')
+TRANSLATE_DELIMITER = re.compile(r'^<<<\d+>>>$')
+
+SAMPLE_QUESTIONS = [
+    "VIP not working after payment",
+    "can't download the movie",
+    "subtitles are out of sync",
+    "app crashes when I open it",
+    "视频一直在缓冲",
+    "",
+]
+
+
+LATENCY_DISTRIBUTIONS = ('fixed', 'uniform', 'exponential', 'lognormal')
+
+
+def sample_latency(rnd, mean, dist):
+    """
+    按分布采样一次请求延迟，各分布的均值都是mean
+    fixed：固定值；uniform：[0, 2*mean] 均匀；exponential：指数分布；lognormal：对数正态（sigma=1，长尾）
+    """
+    if mean <= 0:
+        return 0.0
+    if dist == 'uniform':
+        return rnd.uniform(0, 2 * mean)
+    if dist == 'exponential':
+        return rnd.expovariate(1 / mean)
+    if dist == 'lognormal':
+        return rnd.lognormvariate(math.log(mean) - 0.5, 1.0)
+    return mean
+
+
+def translate(text):
+    """模拟翻译：逐行加前缀，保留批量翻译的编号分隔行"""
+    return "\n".join(line if TRANSLATE_DELIMITER.match(line) or not line else f"译文:{line}"
+                     for line in text.split("\n"))
+
+
+class MockData:
+    """
+    模拟数据：渠道、反馈类型、反馈列表和详情
+    """
+
+    def __init__(self, channels=4, types_per_channel=10, items_per_type=20, window_hours=24, seed=1,
+                 categories_per_channel=8, subcategories_per_category=30, subcategory_depth=2):
+        rnd = random.Random(seed)
+        self.now = datetime.now()
+        self.tabs = []
+        self.types = {}
+        self.items = []
+        self.details = {}
+        self.issue_channels = []
+        self.categories = {}
+        self.subcategories = {}
+
+        type_id = 1
+        feedback_id = 1
+        for c in range(channels):
+            app_name = f"MOCK{c}"
+            client_group = f"MOCK{c}_APP"
+            self.tabs.append({"appName": app_name, "clientGroupCode": client_group})
+            channel_types = []
+            for _ in range(types_per_channel):
+                channel_types.append({"id": type_id, "name": f"类型{type_id}"})
+                for _ in range(items_per_type):
+                    create_time = self.now - timedelta(seconds=rnd.randint(0, window_hours * 3600))
+                    self.items.append({
+                        "id": feedback_id,
+                        "type": type_id,
+                        "appName": app_name,
+                        "clientGroup": client_group,
+                        "userId": 100000 + feedback_id,
+                        "deviceId": f"device-{feedback_id}",
+                        "appVersion": "1.0.0",
+                        "region": "US",
+                        "ipAddress": "127.0.0.1",
+                        "createTime": create_time.strftime('%Y-%m-%d %H:%M:%S'),
+                    })
+                    self.details[feedback_id] = {
+                        "question": rnd.choice(SAMPLE_QUESTIONS),
+                        "templateInfo": None,
+                        "imgUrl": "",
+                    }
+                    feedback_id += 1
+                type_id += 1
+            self.types[(app_name, client_group)] = channel_types
+
+            # 已解决/未解决统计：渠道 → 大类 → 小类（sonIssuesList 嵌套）
+            self.issue_channels.append({"appName": app_name, "clientGroupCode": client_group, "platformType": "APP"})
+            channel_categories = []
+            for _ in range(categories_per_channel):
+                category_id = len(self.subcategories) + 1
+                channel_categories.append({"id": category_id, "categoryTitle": f"大类{category_id}"})
+                self.subcategories[category_id] = [self.build_issue(rnd, f"{category_id}-{i}", subcategory_depth)
+                                                   for i in range(subcategories_per_category)]
+            self.categories[(app_name, client_group, "APP")] = channel_categories
+
+        # 列表接口按创建时间倒序返回
+        self.items.sort(key=lambda item: (item['createTime'], item['id']), reverse=True)
+
+    @classmethod
+    def build_issue(cls, rnd, issue_id, depth):
+        """生成一个小类，depth>1 时带一个 sonIssuesList 子小类"""
+        return {
+            "id": issue_id,
+            "innerTitle": f"小类{issue_id}",
+            "resolvedQty": rnd.choice([None, rnd.randint(0, 50)]),
+            "unresolvedQty": rnd.randint(0, 20),
+            "sonIssuesList": [cls.build_issue(rnd, f"{issue_id}-0", depth - 1)] if depth > 1 else [],
+        }
+
+    def page(self, body):
+        """按应用、渠道组、类型、时间范围过滤并分页"""
+        types = set(body.get('types') or [])
+        start, end = body.get('startDate', ''), body.get('endDate', '')
+        matched = [
+            item for item in self.items
+            if item['appName'] == body.get('appName') and item['clientGroup'] == body.get('clientGroup')
+            and (not types or item['type'] in types)
+            and start <= item['createTime'] <= end
+        ]
+        page, size = int(body.get('page', 0)), int(body.get('size', 20))
+        return {"content": matched[page * size:(page + 1) * size], "totalElements": len(matched)}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """模拟接口的请求处理，server 上挂载 data/latency/stats"""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json;charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _handle(self, method):
+        server = self.server
+        parsed = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        raw = self._read_body()
+        endpoint = 'detail' if DETAIL_PATH.match(parsed.path) else parsed.path.rstrip('/').split('/')[-1]
+        with server.stats_lock:
+            server.stats[endpoint] = server.stats.get(endpoint, 0) + 1
+        if server.latency:
+            time.sleep(sample_latency(server.random, server.latency, server.latency_dist))
+
+        data = server.data
+        path = parsed.path
+        if (server.error_rate and not path.startswith('/open-apis/') and path != '/auth/backend/account/login'
+                and server.random.random() < server.error_rate):
+            with server.stats_lock:
+                server.errors += 1
+            return self._send_json({"code": "B0001", "msg": "mock server error"}, status=500)
+        if path == '/auth/backend/account/login':
+            with server.stats_lock:
+                token = f"mock-token-{len(server.tokens) + 1}"
+                server.tokens.add(token)
+            return self._send_json({"code": "00000", "data": token})
+        if not path.startswith('/open-apis/') and self.headers.get('token') not in server.tokens:
+            return self._send_json({"code": "A0230", "msg": "用户登录已过期"})
+        if path == '/user/behavior/backend/feedback/tab/config':
+            return self._send_json({"code": "00000", "data": data.tabs})
+        if path == '/cms/backend/issues/type/list':
+            return self._send_json({"code": "00000",
+                                    "data": data.types.get((query.get('appName'), query.get('clientGroup')), [])})
+        if path == '/user/behavior/backend/feedback/v2/page/0':
+            return self._send_json({"code": "00000", "data": data.page(json.loads(raw or b'{}'))})
+        match = DETAIL_PATH.match(path)
+        if match:
+            return self._send_json({"code": "00000", "data": data.details.get(int(match.group(1)), {})})
+        if path == '/third/backend/openai/translate':
+            return self._send_json({"code": "00000", "data": translate(raw.decode('utf-8'))})
+        if path == '/user/behavior/backend/feedback/issue/config':
+            return self._send_json({"code": "00000", "data": data.issue_channels})
+        if path == '/cms/backend/issues/category/queryByPage':
+            key = (query.get('appName'), query.get('clientGroup'), query.get('platformType'))
+            return self._send_json({"code": "00000", "data": {"content": data.categories.get(key, [])}})
+        if path == '/cms/backend/issues/queryByPage':
+            content = data.subcategories.get(int(query.get('categoryId', 0)), [])
+            page, size = int(query.get('page', 0)), int(query.get('size', 20))
+            return self._send_json({"code": "00000", "data": {"content": content[page * size:(page + 1) * size],
+                                                              "totalElements": len(content)}})
+        if path.startswith('/open-apis/bot/v2/hook/'):
+            with server.stats_lock:
+                server.hook_bodies.append((path.rsplit('/', 1)[-1], time.monotonic(), json.loads(raw or b'{}')))
+            if server.hook_error_rate and server.random.random() < server.hook_error_rate:
+                # 与线上一致：限流以HTTP 200 + 非0 code 返回
+                return self._send_json({"code": 11232, "msg": "frequency limited"})
+            return self._send_json({"code": 0, "msg": "success"})
+        return self._send_json({"code": "404", "msg": f"unknown path {path}"}, status=404)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+
+class MockServer(ThreadingHTTPServer):
+    """支持大量并发连接的模拟服务"""
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def start_mock_server(port=0, latency=0.0, latency_dist='fixed', error_rate=0.0, hook_error_rate=0.0,
+                      **data_options):
+    """
+    在后台线程启动模拟服务
+    :param port: 端口，0表示随机端口
+    :param latency: 每个请求的平均延迟（秒）
+    :param latency_dist: 延迟分布，见 LATENCY_DISTRIBUTIONS
+    :param error_rate: CMS接口（登录除外）返回500的比例
+    :param hook_error_rate: 飞书Webhook返回限流错误码（11232）的比例
+    :param data_options: 传给 MockData 的数据量配置
+    :return: (server, base_url)
+    """
+    server = MockServer(('127.0.0.1', port), MockHandler)
+    server.data = MockData(**data_options)
+    server.latency = latency
+    server.latency_dist = latency_dist
+    server.error_rate = error_rate
+    server.errors = 0
+    server.stats = {}
+    server.tokens = set()
+    server.hook_error_rate = hook_error_rate
+    server.hook_bodies = []
+    server.random = random.Random(data_options.get('seed', 1))
+    server.stats_lock = threading.Lock()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def expire_tokens(server):
+    """让已签发的token全部失效（模拟CMS登录过期）"""
+    with server.stats_lock:
+        server.tokens = {f"expired-{len(server.tokens)}-{i}" for i in range(len(server.tokens))}
+
+
+def patch_urls(cls, base_url):
+    """
+    生成一个所有接口地址都指向模拟服务的子类
+    :param cls: FeedbackCount 或其子类
+    :param base_url: 模拟服务地址
+    :return: 子类
+    """
+    attrs = {}
+    for name in dir(cls):
+        value = getattr(cls, name)
+        if name.endswith('_URL') and isinstance(value, str):
+            attrs[name] = value.replace(CMS_HOST, base_url)
+    attrs['WEBHOOK_URLS'] = {key: url.replace(FEISHU_HOST, base_url) for key, url in cls.WEBHOOK_URLS.items()}
+    return type(f"Mock{cls.__name__}", (cls,), attrs)
+
+
+if __name__ == '__main__':
+    mock_server, url = start_mock_server(port=8900, latency=0.02, latency_dist='lognormal')
+    print(f"🚀 模拟服务已启动: {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        mock_server.shutdown()
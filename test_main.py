@@ -0,0 +1,880 @@
+#!/usr/local/bin/python
+# -*- coding: UTF-8 -*-
+# @Project : cms_feed
+# @File    : test_main.py
+# @Software: PyCharm
+"""
+main.py 中带状态组件的单元测试（不访问网络，所有本地存储使用内存数据库或临时目录）
+运行：python -m unittest test_main  或  python -m pytest test_main.py
+"""
+import asyncio
+import base64
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+
+from main import (CardBuilder, FeedbackCount, FeishuDelivery, FeishuOutbox, HistoryStore, RangeQuery, SqliteCache,
+                  TokenBucket, TokenManager, TrendEngine, import_aiohttp, import_numpy)
+from mock_server import expire_tokens, patch_urls, start_mock_server
+
+
+class OfflineFeedbackCount(FeedbackCount):
+    """所有本地状态放在内存中的实例，构造时不发请求"""
+    TOKEN_FILE = None
+    WATERMARK_FILE = ':memory:'
+    DAY_COUNT_FILE = ':memory:'
+    CONFIG_CACHE_FILE = ':memory:'
+    HISTORY_FILE = ':memory:'
+    HISTORY_YAML_FILE = ''
+    OUTBOX_FILE = ':memory:'
+    DETAIL_CACHE_FILE = ':memory:'
+    TRANSLATE_CACHE_FILE = ':memory:'
+    FEISHU_RATE_LIMITS = []
+    FEISHU_BACKOFF_FACTOR = 0
+    WEBHOOK_URLS = {'Android': 'http://hook/android', 'iOS': 'http://hook/ios', 'Count': 'http://hook/count'}
+
+
+class FakeResponse:
+    """FeishuDelivery 用到的 requests.Response 子集"""
+
+    def __init__(self, status_code=200, body=None):
+        self.status_code = status_code
+        self.body = {"code": 0, "msg": "success"} if body is None else body
+        self.text = json.dumps(self.body)
+        self.headers = {}
+
+    def json(self):
+        return self.body
+
+
+def jwt(exp):
+    """生成只带exp的JWT（不签名）"""
+    payload = base64.urlsafe_b64encode(json.dumps({"exp": exp}).encode()).decode().rstrip("=")
+    return f"header.{payload}.signature"
+
+
+class SqliteCacheTest(unittest.TestCase):
+
+    def test_lru_eviction_by_entries(self):
+        cache = SqliteCache(':memory:', max_entries=2)
+        cache.set_many({'a': 1})
+        cache.set_many({'b': 2})
+        time.sleep(0.01)
+        cache.get_many(['a'])  # a 比 b 更近访问
+        cache.set_many({'c': 3})
+        self.assertEqual(cache.get_many(['a', 'b', 'c']), {'a': 1, 'c': 3})
+
+    def test_lru_eviction_by_bytes(self):
+        cache = SqliteCache(':memory:', max_bytes=20)
+        cache.set_many({'a': 'x' * 10})
+        time.sleep(0.01)
+        cache.set_many({'b': 'y' * 10})
+        self.assertEqual(set(cache.get_many(['a', 'b'])), {'b'})
+
+    def test_ttl_expiry(self):
+        cache = SqliteCache(':memory:', ttl=-1)
+        cache.set_many({'a': 1})
+        self.assertEqual(cache.get_many(['a']), {})
+        self.assertEqual(cache.conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0], 0)
+
+
+class HistoryStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = HistoryStore(':memory:')
+
+    @staticmethod
+    def stats(resolved, unresolved, title="大类"):
+        return {"category_title": title, "resolved_total": resolved, "unresolved_total": unresolved}
+
+    def test_upsert_round_trip_keeps_category_id_type(self):
+        self.store.upsert({"2026-01-01": {"ch": {29: self.stats(1, 2), "30": self.stats(3, 4)}}})
+        data = self.store.load_range("2026-01-01", "2026-01-01")
+        self.assertEqual(set(data["2026-01-01"]["ch"]), {29, "30"})
+        self.assertEqual(data["2026-01-01"]["ch"][29]["unresolved_total"], 2)
+
+    def test_snapshot_stores_only_changes_and_replays(self):
+        date = "2026-01-01"
+        first = {"ch": {1: self.stats(1, 10), 2: self.stats(5, 5)}}
+        second = {"ch": {1: self.stats(2, 9), 2: self.stats(5, 5)}}
+        self.assertEqual(self.store.save_snapshot(date, f"{date} 09:00:00", first), 2)
+        self.assertEqual(self.store.save_snapshot(date, f"{date} 10:00:00", second), 1)
+        self.assertEqual(self.store.list_snapshots(date), [(f"{date} 09:00:00", 2), (f"{date} 10:00:00", 1)])
+        self.assertEqual(self.store.load_snapshot(date, f"{date} 09:30:00"), first)
+        self.assertEqual(self.store.load_snapshot(date)["ch"][1]["resolved_total"], 2)
+
+    def test_failed_category_keeps_previous_value(self):
+        date = "2026-01-01"
+        self.store.save_snapshot(date, f"{date} 09:00:00", {"ch": {1: self.stats(1, 10)}})
+        changed = self.store.save_snapshot(date, f"{date} 10:00:00",
+                                           {"ch": {1: None, 2: {"category_title": "x", "resolved_total": None}}})
+        self.assertEqual(changed, 0)
+        self.assertEqual(self.store.load_snapshot(date), {"ch": {1: self.stats(1, 10)}})
+
+    def test_snapshot_is_atomic(self):
+        date = "2026-01-01"
+        self.store.save_snapshot(date, f"{date} 09:00:00", {"ch": {1: self.stats(1, 10)}})
+
+        def fail(rows):
+            raise RuntimeError("crash")
+        self.store._upsert_rows = fail
+        with self.assertRaises(RuntimeError):
+            self.store.save_snapshot(date, f"{date} 10:00:00", {"ch": {1: self.stats(2, 9)}})
+        self.assertEqual(len(self.store.list_snapshots(date)), 1)
+        self.assertEqual(self.store.load_snapshot(date, f"{date} 23:59:59"), {"ch": {1: self.stats(1, 10)}})
+
+
+@unittest.skipIf(import_numpy() is None, "需要numpy")
+class RangeQueryTest(unittest.TestCase):
+
+    def test_range_means_match_naive_sums(self):
+        rows = []
+        for day in range(1, 11):
+            for category_id in (1, 2):
+                if category_id == 2 and day in (3, 4):
+                    continue  # 缺失的天不计入均值
+                rows.append((f"2026-01-{day:02d}", "ch", category_id, "大类", day * category_id, 100 - day))
+        query = RangeQuery(rows)
+        result = query.compare(("2026-01-01", "2026-01-05"), ("2026-01-06", "2026-01-10"))
+        for category_id in (1, 2):
+            for key, (start, end) in (("a", (1, 5)), ("b", (6, 10))):
+                values = [r[4] for r in rows if r[2] == category_id and start <= int(r[0][-2:]) <= end]
+                self.assertAlmostEqual(result["ch"][category_id][f"{key}_resolved_mean"],
+                                       round(sum(values) / len(values), 2))
+
+    def test_range_outside_history_is_empty(self):
+        query = RangeQuery([("2026-01-01", "ch", 1, "大类", 1, 1)])
+        self.assertEqual(query.clip_range("2025-01-01", "2025-01-31"), (0, -1))
+
+
+@unittest.skipIf(import_numpy() is None, "需要numpy")
+class TrendEngineTest(unittest.TestCase):
+    """趋势指标与逐日循环的朴素计算一致，缺失的日期不计入均值"""
+
+    def setUp(self):
+        self.rows = []
+        for day in range(10):
+            date = f"2026-01-{day + 1:02d}"
+            self.rows.append((date, "ch", 1, "大类1", 10 + 3 * day, 50 - 2 * day))
+            if day not in (7, 8):  # 大类2缺少两天
+                self.rows.append((date, "ch", 2, "大类2", day * day, 5))
+        self.rows.append(("2026-01-05", "ch", 3, "大类3", 1, 1))  # 最新一天没有数据的大类不输出
+        self.rows.sort(key=lambda row: row[0])  # 与 HistoryStore.load_rows 一样按日期排序
+
+    def naive_mean(self, category_id, column, window):
+        dates = {f"2026-01-{day:02d}" for day in range(10 - window + 1, 11)}
+        values = [row[column] for row in self.rows if row[2] == category_id and row[0] in dates]
+        return round(sum(values) / len(values), 2)
+
+    def test_rolling_means_match_naive_means(self):
+        for window in (1, 3, 7):
+            result = TrendEngine(self.rows).compute(window)["ch"]
+            for category_id in (1, 2):
+                self.assertAlmostEqual(result[category_id]["resolved_mean"], self.naive_mean(category_id, 4, window))
+                self.assertAlmostEqual(result[category_id]["unresolved_mean"], self.naive_mean(category_id, 5, window))
+            self.assertNotIn(3, result)
+
+    def test_velocity_and_days_to_clear(self):
+        result = TrendEngine(self.rows).compute(3)["ch"]
+        self.assertEqual(result[1]["resolution_velocity"], 3)
+        self.assertEqual(result[1]["backlog"], 32)
+        self.assertEqual(result[1]["backlog_velocity"], -2)
+        self.assertEqual(result[1]["days_to_clear"], 16)
+        # 窗口起点（第7天）有数据，缺失的第8、9天不影响日均增量：(81 - 36) / 3
+        self.assertEqual(result[2]["resolution_velocity"], 15)
+        self.assertEqual(result[2]["days_to_clear"], float("inf"))
+
+    def test_empty_history(self):
+        self.assertEqual(TrendEngine([]).compute(), {})
+
+
+class CardBuilderTest(unittest.TestCase):
+
+    def test_cards_stay_under_limit_and_keep_content(self):
+        blocks = [f"**反馈{i}**: " + "中文内容" * (i % 7 + 1) + "\n" for i in range(200)]
+        blocks.append("超长" * 500 + "\n")
+        cards = CardBuilder("标题", 1024).extend(blocks).build()
+        self.assertGreater(len(cards), 1)
+        self.assertEqual(cards[0][0], f"标题 (1/{len(cards)})")
+        for _, content in cards:
+            self.assertLessEqual(CardBuilder.encoded_size(content), 1024)
+        self.assertEqual("".join(content for _, content in cards), "".join(blocks))
+
+    def test_single_card_has_plain_title(self):
+        self.assertEqual(CardBuilder("标题", 1024).extend(["a\n"]).build(), [("标题", "a\n")])
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    def test_pacing_after_burst(self):
+        bucket = TokenBucket(rate=20, capacity=2)
+        begin = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+        # 前2个为突发，其余4个按每秒20个补充
+        self.assertGreaterEqual(time.monotonic() - begin, 4 / 20 * 0.9)
+
+
+class TokenManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.tmp_dir, "token.json")
+        self.logins = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def login(self):
+        self.logins.append(1)
+        return jwt(time.time() + 3600) + str(len(self.logins))
+
+    def manager(self, retry_interval=30):
+        return TokenManager(self.login, self.cache_file, ttl=3600, expiry_margin=60, retry_interval=retry_interval)
+
+    def test_lazy_login_and_disk_cache(self):
+        manager = self.manager()
+        self.assertEqual(self.logins, [])
+        token = manager.get()
+        self.assertEqual(len(self.logins), 1)
+        self.assertEqual(os.stat(self.cache_file).st_mode & 0o777, 0o600)
+        self.assertEqual(self.manager().get(), token)
+        self.assertEqual(len(self.logins), 1)
+
+    def test_expiry_from_jwt(self):
+        manager = self.manager()
+        self.assertAlmostEqual(manager.token_expiry(jwt(1234567890)), 1234567890)
+        self.assertAlmostEqual(manager.token_expiry("opaque"), time.time() + 3600, delta=5)
+
+    def test_concurrent_refresh_logs_in_once(self):
+        manager = self.manager()
+        stale = manager.get()
+        manager.issued_at -= 60
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(manager.refresh(stale))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.logins), 2)
+        self.assertEqual(len(set(results)), 1)
+        self.assertNotEqual(results[0], stale)
+
+    def test_fresh_token_rejected_does_not_relogin(self):
+        manager = self.manager()
+        token = manager.get()
+        self.assertEqual(manager.refresh(token), "")
+        self.assertEqual(len(self.logins), 1)
+
+    def test_failed_login_waits_retry_interval(self):
+        manager = TokenManager(lambda: self.logins.append(1) or "", None, 3600, 60, retry_interval=30)
+        self.assertEqual(manager.get(), "")
+        self.assertEqual(manager.get(), "")
+        self.assertEqual(len(self.logins), 1)
+
+
+class TokenExpiryTest(unittest.TestCase):
+    """只有401和A02xx才按token失效处理；失效后重新登录一次并重放请求"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server, base_url = start_mock_server(channels=1, types_per_channel=1, items_per_type=5)
+        cls.cls = patch_urls(OfflineFeedbackCount, base_url)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def test_only_confirmed_signals_count_as_expired(self):
+        feedback_count = OfflineFeedbackCount()
+        self.assertTrue(feedback_count.is_token_expired(401, b''))
+        self.assertTrue(feedback_count.is_token_expired(200, '{"code":"A0230","msg":"用户登录已过期"}'.encode()))
+        self.assertFalse(feedback_count.is_token_expired(403, b'{"code":"A0301","msg":"forbidden"}'))
+        self.assertFalse(feedback_count.is_token_expired(200, b'{"code":"B0001","msg":"openai: max tokens exceeded"}'))
+        self.assertFalse(feedback_count.is_token_expired(200, '{"code":"B0001","msg":"请重新登录"}'.encode()))
+        self.assertFalse(feedback_count.is_token_expired(200, b'{"code":"00000","data":{"question":"\\"A0230\\""}}'))
+        self.assertFalse(feedback_count.is_token_expired(500, b'<html>"A0230"</html>'))
+
+    def fetch(self, engine):
+        feedback_count = self.cls(engine=engine)
+        tasks = [("MOCK0", "MOCK0_APP", 1, "类型1", *feedback_count.get_time_range(hours=48))]
+        with contextlib.redirect_stdout(io.StringIO()):
+            feedback_count.run_tasks('process_feedback_type', tasks, engine)
+            logins = self.server.stats.get('login', 0)
+            feedback_count.token_manager.issued_at -= feedback_count.TOKEN_RETRY_INTERVAL  # 刚签发的token被拒绝时不重新登录
+            expire_tokens(self.server)
+            results = feedback_count.run_tasks('process_feedback_type', tasks, engine)
+        feedback_count.request_executor.shutdown(wait=False)
+        return results, self.server.stats.get('login', 0) - logins
+
+    def test_expired_token_is_refreshed_and_request_replayed(self):
+        results, logins = self.fetch('thread')
+        self.assertEqual(logins, 1)
+        self.assertEqual(results[0]['count'], 5)
+
+    @unittest.skipIf(import_aiohttp() is None, "需要aiohttp")
+    def test_expired_token_is_refreshed_and_request_replayed_async(self):
+        results, logins = self.fetch('async')
+        self.assertEqual(logins, 1)
+        self.assertEqual(results[0]['count'], 5)
+
+
+@unittest.skipIf(import_aiohttp() is None, "需要aiohttp")
+class AsyncEngineTest(unittest.TestCase):
+    """async引擎：登录和SQLite缓存读写都不在事件循环线程中执行"""
+
+    def setUp(self):
+        self.feedback_count = OfflineFeedbackCount()
+        self.on_loop = []
+
+    def record(self, name):
+        try:
+            asyncio.get_running_loop()
+            self.on_loop.append(name)
+        except RuntimeError:
+            pass
+
+    def test_login_runs_off_the_event_loop(self):
+        def login():
+            self.record("login")
+            return jwt(time.time() + 3600)
+        self.feedback_count.token_manager.login = login
+        token = asyncio.run(self.feedback_count._async_token())
+        self.assertTrue(token)
+        self.assertEqual(self.on_loop, [])
+        # token有效时直接返回，不再登录
+        self.assertEqual(asyncio.run(self.feedback_count._async_token()), token)
+
+    def test_detail_cache_runs_off_the_event_loop(self):
+        cache = self.feedback_count.detail_cache
+        cache.set_many({"1": {"question": "cached"}})
+        get_many, set_many = cache.get_many, cache.set_many
+        cache.get_many = lambda keys: self.record("get_many") or get_many(keys)
+        cache.set_many = lambda items: self.record("set_many") or set_many(items)
+
+        async def get_detail(session, feedback_id):
+            return {"question": f"q{feedback_id}"}
+        self.feedback_count._async_get_feedback_detail = get_detail
+        details = asyncio.run(self.feedback_count._async_get_feedback_details(None, [1, 2]))
+        self.assertEqual(details, {1: {"question": "cached"}, 2: {"question": "q2"}})
+        self.assertEqual(get_many(["2"]), {"2": {"question": "q2"}})
+        self.assertEqual(self.on_loop, [])
+
+    def test_host_semaphores_are_rebuilt_per_run(self):
+        self.assertEqual(self.feedback_count._host_semaphores, {})
+
+        async def task(session):
+            self.feedback_count._host_semaphores.setdefault("h", asyncio.BoundedSemaphore(1))
+            async with self.feedback_count._host_semaphores["h"]:
+                return 1
+        for _ in range(2):
+            self.assertEqual(asyncio.run(self.feedback_count._async_gather(task, [(), ()])), [1, 1])
+
+
+class FeishuOutboxTest(unittest.TestCase):
+
+    def test_status_transitions(self):
+        outbox = FeishuOutbox(':memory:', max_age=3600, keep_delivered=3600)
+        ids = [outbox.add("Android", "http://hook", f"t{i}", {"i": i}) for i in range(4)]
+        outbox.mark_delivered(ids[0], 1)
+        outbox.mark_failed(ids[1], 2, "HTTP 500")
+        outbox.mark_dead(ids[2], 1, "HTTP 400")
+        self.assertEqual([row[0] for row in outbox.pending()], [ids[1], ids[3]])
+        self.assertEqual([row[0] for row in outbox.pending(exclude=[ids[1]])], [ids[3]])
+
+    def test_old_pending_cards_expire(self):
+        outbox = FeishuOutbox(':memory:', max_age=-1, keep_delivered=3600)
+        outbox.add("Android", "http://hook", "t", {})
+        self.assertEqual(outbox.pending(), [])
+        self.assertEqual(outbox.conn.execute("SELECT status FROM outbox").fetchone()[0], "expired")
+
+    def test_finished_cards_are_cleaned_up_on_open(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, "outbox.db")
+            outbox = FeishuOutbox(path, max_age=3600, keep_delivered=3600)
+            outbox.mark_delivered(outbox.add("Android", "http://hook", "t", {}), 1)
+            outbox.add("Android", "http://hook", "pending", {})
+            outbox.close()
+            reopened = FeishuOutbox(path, max_age=3600, keep_delivered=-1)
+            self.assertEqual(reopened.conn.execute("SELECT title FROM outbox").fetchall(), [("pending",)])
+            reopened.close()
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+class FeishuDeliveryTest(unittest.TestCase):
+
+    def deliver(self, responses, max_retries=2):
+        outbox = FeishuOutbox(':memory:', max_age=3600, keep_delivered=3600)
+        calls = []
+
+        def post(url, card):
+            calls.append(url)
+            return responses.pop(0)
+        delivery = FeishuDelivery(post, [], max_retries, 0, outbox=outbox, retry_codes=(11232,))
+        card_id, future = delivery.submit("Android", "http://hook", "t", {})
+        delivery.join()
+        status = outbox.conn.execute("SELECT status FROM outbox WHERE id = ?", (card_id,)).fetchone()[0]
+        return future.result(), status, len(calls)
+
+    def test_success(self):
+        result, status, calls = self.deliver([FakeResponse()])
+        self.assertEqual((result["status"], status, calls), ("delivered", "delivered", 1))
+
+    def test_rate_limit_code_in_200_is_retried(self):
+        result, status, calls = self.deliver([FakeResponse(200, {"code": 11232}), FakeResponse()])
+        self.assertEqual((result["status"], status, calls), ("delivered", "delivered", 2))
+
+    def test_other_error_code_is_dead(self):
+        result, status, calls = self.deliver([FakeResponse(200, {"code": 19024, "msg": "Key Words Not Found"})])
+        self.assertEqual((result["status"], status, calls), ("dead", "dead", 1))
+
+    def test_client_error_is_dead(self):
+        result, status, calls = self.deliver([FakeResponse(400, {})])
+        self.assertEqual((result["status"], status, calls), ("dead", "dead", 1))
+
+    def test_server_error_stays_pending(self):
+        result, status, calls = self.deliver([FakeResponse(500, {})] * 3)
+        self.assertEqual((result["status"], status, calls), ("failed", "pending", 3))
+
+
+class TranslateBatchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.feedback_count = OfflineFeedbackCount()
+
+    def test_split_in_order(self):
+        translated = "<<<0>>>\n译文一\n<<<1>>>\n  译文二\n第二行\n<<<2>>>\n"
+        self.assertEqual(self.feedback_count.split_translate_batch(translated, 3), ["译文一", "译文二\n第二行", ""])
+
+    def test_split_rejects_missing_or_reordered_markers(self):
+        self.assertIsNone(self.feedback_count.split_translate_batch("<<<0>>>\na\n<<<2>>>\nb", 2))
+        self.assertIsNone(self.feedback_count.split_translate_batch("<<<1>>>\na\n<<<0>>>\nb", 2))
+        self.assertIsNone(self.feedback_count.split_translate_batch("a\nb", 2))
+
+    def test_batches_respect_limits(self):
+        texts = ["x" * 1000] * 7 + ["y"] * 120
+        batches = self.feedback_count.build_translate_batches(texts)
+        self.assertEqual([text for batch in batches for text in batch], texts)
+        for batch in batches:
+            self.assertLessEqual(len(batch), OfflineFeedbackCount.TRANSLATE_BATCH_MAX_ITEMS)
+            self.assertTrue(len(batch) == 1 or sum(map(len, batch)) <= OfflineFeedbackCount.TRANSLATE_BATCH_MAX_CHARS)
+
+
+class NeedsTranslationTest(unittest.TestCase):
+    """本地判断是否需要翻译：空文本、无文字、中文为主的文本不请求翻译接口"""
+
+    def setUp(self):
+        self.feedback_count = OfflineFeedbackCount()
+
+    def test_texts_without_foreign_words_are_skipped(self):
+        for text in ("", "   ", "12345", "https://example.com/video?id=1", "😀😀!!", "视频一直卡顿怎么办",
+                     "视频一直卡顿怎么办 app"):
+            self.assertFalse(self.feedback_count.needs_translation(text), text)
+
+    def test_foreign_texts_are_translated(self):
+        for text in ("video keeps buffering", "動画が止まる", "영상이 멈춰요", "视频卡顿 keeps buffering",
+                     "see https://example.com/视频 cannot play"):
+            self.assertTrue(self.feedback_count.needs_translation(text), text)
+
+
+class PaginationTest(unittest.TestCase):
+    """分页：全部页取完才算完整窗口，任一页失败整个任务失败"""
+
+    def setUp(self):
+        self.feedback_count = OfflineFeedbackCount()
+        self.feedback_count.FEEDBACK_PAGE_SIZE = 2
+        self.items = [{"id": i, "createTime": f"2026-01-01 10:00:{59 - i:02d}"} for i in range(5)]
+        self.failed_pages = set()
+        self.feedback_count.get_feedback = self.get_feedback
+        self.feedback_count.get_feedback_details = lambda ids: {}
+        self.task = ("A", "A_APP", 1, "类型1", "2026-01-01 00:00:00", "2026-01-02 00:00:00")
+
+    def get_feedback(self, appName, clientGroup, feedback_type, start_date, end_date, page=0, size=200):
+        if page in self.failed_pages:
+            return {}
+        return {"content": self.items[page * size:(page + 1) * size], "totalElements": len(self.items)}
+
+    def process(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return self.feedback_count.process_feedback_type(*self.task)
+
+    def test_all_pages_are_fetched(self):
+        result = self.process()
+        self.assertEqual(result["count"], 5)
+        self.assertEqual(result["last_seen"], {"createTime": "2026-01-01 10:00:59", "id": 0})
+
+    def test_first_page_failure_fails_the_task(self):
+        self.failed_pages = {0}
+        self.assertIsNone(self.process())
+
+    def test_later_page_failure_fails_the_task(self):
+        self.failed_pages = {2}
+        self.assertIsNone(self.process())
+
+    @unittest.skipIf(import_aiohttp() is None, "需要aiohttp")
+    def test_async_first_page_failure_fails_the_task(self):
+        async def get_feedback(session, *args, page=0, size=200):
+            return self.get_feedback(*args, page=page, size=size)
+
+        async def get_feedback_details(session, ids):
+            return {}
+        self.feedback_count._async_get_feedback = get_feedback
+        self.feedback_count._async_get_feedback_details = get_feedback_details
+        self.feedback_count.token_manager.login = lambda: "token"
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(len(self.feedback_count.run_tasks('process_feedback_type', [self.task], 'async')), 1)
+            self.failed_pages = {0}
+            self.assertEqual(self.feedback_count.run_tasks('process_feedback_type', [self.task], 'async'), [])
+
+
+class WatermarkTest(unittest.TestCase):
+    """水位线：只推送新反馈，卡片确认不会丢失后才按渠道推进"""
+
+    def setUp(self):
+        self.feedback_count = OfflineFeedbackCount()
+        self.feedback_count.feedback_tab_config = []
+        self.feedback_count.feedback_list = [
+            {"appName": "A", "clientGroupCode": "A_APP", "FEEDBACK_TYPES": {1: "类型1"}},
+            {"appName": "B", "clientGroupCode": "B_APP", "FEEDBACK_TYPES": {2: "类型2"}},
+        ]
+
+    @staticmethod
+    def result(app_name, type_id, create_time=None, feedback_id=None):
+        """create_time为None时表示窗口内没有反馈的类型"""
+        items = [{"问题描述": "x"}] if create_time else []
+        return {
+            "appName": app_name, "clientGroup": f"{app_name}_APP", "feedback_type": f"类型{type_id}",
+            "feedback_type_id": type_id, "count": len(items), "items": items,
+            "last_seen": {"createTime": create_time, "id": feedback_id} if create_time else None,
+        }
+
+    def run_recent(self, results, post):
+        self.feedback_count.collect_feedback = lambda tasks, engine=None: results
+        self.feedback_count.delivery.post = post
+        self.feedback_count.get_recent_feedback(hours=1, incremental=True)
+        self.feedback_count.deliver_feishu()
+        return self.feedback_count.watermarks.get_many(["A|A_APP|1", "B|B_APP|2"])
+
+    def test_select_after_watermark(self):
+        items = [{"createTime": "2026-01-01 10:00:00", "id": 5}, {"createTime": "2026-01-01 10:00:00", "id": 6},
+                 {"createTime": "2026-01-01 09:00:00", "id": 9}]
+        selected, last_seen = self.feedback_count.select_after_watermark(
+            items, {"createTime": "2026-01-01 10:00:00", "id": 5})
+        self.assertEqual([item["id"] for item in selected], [6])
+        self.assertEqual(last_seen, {"createTime": "2026-01-01 10:00:00", "id": 6})
+
+    def test_apply_watermarks_resumes_from_mark_within_lookback(self):
+        feedback_count = self.feedback_count
+        recent = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time() - 600))
+        feedback_count.watermarks.set_many({"A|A_APP|1": {"createTime": recent, "id": 1},
+                                            "B|B_APP|2": {"createTime": "2000-01-01 00:00:00", "id": 1}})
+        tasks = [("A", "A_APP", 1, "类型1", "s", "e"), ("B", "B_APP", 2, "类型2", "s", "e"),
+                 ("C", "C_APP", 3, "类型3", "s", "e")]
+        planned = feedback_count.apply_watermarks(tasks)
+        self.assertEqual(planned[0][4], recent)
+        self.assertEqual(planned[1][4], feedback_count.get_time_range(hours=feedback_count.WATERMARK_MAX_LOOKBACK_HOURS)[0])
+        self.assertEqual(planned[2], tasks[2])
+
+    def test_watermarks_advance_when_cards_are_stored_in_outbox(self):
+        marks = self.run_recent([self.result("A", 1, "2026-01-01 10:00:00", 7)], lambda url, card: FakeResponse(500))
+        self.assertEqual(marks, {"A|A_APP|1": {"createTime": "2026-01-01 10:00:00", "id": 7}})
+
+    def test_watermarks_wait_for_delivery_without_outbox(self):
+        self.feedback_count.delivery.outbox = None
+        results = [self.result("A", 1, "2026-01-01 10:00:00", 7), self.result("B", 2, "2026-01-01 10:00:00", 8)]
+        marks = self.run_recent(results, lambda url, card: FakeResponse(500) if "android" in url and "B" in
+                                json.dumps(card, ensure_ascii=False) else FakeResponse())
+        self.assertEqual(list(marks), ["A|A_APP|1"])
+
+    def test_empty_types_advance_to_window_end(self):
+        self.feedback_count.feedback_list = [
+            {"appName": "A", "clientGroupCode": "A_APP", "FEEDBACK_TYPES": {1: "类型1", 2: "类型2"}}]
+        results = [self.result("A", 1, "2026-01-01 10:00:00", 7), self.result("A", 2)]
+        self.feedback_count.collect_feedback = lambda tasks, engine=None: results
+        self.feedback_count.delivery.post = lambda url, card: FakeResponse()
+        self.feedback_count.get_recent_feedback(hours=1, incremental=True)
+        self.feedback_count.deliver_feishu()
+        marks = self.feedback_count.watermarks.get_many(["A|A_APP|1", "A|A_APP|2"])
+        self.assertEqual(marks["A|A_APP|1"], {"createTime": "2026-01-01 10:00:00", "id": 7})
+        self.assertEqual(marks["A|A_APP|2"]["id"], 0)
+        # 空类型的水位线就是本次窗口的结束时间，下次从这里继续
+        _, end_time = self.feedback_count.get_time_range(hours=1)
+        self.assertLessEqual(marks["A|A_APP|2"]["createTime"], end_time)
+        self.assertGreater(marks["A|A_APP|2"]["createTime"], self.feedback_count.get_time_range(hours=1)[0])
+
+    def test_empty_type_waits_for_its_channel_delivery(self):
+        self.feedback_count.delivery.outbox = None
+        results = [self.result("A", 1, "2026-01-01 10:00:00", 7), self.result("B", 2)]
+        self.feedback_count.feedback_list[0]["FEEDBACK_TYPES"] = {1: "类型1", 3: "类型3"}
+        results.append(self.result("A", 3))
+        self.feedback_count.collect_feedback = lambda tasks, engine=None: results
+        self.feedback_count.delivery.post = lambda url, card: FakeResponse(500)
+        self.feedback_count.get_recent_feedback(hours=1, incremental=True)
+        self.feedback_count.deliver_feishu()
+        marks = self.feedback_count.watermarks.get_many(["A|A_APP|1", "A|A_APP|3", "B|B_APP|2"])
+        self.assertEqual(list(marks), ["B|B_APP|2"])
+
+    def test_channel_items_without_type_field_cannot_be_bucketed(self):
+        type_tasks = {"1": ("A", "A_APP", 1, "类型1", "2026-01-01 00:00:00", "2026-01-02 00:00:00")}
+        items = [{"id": 1, "createTime": "2026-01-01 10:00:00"}]
+        self.assertIsNone(self.feedback_count.bucket_channel_items(items, type_tasks, {}))
+
+
+class DayCountTest(unittest.TestCase):
+    """按天计数：已结束的天只请求一次，冷启动按周期请求，失败的类型两期都不计入"""
+
+    def setUp(self):
+        self.feedback_count = OfflineFeedbackCount()
+        self.feedback_count.feedback_list = [
+            {"appName": "A", "clientGroupCode": "A_APP", "FEEDBACK_TYPES": {1: "类型1", 2: "类型2"}}]
+        base = datetime.now() - timedelta(days=20)
+        # 每3小时一条反馈，类型2的数量是类型1的两倍
+        self.events = [(base + timedelta(hours=3 * i)).strftime('%Y-%m-%d %H:%M:%S') for i in range(20 * 8)]
+        self.requests = []
+        self.failures = {}
+        self.feedback_count.get_feedback_count_only = self.get_count
+
+    def get_count(self, app_name, client_group, feedback_type, start_time, end_time):
+        self.requests.append((feedback_type[0], start_time, end_time))
+        key = (feedback_type[0], start_time)
+        if self.failures.get(key):
+            self.failures[key] -= 1
+            return None
+        return feedback_type[0] * sum(1 for event in self.events if start_time <= event <= end_time)
+
+    def expected(self, days, offset=0):
+        start, end = self.feedback_count.period_window(self.feedback_count.report_days(days, offset))
+        count = sum(1 for event in self.events if start <= event <= end)
+        return {("A", "A_APP", 1): count, ("A", "A_APP", 2): 2 * count}
+
+    def count(self, days, offset=0):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return self.feedback_count.count_feedback_days(days, offset, engine='thread')
+
+    def next_run(self):
+        """下一次运行：结果表清空，按天存储保留"""
+        self.feedback_count.count_table = {}
+        self.requests = []
+
+    def test_cold_start_queries_each_period_once(self):
+        self.assertEqual(self.count(7), self.expected(7))
+        self.assertEqual(self.count(7, offset=7), self.expected(7, offset=7))
+        self.assertEqual(len(self.requests), 4)
+
+    def test_closed_days_are_stored_and_summed(self):
+        for offset in range(14):
+            self.count(1, offset=offset)
+        self.next_run()
+        self.assertEqual(self.count(7), self.expected(7))
+        self.assertEqual(self.count(7, offset=7), self.expected(7, offset=7))
+        # 只有尚未结束的天需要请求
+        closed = self.feedback_count.day_window(self.feedback_count.report_days(1)[0])[1] < datetime.now().strftime(
+            '%Y-%m-%d %H:%M:%S')
+        self.assertEqual(len(self.requests), 0 if closed else 2)
+
+    def test_failed_request_is_retried(self):
+        day = self.feedback_count.report_days(1, offset=3)[0]
+        self.failures[(1, self.feedback_count.day_window(day)[0])] = 1
+        self.assertEqual(self.count(1, offset=3), self.expected(1, offset=3))
+
+    def test_type_missing_in_one_period_is_excluded_from_both(self):
+        last_period = self.feedback_count.report_days(7, offset=7)
+        self.failures[(2, self.feedback_count.period_window(last_period)[0])] = 2
+        with contextlib.redirect_stdout(io.StringIO()):
+            this_counts, last_counts = self.count(7), self.count(7, offset=7)
+            summary = self.feedback_count.build_summary_data(this_counts, last_counts)
+        data = summary["A_A_APP"]
+        self.assertEqual(data["incomplete"], ["类型2"])
+        self.assertEqual(set(data["this_week"]["types"]), {"类型1"})
+        self.assertEqual(data["this_week"]["total"], self.expected(7)[("A", "A_APP", 1)])
+        self.assertEqual(data["last_week"]["total"], self.expected(7, offset=7)[("A", "A_APP", 1)])
+
+
+class CategoryStatsTest(unittest.TestCase):
+    """已解决/未解决统计：任意层嵌套的小类、分页失败的大类记为缺失、缺失的大类在单日对比中显示为无数据"""
+
+    def setUp(self):
+        self.feedback_count = OfflineFeedbackCount()
+
+    def test_nested_subcategories_at_any_depth(self):
+        deep = {"id": "deep", "resolvedQty": 1, "unresolvedQty": 1}
+        for _ in range(5000):
+            deep = {"id": "deep", "resolvedQty": 1, "unresolvedQty": None, "sonIssuesList": [deep]}
+        subcategories = [
+            {"id": "a", "innerTitle": "小类a", "resolvedQty": None, "unresolvedQty": 3,
+             "sonIssuesList": [{"id": "a-0", "resolvedQty": 2, "unresolvedQty": 1,
+                                "sonIssuesList": [{"id": "a-0-0", "resolvedQty": 4, "unresolvedQty": 0}]}]},
+            deep,
+        ]
+        stats = self.feedback_count.calculate_subcategory_stats(iter(subcategories))
+        self.assertEqual((stats["resolved_total"], stats["unresolved_total"]), (6 + 5001, 4 + 1))
+        self.assertEqual(stats["subcategories"]["a"], {"title": "小类a", "resolved": 6, "unresolved": 4})
+
+    def test_failed_page_marks_category_missing(self):
+        self.feedback_count.SUBCATEGORY_PAGE_SIZE = 1
+        pages = [{"content": [{"id": 1, "resolvedQty": 1}], "totalElements": 3}, None]
+        self.feedback_count.get_subcategory_page = lambda category_id, page, size: pages[min(page, 1)]
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertIsNone(self.feedback_count.fetch_category_stats({"id": 29, "categoryTitle": "大类"}))
+
+    def test_missing_category_is_not_compared_as_zero(self):
+        feedback_count = self.feedback_count
+        yesterday, today = feedback_count.get_yesterday_and_today_dates()
+        stats = {"category_title": "大类", "resolved_total": 5, "unresolved_total": 7}
+        feedback_count.get_history_store().upsert({yesterday: {"ch": {1: stats, 2: stats}}})
+        feedback_count.get_channel_config = lambda: [{"appName": "A", "clientGroupCode": "A_APP", "platformType": "APP"}]
+        feedback_count.get_category_details = lambda *args: [{"id": 1, "categoryTitle": "大类"},
+                                                             {"id": 2, "categoryTitle": "大类"}]
+        feedback_count.fetch_category_stats = lambda category: None if category["id"] == 2 else dict(stats)
+        with contextlib.redirect_stdout(io.StringIO()):
+            feedback_count.count_all()
+        data = feedback_count.load_history(yesterday, today)
+        data[yesterday]["A_A_APP_APP"] = data[yesterday].pop("ch")
+        result = feedback_count.compare_daily_data(data, yesterday, today)["A_A_APP_APP"]
+        self.assertEqual(result[1]["resolved_diff"], 0)
+        self.assertEqual((result[2]["today_resolved"], result[2]["resolved_diff"], result[2]["unresolved_trend"]),
+                         (None, None, "无数据"))
+        self.assertIn("无数据", feedback_count.print_compare_result({"ch": result}, yesterday, today))
+
+
+    def test_compare_without_history_explains_and_skips(self):
+        sent = []
+        self.feedback_count.send_to_feishu = lambda *args, **kwargs: sent.append(kwargs)
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            self.feedback_count.one_day_compare()
+        yesterday, today = self.feedback_count.get_yesterday_and_today_dates()
+        self.assertIn(f"历史库中还没有[{yesterday}、{today}]的统计数据", output.getvalue())
+        self.assertEqual(sent, [])
+
+
+class DaemonTest(unittest.TestCase):
+    """常驻模式：每次定时任务前清空单次运行的状态，配置按刷新间隔重新获取，会话和登录态保持"""
+
+    def setUp(self):
+        self.feedback_count = OfflineFeedbackCount()
+        self.config_loads = []
+        self.config = [{"appName": "A", "clientGroupCode": "A_APP", "FEEDBACK_TYPES": {1: "类型1"}}]
+        self.feedback_count.load_feedback_config = self.load_config
+
+    def load_config(self, force=False):
+        self.config_loads.append(force)
+        return [], self.config
+
+    def test_next_tick(self):
+        self.feedback_count.DAEMON_TICK_MINUTE = 5
+        self.assertEqual(self.feedback_count.next_tick(datetime(2026, 1, 1, 10, 3)), datetime(2026, 1, 1, 10, 5))
+        self.assertEqual(self.feedback_count.next_tick(datetime(2026, 1, 1, 10, 5)), datetime(2026, 1, 1, 11, 5))
+        self.assertEqual(self.feedback_count.next_tick(datetime(2026, 1, 1, 23, 30)), datetime(2026, 1, 2, 0, 5))
+
+    def test_prepare_tick_resets_run_state(self):
+        feedback_count = self.feedback_count
+        feedback_count.count_table = {("s", "e"): {}}
+        feedback_count.results = [{}]
+        feedback_count.now = datetime(2000, 1, 1)
+        feedback_count.prepare_tick()
+        self.assertEqual((feedback_count.count_table, feedback_count.results), ({}, []))
+        self.assertGreater(feedback_count.now, datetime(2000, 1, 1))
+
+    def test_config_is_refreshed_on_its_own_interval(self):
+        feedback_count = self.feedback_count
+        with contextlib.redirect_stdout(io.StringIO()):
+            feedback_count.prepare_tick()
+            feedback_count.prepare_tick()
+            self.assertEqual(self.config_loads, [False])
+            feedback_count.config_loaded_at -= feedback_count.CONFIG_REFRESH_INTERVAL
+            feedback_count.prepare_tick()
+            self.assertEqual(self.config_loads, [False, True])
+            # 刷新失败时保留原有配置，下一次定时任务再试
+            feedback_count.config_loaded_at -= feedback_count.CONFIG_REFRESH_INTERVAL
+            previous, self.config = self.config, []
+            feedback_count.prepare_tick()
+            feedback_count.prepare_tick()
+        self.assertEqual(self.config_loads, [False, True, True, True])
+        self.assertEqual(feedback_count.feedback_list, previous)
+
+    def test_serve_forever_keeps_session_and_token_between_ticks(self):
+        feedback_count = self.feedback_count
+        logins = []
+        feedback_count.token_manager.login = lambda: logins.append(1) or jwt(time.time() + 3600)
+        feedback_count.next_tick = lambda now=None: datetime.now()
+        sessions = []
+
+        def run_once():
+            sessions.append((feedback_count.session, feedback_count.token))
+            if len(sessions) == 3:
+                feedback_count.stop()
+        feedback_count.run_once = run_once
+        with contextlib.redirect_stdout(io.StringIO()):
+            feedback_count.serve_forever()
+        self.assertEqual(len(sessions), 3)
+        self.assertEqual(len(set(sessions)), 1)
+        self.assertEqual(logins, [1])
+
+
+class ConfigCacheTest(unittest.TestCase):
+    """反馈配置缓存的 TTL / 导航栏哈希 / 失败不缓存 三条路径"""
+
+    def setUp(self):
+        self.feedback_count = OfflineFeedbackCount()
+        self.calls = {"tab": 0, "list": 0}
+        self.tabs = [{"appName": "A", "clientGroupCode": "A_APP"}, {"appName": "B", "clientGroupCode": "B_APP"}]
+        self.fail = set()
+        self.feedback_count.get_feedback_tab_config = self.get_tab_config
+        self.feedback_count.get_feedback_list = self.get_feedback_list
+
+    def get_tab_config(self):
+        self.calls["tab"] += 1
+        return [dict(tab) for tab in self.tabs]
+
+    def get_feedback_list(self, tab_config, failed=None):
+        self.calls["list"] += 1
+        result = []
+        for tab in tab_config:
+            if tab["appName"] in self.fail:
+                failed.append(tab)
+            else:
+                result.append({**tab, "FEEDBACK_TYPES": {1: f"{tab['appName']}类型"}})
+        return result
+
+    def cached(self):
+        return self.feedback_count.config_cache.get_many(['feedback_config']).get('feedback_config')
+
+    def test_warm_start_within_ttl_makes_no_requests(self):
+        self.feedback_count.load_feedback_config()
+        self.feedback_count.load_feedback_config()
+        self.assertEqual(self.calls, {"tab": 1, "list": 1})
+
+    def test_expired_ttl_with_same_tabs_reuses_type_lists(self):
+        self.feedback_count.load_feedback_config()
+        _, feedback_list = self.feedback_count.load_feedback_config(force=True)
+        self.assertEqual(self.calls, {"tab": 2, "list": 1})
+        self.assertEqual(feedback_list[0]["FEEDBACK_TYPES"], {1: "A类型"})
+
+    def test_partial_failure_is_not_cached(self):
+        self.fail = {"B"}
+        _, feedback_list = self.feedback_count.load_feedback_config()
+        self.assertEqual([tab["appName"] for tab in feedback_list], ["A"])
+        self.assertIsNone(self.cached())
+
+    def test_partial_failure_reuses_previous_types(self):
+        self.feedback_count.load_feedback_config()
+        loaded_at = self.cached()["loaded_at"]
+        self.fail = {"A"}
+        self.feedback_count.CONFIG_CACHE_MAX_AGE = -1
+        _, feedback_list = self.feedback_count.load_feedback_config(force=True)
+        self.assertEqual([tab["appName"] for tab in feedback_list], ["A", "B"])
+        self.assertEqual(self.cached()["loaded_at"], loaded_at)
+
+
+if __name__ == '__main__':
+    unittest.main()